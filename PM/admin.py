@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Project, Task, Profile, EmailOTP, TaskInvite
+from .models import Project, Task, Profile, EmailOTP, TaskInvite, OutboundEmail, ProjectMembership
 
 # Register your models here.
 admin.site.register(Project)
@@ -7,4 +7,5 @@ admin.site.register(Task)
 admin.site.register(Profile)
 admin.site.register(EmailOTP)
 admin.site.register(TaskInvite)
-    
\ No newline at end of file
+admin.site.register(OutboundEmail)
+admin.site.register(ProjectMembership)
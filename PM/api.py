@@ -0,0 +1,184 @@
+"""Read-only JSON API over projects, tasks and chat messages.
+
+Rows are read with ``values()`` on just the requested columns
+(``?fields=name,status``), so no model instances are built and no
+related rows are joined; related objects are returned as ids. Pages walk
+the primary key (``?after=<id>&limit=<n>``), which keeps a deep page as
+cheap as the first.
+
+Every collection has a strong ETag fingerprinting all of its rows: how
+many there are, the sum of their ids and the newest ``updated_at``, mixed
+with the user and the query string. Adding, removing or editing any row
+changes it. Computing it is a single aggregate query over an index, and
+the views check it before anything else runs, so a poll with a matching
+If-None-Match gets a 304 without reading or serializing a single row.
+
+Archived projects are listed with their ``archived_at``, but their tasks
+and messages live in cold storage (see archive.py): asking for them by
+project gets a 409 pointing at the export, which still covers them.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Sum
+from django.http import Http404
+from django.urls import reverse
+
+from .models import Project, ProjectMembership, ProjectMessage, Task
+from .utils import user_project_ids
+
+API_PAGE_SIZE = getattr(settings, "API_PAGE_SIZE", 50)
+API_MAX_PAGE_SIZE = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+
+# Public field name -> column, per collection
+PROJECT_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "description": "description",
+    "start_date": "start_date",
+    "end_date": "end_date",
+    "manager": "manager_id",
+    "client": "client_id",
+    "todo_count": "todo_count",
+    "in_progress_count": "in_progress_count",
+    "done_count": "done_count",
+    "archived_at": "archived_at",
+    "updated_at": "updated_at",
+}
+TASK_FIELDS = {
+    "id": "id",
+    "project": "project_id",
+    "title": "title",
+    "description": "description",
+    "assignee": "assignee_id",
+    "status": "status",
+    "deadline": "deadline",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+MESSAGE_FIELDS = {
+    "id": "id",
+    "project": "project_id",
+    "user": "user_id",
+    "text": "text",
+    "reply_to": "reply_to_id",
+    "attachment": "blob_name",
+    "created_at": "created_at",
+}
+
+
+class ApiError(ValueError):
+    status = 400
+
+
+class ProjectArchived(ApiError):
+    status = 409
+
+    def __init__(self, project_id):
+        super().__init__(
+            f"Project {project_id} is archived; its tasks and messages are only in its export "
+            f"({reverse('project_export', kwargs={'pk': project_id})})."
+        )
+
+
+def check_not_archived(project_id):
+    if Project.objects.filter(pk=project_id, archived_at__isnull=False).exists():
+        raise ProjectArchived(project_id)
+
+
+def member_projects(user):
+    return ProjectMembership.objects.filter(user=user).values("project_id")
+
+
+def project_collection(request):
+    return Project.objects.filter(pk__in=member_projects(request.user))
+
+
+def task_collection(request):
+    """Tasks in the user's projects, optionally narrowed with ?project= and ?status="""
+    tasks = Task.objects.filter(project__in=member_projects(request.user))
+    project = request.GET.get("project")
+    if project:
+        if not project.isdigit():
+            raise ApiError("project must be a project id.")
+        if int(project) not in user_project_ids(request.user):
+            raise Http404("No such project.")
+        check_not_archived(int(project))
+        tasks = tasks.filter(project_id=int(project))
+    status = request.GET.get("status")
+    if status:
+        if status not in dict(Task.STATUS_CHOICES):
+            raise ApiError(f"status must be one of {', '.join(dict(Task.STATUS_CHOICES))}.")
+        tasks = tasks.filter(status=status)
+    return tasks
+
+
+def message_collection(request, pk):
+    if pk not in user_project_ids(request.user):
+        raise Http404("No such project.")
+    check_not_archived(pk)
+    return ProjectMessage.objects.filter(project_id=pk)
+
+
+def parse_page(request, fields):
+    """Return (field names, after, limit) from the query string.
+
+    The id is always returned, since it is what the next page starts from.
+    """
+    names = ["id"]
+    requested = [name.strip() for name in request.GET.get("fields", "").split(",") if name.strip()]
+    unknown = [name for name in requested if name not in fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(fields)}.")
+    names += [name for name in (requested or fields) if name not in names]
+
+    try:
+        after = int(request.GET.get("after", 0))
+        limit = int(request.GET.get("limit", API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("after and limit must be integers.")
+    if after < 0:
+        raise ApiError("after must not be negative.")
+    if not 0 < limit <= API_MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {API_MAX_PAGE_SIZE}.")
+    return names, after, limit
+
+
+def collection_etag(request, queryset, version_field=None):
+    """Fingerprint a whole collection as seen by this user and query string"""
+    aggregates = {"rows": Count("id"), "ids": Sum("id")}
+    if version_field:
+        aggregates["version"] = Max(version_field)
+    state = queryset.order_by().aggregate(**aggregates)
+    raw = json.dumps(
+        [request.user.pk, sorted(request.GET.lists()), state], cls=DjangoJSONEncoder, sort_keys=True
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def page_of(request, queryset, fields):
+    """Return one page of the collection as a JSON-ready dict with a next link"""
+    names, after, limit = parse_page(request, fields)
+    columns = [fields[name] for name in names]
+    rows = list(queryset.filter(pk__gt=after).order_by("pk").values_list(*columns)[:limit + 1])
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = request.GET.copy()
+        query["after"] = rows[-1][0]
+        next_url = f"{request.path}?{query.urlencode()}"
+    return {"results": [dict(zip(names, row)) for row in rows], "next": next_url}
+
+
+def etag_for(collection, fields, version_field=None):
+    """Build an etag_func for condition(); an invalid query string gets no ETag"""
+    def etag(request, *args, **kwargs):
+        try:
+            parse_page(request, fields)
+            return collection_etag(request, collection(request, *args, **kwargs), version_field)
+        except ApiError:
+            return None
+    return etag
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PmConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "PM"
+
+    def ready(self):
+        from . import checks, signals, sqlite  # noqa: F401
@@ -0,0 +1,260 @@
+"""Cold storage for finished projects.
+
+Once a project's end_date is ARCHIVE_AFTER_DAYS old, the archive_projects
+worker moves its tasks, chat messages and invites out of the hot tables
+into gzipped JSONL segments in default storage, at most
+ARCHIVE_BATCH_SIZE rows per segment. Each segment file is written first,
+then recorded as an ArchiveSegment in the same transaction that deletes
+its rows, so a crash in between leaves at worst a stray file, never lost
+rows. Rows move newest first: nothing left behind can reply to a message
+that is already gone.
+
+The rows are deleted with a plain queryset ``delete()`` inside
+``signals.moving_to_archive()``, so their search rows, reminders and
+cached fragments go as usual while the project keeps its task counters
+and memberships. It stays listed and viewable through the usual pages,
+which read its tasks and chat from the segments, and its export covers
+the segments too. It is read-only from the moment ``archived_at`` is
+set, before the first batch moves; a run interrupted after that is
+picked up again by ``due_projects``. ``restore_project`` puts every row
+back under its original id, oldest segment first, one transaction per
+segment, and stamps ``restored_at`` so the next run does not archive it
+straight away again.
+"""
+import gzip
+import json
+from datetime import datetime, timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .chat import CHAT_PAGE_SIZE, decode_cursor, encode_cursor
+from .dashboard import invalidate_dashboard
+from .models import ArchiveSegment, ChatBlob, Project, ProjectMessage, Task, TaskInvite
+from .search import reindex_objects
+from .signals import moving_to_archive
+
+ARCHIVE_AFTER_DAYS = getattr(settings, "ARCHIVE_AFTER_DAYS", 30)
+ARCHIVE_BATCH_SIZE = getattr(settings, "ARCHIVE_BATCH_SIZE", 1000)
+ARCHIVE_ROOT = getattr(settings, "ARCHIVE_ROOT", "archives")
+
+# Archived kinds, in the order they are moved out
+ARCHIVE_KINDS = {
+    "task": Task,
+    "message": ProjectMessage,
+    "invite": TaskInvite,
+}
+# Kinds with rows in the search index
+SEARCHABLE_KINDS = {"task", "message"}
+# The user each kind of row points at, which may be gone by restore time
+USER_FIELDS = {
+    "task": "assignee_id",
+    "message": "user_id",
+    "invite": "inviter_id",
+}
+
+
+class SegmentEncoder(DjangoJSONEncoder):
+    """Keeps full microseconds, so restored rows sort exactly as before"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def segment_fields(model):
+    """Every column of model, by attname, so a row can be rebuilt as it was"""
+    return {field.attname: field for field in model._meta.concrete_fields}
+
+
+def read_segment(segment):
+    """Return the rows of a segment as unsaved model instances, oldest first"""
+    model = ARCHIVE_KINDS[segment.kind]
+    fields = segment_fields(model)
+    with default_storage.open(segment.name, "rb") as source:
+        lines = gzip.decompress(source.read()).decode().splitlines()
+    return [
+        model(**{name: fields[name].to_python(value) for name, value in json.loads(line).items()})
+        for line in lines
+    ]
+
+
+def due_projects(now=None):
+    """Projects whose end_date passed ARCHIVE_AFTER_DAYS ago and are not archived yet.
+
+    A restored project gets the same grace period from its restore. Archived
+    projects still holding rows in the hot tables, left by an interrupted
+    run, are due again.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    unfinished = Q()
+    for model in ARCHIVE_KINDS.values():
+        unfinished |= Exists(model.objects.filter(project=OuterRef("pk")))
+    return Project.objects.filter(
+        Q(end_date__lt=cutoff, archived_at__isnull=True) & (Q(restored_at__isnull=True) | Q(restored_at__lt=cutoff))
+        | Q(unfinished, archived_at__isnull=False)
+    ).order_by("end_date")
+
+
+def archive_batch(project, kind, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move the project's newest batch_size rows of kind into a new segment; returns how many moved"""
+    model = ARCHIVE_KINDS[kind]
+    records = list(
+        model.objects.filter(project=project).order_by("-id").values(*segment_fields(model))[:batch_size]
+    )
+    if not records:
+        return 0
+    records.reverse()
+    ids = [record["id"] for record in records]
+    content = "".join(json.dumps(record, cls=SegmentEncoder) + "\n" for record in records)
+    name = default_storage.save(
+        f"{ARCHIVE_ROOT}/project-{project.pk}/{kind}-{ids[0]}-{ids[-1]}.jsonl.gz",
+        ContentFile(gzip.compress(content.encode())),
+    )
+
+    try:
+        with transaction.atomic(), moving_to_archive():
+            ArchiveSegment.objects.create(
+                project=project, kind=kind, name=name, rows=len(ids), first_id=ids[0], last_id=ids[-1],
+                blob_ids=sorted({record["blob_id"] for record in records if record.get("blob_id")}),
+            )
+            # on_delete takes reminders along and unlinks notifications and out-of-order replies
+            model.objects.filter(pk__in=ids).delete()
+    except Exception:
+        default_storage.delete(name)
+        raise
+    return len(ids)
+
+
+def archive_project(project, batch_size=ARCHIVE_BATCH_SIZE):
+    """Mark project archived and move all of its rows out, batch by batch; returns how many moved"""
+    if not project.is_archived:
+        project.archived_at = timezone.now()
+        project.save(update_fields=["archived_at", "updated_at"])
+    moved = 0
+    for kind in ARCHIVE_KINDS:
+        while True:
+            rows = archive_batch(project, kind, batch_size)
+            moved += rows
+            if rows < batch_size:
+                break
+    return moved
+
+
+def restore_segment(segment):
+    """Put a segment's rows back and drop it; returns how many rows came back"""
+    objects = read_segment(segment)
+    field = USER_FIELDS[segment.kind]
+    users = set(User.objects.filter(pk__in={getattr(obj, field) for obj in objects}).values_list("pk", flat=True))
+    if segment.kind == "task":
+        for task in objects:
+            if task.assignee_id not in users:
+                task.assignee_id = None
+    elif segment.kind == "message":
+        # Authors deleted since the archive took their messages with them
+        objects = [message for message in objects if message.user_id in users]
+        targets = {message.reply_to_id for message in objects if message.reply_to_id}
+        present = set(ProjectMessage.objects.filter(pk__in=targets).values_list("pk", flat=True))
+        present |= {message.pk for message in objects}
+        for message in objects:
+            if message.reply_to_id not in present:
+                message.reply_to_id = None
+    else:
+        objects = [invite for invite in objects if invite.inviter_id in users]
+
+    model = ARCHIVE_KINDS[segment.kind]
+    # bulk_create stamps auto_now and auto_now_add fields afresh; the stored values are put back after it
+    stamped = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    stamps = [[getattr(obj, name) for name in stamped] for obj in objects]
+    with transaction.atomic():
+        model.objects.bulk_create(objects)
+        if stamped:
+            for obj, values in zip(objects, stamps):
+                for name, value in zip(stamped, values):
+                    setattr(obj, name, value)
+            model.objects.bulk_update(objects, stamped)
+        if segment.kind in SEARCHABLE_KINDS:
+            reindex_objects(segment.kind, [obj.pk for obj in objects])
+        segment.delete()
+    if segment.kind == "task":
+        invalidate_dashboard(*{task.assignee_id for task in objects})
+    return len(objects)
+
+
+def restore_project(project):
+    """Move every archived row of project back into the live tables; returns how many"""
+    restored = sum(
+        restore_segment(segment)
+        for segment in project.archive_segments.order_by("kind", "first_id").iterator()
+    )
+    if project.is_archived:
+        project.archived_at = None
+        project.restored_at = timezone.now()
+        project.save(update_fields=["archived_at", "restored_at", "updated_at"])
+    return restored
+
+
+def archived_blob_ids():
+    """Ids of the attachment blobs archived messages use"""
+    segments = ArchiveSegment.objects.filter(kind="message").values_list("blob_ids", flat=True)
+    return set(chain.from_iterable(segments))
+
+
+def archived_tasks(project):
+    """The archived tasks of project, with their assignees, oldest first"""
+    tasks = list(chain.from_iterable(
+        read_segment(segment) for segment in project.archive_segments.filter(kind="task").order_by("first_id")
+    ))
+    users = User.objects.in_bulk({task.assignee_id for task in tasks if task.assignee_id})
+    for task in tasks:
+        task.assignee = users.get(task.assignee_id)
+    return tasks
+
+
+def archived_message_page(project, before=None, limit=CHAT_PAGE_SIZE):
+    """Like chat.message_page, reading the history from the project's archive.
+
+    Segments are read newest first, and only as many as the page needs.
+    """
+    segments = project.archive_segments.filter(kind="message").order_by("-last_id")
+    position = None
+    if before:
+        position = decode_cursor(before)
+        segments = segments.filter(first_id__lt=position[1])
+
+    loaded, page = {}, []
+    for segment in segments.iterator():
+        messages = read_segment(segment)
+        loaded.update((message.pk, message) for message in messages)
+        page += [message for message in messages if position is None or (message.created_at, message.pk) < position]
+        if len(page) > limit:
+            break
+    page.sort(key=lambda message: (message.created_at, message.pk), reverse=True)
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    page.reverse()
+
+    # The joins message_page gets from select_related
+    replies = [loaded.get(message.reply_to_id) for message in page]
+    users = User.objects.in_bulk({message.user_id for message in chain(page, filter(None, replies))})
+    blobs = ChatBlob.objects.in_bulk({message.blob_id for message in page if message.blob_id})
+    for message, reply_to in zip(page, replies):
+        message.user = users.get(message.user_id)
+        message.blob = blobs.get(message.blob_id)
+        if reply_to is not None and reply_to.user_id in users:
+            reply_to.user = users[reply_to.user_id]
+            message.reply_to = reply_to
+        else:
+            message.reply_to = None
+    return [message for message in page if message.user is not None], next_cursor
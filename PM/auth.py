@@ -0,0 +1,78 @@
+"""Authenticated user loading from the cache.
+
+CachedAuthenticationMiddleware stands in for Django's
+AuthenticationMiddleware. The logged-in User is kept in the cache with
+their Profile already attached, under the user id stored in the session,
+so ``request.user`` and ``request.user.profile`` cost no queries once
+warm. Sessions use the cached_db engine, so reading the session is a
+cache hit as well.
+
+A cached user is only trusted while the session's auth hash still
+matches their password hash; anything else goes through Django's own
+``get_user``, which also logs out sessions whose password has changed.
+The signals in signals.py drop the entry when the user or profile is
+saved or deleted and on logout. Code that changes either with a
+queryset update calls ``invalidate_cached_user`` itself.
+
+That invalidation only reaches every worker through a shared cache
+(see settings.CACHES). With a per-process cache another worker could keep
+serving a deactivated user or an old profile, so users are then loaded
+from the database on every request, as AuthenticationMiddleware does.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .utils import shared_cache
+
+AUTH_USER_CACHE_TIMEOUT = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 15 * 60)
+
+
+def user_cache_key(user_id):
+    return f"pm:auth-user:{user_id}"
+
+
+def invalidate_cached_user(*user_ids):
+    keys = [user_cache_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def load_user(request):
+    """Return the session's user from the cache, loading and caching it on a miss"""
+    user_id = request.session.get(SESSION_KEY)
+    if not shared_cache() or user_id is None or request.session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if user is not None and session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        try:
+            # Attach the profile so it is cached along with the user
+            user.profile
+        except ObjectDoesNotExist:
+            pass
+        cache.set(key, user, AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = load_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,122 @@
+"""Resized avatar derivatives.
+
+Uploads are kept as is, and the process_avatars worker renders each one
+into every size in AVATAR_SIZES as WebP plus a JPEG fallback. The render
+applies the EXIF orientation, then drops all metadata. Derivatives are
+named after a hash of the source file, so a name never changes meaning.
+That lets avatar_file serve them as immutable, and lets identical uploads
+share one set of files.
+"""
+import hashlib
+import io
+import logging
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .auth import invalidate_cached_user
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = tuple(getattr(settings, "AVATAR_SIZES", (64, 128, 256)))
+AVATAR_BATCH_SIZE = getattr(settings, "AVATAR_BATCH_SIZE", 20)
+# Extension -> Pillow format and encoder options
+AVATAR_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+DERIVED_DIR = "avatars/derived"
+
+DERIVATIVE_NAME_RE = re.compile(r"^(?P<hash>[0-9a-f]{16})-(?P<size>\d+)\.(?P<ext>webp|jpg)$")
+
+
+def derivative_name(avatar_hash, size, ext):
+    return f"{avatar_hash}-{size}.{ext}"
+
+
+def derivative_path(name):
+    return f"{DERIVED_DIR}/{name}"
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def render(source, size, ext):
+    """Return the encoded bytes of one square derivative, without metadata"""
+    image = source.copy()
+    image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if ext == "jpg" and image.mode != "RGB":
+        # JPEG has no alpha; flatten transparent avatars onto white
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = background
+    output = io.BytesIO()
+    image_format, options = AVATAR_FORMATS[ext]
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def render_avatar(avatar):
+    """Write every derivative of an avatar file and return its content hash"""
+    with avatar.open("rb"):
+        avatar_hash = content_hash(avatar)
+        names = [(size, ext, derivative_path(derivative_name(avatar_hash, size, ext)))
+                 for size in AVATAR_SIZES for ext in AVATAR_FORMATS]
+        if all(default_storage.exists(path) for _, _, path in names):
+            return avatar_hash
+
+        avatar.seek(0)
+        source = Image.open(avatar)
+        # Let the JPEG decoder downscale while decoding a large camera photo
+        source.draft("RGB", (max(AVATAR_SIZES) * 2, max(AVATAR_SIZES) * 2))
+        source = ImageOps.exif_transpose(source)
+        source = source.convert("RGBA" if "A" in source.getbands() or source.mode == "P" else "RGB")
+
+    for size, ext, path in names:
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(render(source, size, ext)))
+    return avatar_hash
+
+
+def process_pending_avatars(batch_size=AVATAR_BATCH_SIZE):
+    """Render derivatives for a batch of new uploads; returns (done, failed)"""
+    done, failed = 0, 0
+    for profile in Profile.objects.filter(avatar_pending=True).order_by("pk")[:batch_size]:
+        name = profile.avatar.name
+        try:
+            avatar_hash = render_avatar(profile.avatar)
+        except Exception as e:
+            logger.warning("Could not render avatar %s for profile %s: %s", name, profile.pk, e)
+            avatar_hash = ""
+            failed += 1
+        else:
+            done += 1
+        # Only settle the upload that was rendered, in case another replaced it meanwhile
+        Profile.objects.filter(pk=profile.pk, avatar=name).update(avatar_pending=False, avatar_hash=avatar_hash)
+        invalidate_cached_user(profile.user_id)
+    return done, failed
+
+
+def avatar_sources(profile, display_size):
+    """Describe the <picture> for a profile at a CSS pixel size, or None before rendering"""
+    if not profile.avatar_hash:
+        return None
+
+    def url(size, ext):
+        return reverse("avatar_file", kwargs={"name": derivative_name(profile.avatar_hash, size, ext)})
+
+    fallback = next((size for size in AVATAR_SIZES if size >= display_size), AVATAR_SIZES[-1])
+    return {
+        "webp_srcset": ", ".join(f"{url(size, 'webp')} {size}w" for size in AVATAR_SIZES),
+        "jpg_srcset": ", ".join(f"{url(size, 'jpg')} {size}w" for size in AVATAR_SIZES),
+        "src": url(fallback, "jpg"),
+    }
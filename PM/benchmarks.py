@@ -0,0 +1,216 @@
+import json
+import sqlite3
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Project
+from .sqlite import SQLITE_PRAGMAS, apply_pragmas, retry_on_busy
+from .synthetic import generate_dataset
+
+# Dataset sizes per named scale; every scale is generated from scratch
+SCALES = {
+    "small": {"users": 20, "projects": 10, "tasks_per_project": 20, "messages_per_project": 100},
+    "medium": {"users": 100, "projects": 50, "tasks_per_project": 50, "messages_per_project": 1000},
+    "large": {"users": 500, "projects": 200, "tasks_per_project": 100, "messages_per_project": 5000},
+}
+
+
+def benchmark_urls(dataset):
+    """Map each benchmarked view to the URL it is exercised through"""
+    busiest = Project.objects.filter(pk__in=dataset["project_ids"]).order_by("-todo_count").first()
+    return {
+        "dashboard": reverse("dashboard"),
+        "project_list": reverse("project_list"),
+        "project_detail": reverse("project_detail", kwargs={"pk": busiest.pk}),
+        "project_chat": reverse("project_chat", kwargs={"pk": busiest.pk}),
+        "project_chat_history": reverse("project_chat_history", kwargs={"pk": busiest.pk}),
+    }
+
+
+def measure(client, url, repeat):
+    """Return query counts, median wall time and peak traced memory for one URL"""
+    # Captures slice the live query log, which every request resets, so
+    # each count is read as soon as its block ends
+    cache.clear()
+    with CaptureQueriesContext(connection) as cold:
+        response = client.get(url)
+    cold_queries = len(cold)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} answered {response.status_code}")
+
+    queries = 0
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as warm:
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(warm))
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "cold_queries": cold_queries,
+        "queries": queries,
+        "wall_ms_median": round(statistics.median(timings), 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(scales, repeat=5, log=None):
+    """Generate each scale's dataset and benchmark every view against it.
+
+    Expects a disposable database: every scale adds its own rows on top
+    of whatever is already there.
+    """
+    results = {}
+    for name, params in scales.items():
+        if log:
+            log(f"Generating {name} dataset: {params}")
+        dataset = generate_dataset(prefix=f"bench_{name}", **params)
+        client = Client()
+        client.force_login(dataset["hot_user"])
+
+        views = {}
+        for view, url in benchmark_urls(dataset).items():
+            views[view] = measure(client, url, repeat)
+            if log:
+                log(f"  {view}: {views[view]}")
+        results[name] = {
+            "dataset": {key: dataset[key] for key in ("users", "projects", "tasks", "messages")},
+            "views": views,
+        }
+    return results
+
+
+def compare(results, baseline, time_tolerance=0.25):
+    """List regressions against a baseline: any extra query, or wall time beyond the tolerance"""
+    regressions = []
+    for scale, scale_results in results.items():
+        for view, current in scale_results["views"].items():
+            previous = baseline.get(scale, {}).get("views", {}).get(view)
+            if previous is None:
+                continue
+            for metric in ("queries", "cold_queries"):
+                if current[metric] > previous[metric]:
+                    regressions.append(f"{scale}/{view}: {metric} {previous[metric]} -> {current[metric]}")
+            if current["wall_ms_median"] > previous["wall_ms_median"] * (1 + time_tolerance):
+                regressions.append(
+                    f"{scale}/{view}: wall_ms_median {previous['wall_ms_median']} -> {current['wall_ms_median']}"
+                )
+    return regressions
+
+
+def dump(results, path):
+    with open(path, "w") as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+        output.write("\n")
+
+
+CONCURRENCY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task (id INTEGER PRIMARY KEY, project_id INTEGER, status TEXT);
+CREATE TABLE IF NOT EXISTS message (id INTEGER PRIMARY KEY, project_id INTEGER, text TEXT, created_at REAL);
+CREATE INDEX IF NOT EXISTS message_project ON message (project_id, created_at);
+"""
+
+
+def open_benchmark_connection(path, tuned):
+    """Connect the way plain settings (5s timeout, deferred) or the tuned mode would"""
+    db = sqlite3.connect(path, timeout=20 if tuned else 5, isolation_level=None, check_same_thread=False)
+    if tuned:
+        apply_pragmas(db.cursor(), SQLITE_PRAGMAS)
+    return db
+
+
+def concurrent_writes(path, tuned, writers=8, readers=4, writes_per_writer=100, projects=5):
+    """Hammer one SQLite file with chat posts and status updates from many threads.
+
+    Each write mirrors a chat post followed by a task status change in one
+    transaction, reading before it writes as the views do. Every thread has
+    its own connection, so locking behaves as it does between worker
+    processes. Readers page recent messages until the writers finish.
+    """
+    setup = open_benchmark_connection(path, tuned)
+    setup.executescript(CONCURRENCY_SCHEMA)
+    setup.executemany("INSERT INTO task (project_id, status) VALUES (?, 'todo')", [(i % projects,) for i in range(100)])
+    setup.close()
+
+    latencies, failures, reads = [], [], []
+    done = threading.Event()
+
+    def write_once(db, n):
+        db.execute("BEGIN IMMEDIATE" if tuned else "BEGIN")
+        try:
+            project_id = n % projects
+            db.execute("SELECT COUNT(*) FROM message WHERE project_id = ?", (project_id,)).fetchone()
+            db.execute("INSERT INTO message (project_id, text, created_at) VALUES (?, ?, ?)",
+                       (project_id, f"message {n}", time.time()))
+            db.execute("UPDATE task SET status = ? WHERE id = ?", (("todo", "in_progress", "done")[n % 3], n % 100 + 1))
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+
+    def writer(offset):
+        db = open_benchmark_connection(path, tuned)
+        for n in range(offset, offset + writes_per_writer):
+            started = time.perf_counter()
+            try:
+                if tuned:
+                    retry_on_busy(lambda: write_once(db, n), errors=(sqlite3.OperationalError,))
+                else:
+                    write_once(db, n)
+                latencies.append(time.perf_counter() - started)
+            except sqlite3.OperationalError as exc:
+                failures.append(str(exc))
+        db.close()
+
+    def reader():
+        db = open_benchmark_connection(path, tuned)
+        count = 0
+        while not done.is_set():
+            try:
+                db.execute("SELECT * FROM message WHERE project_id = ? ORDER BY created_at DESC LIMIT 50",
+                           (count % projects,)).fetchall()
+                count += 1
+            except sqlite3.OperationalError:
+                pass
+        reads.append(count)
+        db.close()
+
+    threads = [threading.Thread(target=writer, args=(i * writes_per_writer,)) for i in range(writers)]
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for thread in reader_threads + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "writes_ok": len(latencies),
+        "writes_failed": len(failures),
+        "writes_per_second": round(len(latencies) / elapsed, 1),
+        "reads_per_second": round(sum(reads) / elapsed, 1),
+        "write_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2) if latencies else None,
+        "elapsed_s": round(elapsed, 3),
+    }
@@ -0,0 +1,130 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import ChatReadCursor, ProjectMembership, ProjectMessage
+
+CHAT_PAGE_SIZE = getattr(settings, "CHAT_PAGE_SIZE", 50)
+# Unread counts stop here and show as "99+"
+UNREAD_COUNT_CAP = getattr(settings, "UNREAD_COUNT_CAP", 99)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into its (created_at, id) keyset position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def message_page(project, before=None, limit=CHAT_PAGE_SIZE):
+    """Return one page of chat history ending just before the cursor.
+
+    Messages come back oldest first, ready to render, with their author and
+    reply target joined in the same query. The keyset walk over
+    (project, created_at, id) keeps every page equally cheap no matter how
+    deep into the history it is. next_cursor is None once the start of the
+    conversation has been reached.
+    """
+    queryset = (
+        ProjectMessage.objects.filter(project=project)
+        .select_related("user", "reply_to__user", "blob")
+        .order_by("-created_at", "-id")
+    )
+    if before:
+        created_at, message_id = decode_cursor(before)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id))
+
+    page = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    page.reverse()
+    return page, next_cursor
+
+
+def messages_after(project, after=None, limit=CHAT_PAGE_SIZE):
+    """Return messages newer than the cursor, oldest first.
+
+    Used by live clients to catch up after a push notification. Returns the
+    page, the cursor of the newest message in it (or the given cursor when
+    nothing is new), and whether more messages are waiting.
+    """
+    queryset = (
+        ProjectMessage.objects.filter(project=project)
+        .select_related("user", "reply_to__user", "blob")
+        .order_by("created_at", "id")
+    )
+    if after:
+        created_at, message_id = decode_cursor(after)
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id))
+
+    page = list(queryset[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    latest_cursor = encode_cursor(page[-1]) if page else after
+    return page, latest_cursor, has_more
+
+
+def has_read(user, project, message_id):
+    """Whether the user's read cursor in project is already at or past message_id"""
+    return ChatReadCursor.objects.filter(user=user, project=project, last_read_id__gte=message_id).exists()
+
+
+def mark_read(user, project, message_id):
+    """Move the user's read cursor in project up to message_id, never back"""
+    advanced = ChatReadCursor.objects.filter(
+        user=user, project=project, last_read_id__lt=message_id
+    ).update(last_read_id=message_id)
+    if not advanced:
+        ChatReadCursor.objects.get_or_create(user=user, project=project, defaults={"last_read_id": message_id})
+
+
+def unread_counts(user):
+    """Return {project_id: unread messages} for every project of user with any.
+
+    One query over the user's memberships, each joined to its read cursor.
+    Per project, the (project, id, user) index is walked from the cursor
+    and stops after UNREAD_COUNT_CAP + 1 of other people's messages, so the
+    cost follows the number of projects, not the size of their history.
+    """
+    if not user.is_authenticated:
+        return {}
+    messages = ProjectMessage._meta.db_table
+    memberships = ProjectMembership._meta.db_table
+    cursors = ChatReadCursor._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT projects.project_id, ('
+            f'SELECT COUNT(*) FROM ('
+            f'SELECT 1 FROM "{messages}" message WHERE message.project_id = projects.project_id '
+            f'AND message.id > COALESCE(reader.last_read_id, 0) AND message.user_id <> %s LIMIT %s'
+            f') unread) '
+            f'FROM (SELECT DISTINCT project_id FROM "{memberships}" WHERE user_id = %s) projects '
+            f'LEFT JOIN "{cursors}" reader ON reader.project_id = projects.project_id AND reader.user_id = %s',
+            [user.pk, UNREAD_COUNT_CAP + 1, user.pk, user.pk],
+        )
+        return {project_id: count for project_id, count in cursor.fetchall() if count}
+
+
+def annotate_unread(user, projects):
+    """Set unread (capped at UNREAD_COUNT_CAP) and unread_more on each project"""
+    counts = unread_counts(user)
+    for project in projects:
+        count = counts.get(project.id, 0)
+        project.unread = min(count, UNREAD_COUNT_CAP)
+        project.unread_more = count > UNREAD_COUNT_CAP
+    return projects
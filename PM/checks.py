@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .utils import shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Dashboards and fragments are invalidated through the cache, which every worker must share"""
+    if settings.DEBUG or shared_cache():
+        return []
+    return [Warning(
+        "The default cache is private to each process, so workers serve each other's stale dashboards and fragments.",
+        hint="Set REDIS_URL, or configure another shared cache backend such as memcached.",
+        id="PM.W001",
+    )]
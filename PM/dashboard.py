@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Project, Task
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300)
+CALENDAR_MAX_WINDOW = timedelta(days=getattr(settings, "CALENDAR_MAX_WINDOW_DAYS", 92))
+# Tasks still open, i.e. shown on the calendar
+OPEN_STATUSES = ("todo", "in_progress")
+
+
+def dashboard_cache_key(user_id):
+    return f"pm:dashboard:{user_id}"
+
+
+def invalidate_dashboard(*user_ids):
+    """Drop the cached dashboard payload for each given user"""
+    keys = [dashboard_cache_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def build_dashboard(user):
+    """Build the dashboard payload with two queries, independent of task volume.
+
+    Every queryset is evaluated exactly once into a list, and assigned tasks
+    carry their project through a join so templates never hit the database.
+    The calendar fetches its events separately, see calendar_tasks.
+    """
+    my_projects = list(Project.objects.filter(manager=user))
+    assigned_tasks = list(Task.objects.filter(assignee=user).select_related("project"))
+    return {
+        "my_projects": my_projects,
+        "assigned_tasks": assigned_tasks,
+    }
+
+
+def get_dashboard(user):
+    """Return the cached dashboard payload for user, building it on a miss"""
+    key = dashboard_cache_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def link_pending_email_tasks(user):
+    """Assign tasks that were invited by email to user; returns how many"""
+    if not user.email:
+        return 0
+    pending = Task.objects.filter(assignee_email=user.email, assignee__isnull=True)
+    if not pending.exists():
+        return 0
+    linked = pending.update(assignee=user, assignee_email=None)
+    invalidate_dashboard(user.pk)
+    return linked
+
+
+def parse_moment(value):
+    """Read a calendar bound: an ISO datetime (with or without offset) or a date"""
+    moment = parse_datetime(value or "")
+    if moment is None:
+        day = parse_date(value or "")
+        if day is None:
+            raise ValueError(f"Invalid date: {value!r}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_window(params):
+    """Return the (start, end) window asked for by the calendar's query string"""
+    start, end = parse_moment(params.get("start")), parse_moment(params.get("end"))
+    if not start < end <= start + CALENDAR_MAX_WINDOW:
+        raise ValueError(f"The window must end after it starts and span at most {CALENDAR_MAX_WINDOW.days} days.")
+    return start, end
+
+
+def calendar_tasks(user, start, end):
+    """Open tasks of user whose span (created_at to deadline) overlaps [start, end).
+
+    The (assignee, status, deadline) index narrows this to tasks due after
+    the window starts; only those are checked for having begun before it ends.
+    """
+    return Task.objects.filter(
+        assignee=user, status__in=OPEN_STATUSES, deadline__gte=start, created_at__lt=end
+    )
+
+
+def calendar_events(tasks):
+    return [
+        {
+            "title": title,
+            "start": timezone.localtime(created_at).date().isoformat(),
+            "end": timezone.localtime(deadline).date().isoformat(),
+            "url": reverse("project_detail", args=[project_id]),
+            "color": "#0d6efd",
+        }
+        for title, created_at, deadline, project_id in tasks.order_by("deadline").values_list(
+            "title", "created_at", "deadline", "project_id"
+        )
+    ]
+
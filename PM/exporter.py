@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+import time
+import zipfile
+from itertools import chain
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .archive import read_segment
+from .models import ChatBlob, ProjectMessage, Task, TaskInvite
+
+EXPORT_CHUNK_SIZE = 2000
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# Columns per kind; joined names are resolved in the same query. Invite
+# tokens are deliberately left out because they grant access.
+EXPORT_KINDS = {
+    "tasks": (Task, [
+        "id", "title", "description", "status", "deadline", "created_at",
+        "assignee_id", "assignee__username", "assignee_email",
+    ]),
+    "messages": (ProjectMessage, [
+        "id", "user_id", "user__username", "text", "file", "blob__file", "blob_name", "reply_to_id", "created_at",
+    ]),
+    "invites": (TaskInvite, [
+        "id", "email", "inviter__username", "created_at", "accepted_at", "is_active",
+    ]),
+}
+
+
+def iter_records(project, kind):
+    """Yield one dict per row, fetched in server-side chunks so memory stays flat"""
+    model, fields = EXPORT_KINDS[kind]
+    rows = model.objects.filter(project=project).order_by("id").values(*fields)
+    records = rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if project.archive_segments.exists():
+        # Archiving moves the newest rows first, so the segments follow on from any left behind
+        records = chain(records, archived_records(project, kind))
+    return records
+
+
+def archived_records(project, kind):
+    """Yield the rows of kind in the project's archive segments as iter_records does, one segment at a time"""
+    model, fields = EXPORT_KINDS[kind]
+    segments = project.archive_segments.filter(kind=kind[:-1]).order_by("first_id")
+    for segment in segments.iterator():
+        objects = read_segment(segment)
+        # Joined names, resolved the way values() follows the relation
+        related = {}
+        for name in {field.split("__")[0] for field in fields if "__" in field}:
+            foreign_key = model._meta.get_field(name)
+            related[name] = foreign_key.related_model.objects.in_bulk(
+                {getattr(obj, foreign_key.attname) for obj in objects} - {None}
+            )
+        for obj in objects:
+            record = {}
+            for field in fields:
+                if "__" in field:
+                    name, column = field.split("__")
+                    target = related[name].get(getattr(obj, model._meta.get_field(name).attname))
+                    owner = target._meta.get_field(column) if target is not None else None
+                    record[field] = owner.get_prep_value(owner.value_from_object(target)) if owner else None
+                else:
+                    column = model._meta.get_field(field)
+                    record[field] = column.get_prep_value(column.value_from_object(obj))
+            yield record
+
+
+def archived_attachments(project):
+    """Yield the names of the files used by the project's archived messages"""
+    segments = project.archive_segments.filter(kind="message").order_by("first_id")
+    for segment in segments.iterator():
+        for message in read_segment(segment):
+            if message.file:
+                yield message.file.name
+    blob_ids = set(chain.from_iterable(segments.values_list("blob_ids", flat=True)))
+    yield from ChatBlob.objects.filter(pk__in=blob_ids).order_by("pk").values_list("file", flat=True)
+
+
+def jsonl_lines(project, kinds):
+    for kind in kinds:
+        for record in iter_records(project, kind):
+            yield json.dumps({"type": kind[:-1], **record}, cls=DjangoJSONEncoder) + "\n"
+
+
+class Echo:
+    """File-like object whose write() hands the value straight back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(project, kind):
+    writer = csv.writer(Echo())
+    fields = EXPORT_KINDS[kind][1]
+    yield writer.writerow(fields)
+    for record in iter_records(project, kind):
+        yield writer.writerow([record[field] for field in fields])
+
+
+class ZipStream(io.RawIOBase):
+    """Write-only sink zipfile can write into while we drain it between entries"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_chunks(project, kinds, include_attachments=True):
+    """Yield a zip archive of JSONL files (and chat attachments) piece by piece"""
+    sink = ZipStream()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, "w") as archive:
+        for kind in kinds:
+            info = zipfile.ZipInfo(f"{kind}.jsonl", date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w", force_zip64=True) as entry:
+                for line in jsonl_lines(project, [kind]):
+                    entry.write(line.encode())
+                    if sink.chunks:
+                        yield sink.drain()
+
+        if include_attachments:
+            messages = ProjectMessage.objects.filter(project=project).order_by("id")
+            files = messages.exclude(file="").exclude(file__isnull=True).values_list("file", flat=True)
+            # Shared blobs are written once even when several messages use them
+            blobs = messages.filter(blob__isnull=False).order_by("blob_id").values_list("blob__file", flat=True).distinct()
+            written = set()
+            for name in chain(
+                files.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+                blobs.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+                archived_attachments(project),
+            ):
+                if name in written or not default_storage.exists(name):
+                    continue
+                written.add(name)
+                info = zipfile.ZipInfo(f"attachments/{name}", date_time)
+                info.compress_type = zipfile.ZIP_STORED
+                with default_storage.open(name, "rb") as source, archive.open(info, "w", force_zip64=True) as entry:
+                    while chunk := source.read(ATTACHMENT_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield sink.drain()
+    # Remaining entry trailers and the central directory
+    yield sink.drain()
+
+
+def export_stream(project, fmt, kinds, include_attachments=True):
+    """Return (content iterator, content type, file extension) for an export"""
+    if fmt == "zip":
+        return zip_chunks(project, kinds, include_attachments), "application/zip", "zip"
+    if fmt == "csv":
+        if len(kinds) != 1:
+            raise ValueError("CSV exports cover exactly one kind.")
+        return csv_lines(project, kinds[0]), "text/csv", "csv"
+    return jsonl_lines(project, kinds), "application/x-ndjson", "jsonl"
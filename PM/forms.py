@@ -69,6 +69,13 @@ class TaskForm(forms.ModelForm):
         return cleaned_data
 
 
+class TaskImportForm(TaskForm):
+    """Validates one imported row: TaskForm rules, with assignees given by email only"""
+
+    class Meta(TaskForm.Meta):
+        fields = ["title", "description", "deadline", "status"]
+
+
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
@@ -0,0 +1,92 @@
+"""Versioned template fragment caching.
+
+Every cached object has a version token in the cache. Fragments are
+stored under a key that includes it, and save/delete signals replace the
+token, so an edited object simply stops matching its old fragments and
+nothing ever needs flushing. A version that was evicted is recreated
+as a fresh token, never a reused one, so old fragments cannot come back.
+
+List views call ``prime_versions`` once for the objects they render, so
+each fragment then costs a single cache read. Hits and misses are
+counted per fragment name in the worker process.
+"""
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def version_key(label, pk):
+    return f"fragment-version:{label}:{pk}"
+
+
+def new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def bump_versions(model, pks):
+    """Invalidate every cached fragment of the given objects"""
+    label = model._meta.label_lower
+    cache.set_many({version_key(label, pk): new_version() for pk in pks}, timeout=None)
+
+
+def bump_version(instance):
+    bump_versions(type(instance), [instance.pk])
+
+
+def prime_versions(objects):
+    """Load the versions of many objects in one cache round trip"""
+    objects = [obj for obj in objects if obj.pk is not None]
+    if not objects:
+        return objects
+    keys = {obj: version_key(obj._meta.label_lower, obj.pk) for obj in objects}
+    versions = cache.get_many(list(keys.values()))
+    missing = {}
+    for obj, key in keys.items():
+        if key not in versions:
+            versions[key] = missing[key] = new_version()
+        obj._fragment_version = versions[key]
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return objects
+
+
+def get_version(obj):
+    if getattr(obj, "_fragment_version", None) is None:
+        prime_versions([obj])
+    return obj._fragment_version
+
+
+class FragmentStats:
+    def __init__(self):
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, hit):
+        with self._lock:
+            (self.hits if hit else self.misses)[name] += 1
+
+    def summary(self):
+        with self._lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return {
+                name: {
+                    "hits": self.hits[name],
+                    "misses": self.misses[name],
+                    "hit_ratio": round(self.hits[name] / (self.hits[name] + self.misses[name]), 3),
+                }
+                for name in names
+            }
+
+    def clear(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+fragment_stats = FragmentStats()
@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+import secrets
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .dashboard import invalidate_dashboard
+from .forms import TaskImportForm
+from .models import Notification, OutboundEmail, Project, ProjectMembership, Task, TaskInvite
+from .notifications import queue_notifications
+from .ratelimit import invite_limiter
+from .search import reindex_objects
+from .utils import invitation_message
+
+IMPORT_CHUNK_SIZE = getattr(settings, "IMPORT_CHUNK_SIZE", 500)
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def iter_rows(fileobj, fmt):
+    """Yield (row_number, data) pairs from a binary CSV or JSONL stream, one line at a time"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+    elif fmt == "jsonl":
+        number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, ImportFormatError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                yield number, ImportFormatError("Each line must be a JSON object.")
+                continue
+            yield number, row
+    else:
+        raise ImportFormatError(f"Unsupported format: {fmt}")
+
+
+def guess_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+class TaskImporter:
+    """Validate and insert streamed task rows in chunks.
+
+    Each chunk costs a constant number of queries: one to resolve the
+    assignee emails not seen yet, one bulk insert, and the bulk
+    bookkeeping that signals would otherwise do per row, committed with
+    the chunk so an import cut short leaves no stale counters or missing
+    memberships. Emails without an account become pending invitations,
+    deduplicated per project and counted against the inviter's
+    invitation limit; past it the tasks still wait for their assignee but
+    no invitation goes out. Existing users get one assignment notification
+    per chunk instead of one per task.
+    """
+
+    def __init__(self, project, inviter, build_invite_url, chunk_size=IMPORT_CHUNK_SIZE):
+        self.project = project
+        self.inviter = inviter
+        self.build_invite_url = build_invite_url
+        self.chunk_size = chunk_size
+        self.users_by_email = {}
+        self.invited = set(
+            TaskInvite.objects.filter(project=project, is_active=True).values_list("email", flat=True)
+        )
+        self.rows = self.created = self.errors = self.invites_created = self.invites_refused = 0
+
+    def run(self, rows):
+        """Import (row_number, data) pairs, yielding progress and error events"""
+        chunk = []
+        for number, data in rows:
+            self.rows += 1
+            task = self.validate(number, data)
+            if isinstance(task, dict):
+                self.errors += 1
+                yield task
+                continue
+            chunk.append(task)
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = []
+                yield self.progress()
+        if chunk:
+            self.flush(chunk)
+        yield dict(self.progress(), type="done", invited=self.invites_created, not_invited=self.invites_refused)
+
+    def progress(self):
+        return {"type": "progress", "rows": self.rows, "created": self.created, "errors": self.errors}
+
+    def validate(self, number, data):
+        if isinstance(data, Exception):
+            return {"type": "error", "row": number, "errors": {"__all__": [str(data)]}}
+        data = {key: value for key, value in data.items() if key}
+        if not data.get("status"):
+            data["status"] = "todo"
+        form = TaskImportForm(data)
+        if not form.is_valid():
+            errors = {field: [str(error) for error in field_errors] for field, field_errors in form.errors.items()}
+            return {"type": "error", "row": number, "errors": errors}
+        task = form.save(commit=False)
+        task.project = self.project
+        task.assignee_email = form.cleaned_data["assignee_email"]
+        return task
+
+    def flush(self, tasks):
+        unknown = {task.assignee_email for task in tasks} - self.users_by_email.keys()
+        if unknown:
+            for user in User.objects.filter(email__in=unknown).order_by("-pk"):
+                # Lowest pk wins when several accounts share an address
+                self.users_by_email[user.email] = user
+            for email in unknown:
+                self.users_by_email.setdefault(email, None)
+
+        emails = []
+        assigned = Counter()
+        for task in tasks:
+            user = self.users_by_email[task.assignee_email]
+            if user is not None:
+                task.assignee = user
+                task.assignee_email = None
+                assigned[user] += 1
+            elif task.assignee_email not in self.invited:
+                self.invited.add(task.assignee_email)
+                emails.append(task.assignee_email)
+
+        granted = invite_limiter.take(f"user:{self.inviter.pk}", len(emails)) if emails else 0
+        self.invited.difference_update(emails[granted:])
+        new_invites = [
+            TaskInvite(email=email, inviter=self.inviter, project=self.project, token=secrets.token_urlsafe(48))
+            for email in emails[:granted]
+        ]
+
+        with transaction.atomic():
+            Task.objects.bulk_create(tasks)
+            # bulk_create skips the save signal that indexes each task
+            reindex_objects("task", [task.pk for task in tasks])
+            TaskInvite.objects.bulk_create(new_invites)
+            OutboundEmail.objects.bulk_create([
+                self.invitation_email(invite) for invite in new_invites
+            ])
+            # What the Task signals do per saved row, once for the chunk
+            Project.recount_tasks([self.project.pk])
+            ProjectMembership.sync_assignees([self.project.pk])
+            queue_notifications(
+                Notification(recipient=user, kind="assigned", message=f"{count} new task(s) in {self.project.name}")
+                for user, count in assigned.items()
+            )
+        invalidate_dashboard(*(user.pk for user in assigned))
+        self.created += len(tasks)
+        self.invites_created += len(new_invites)
+        self.invites_refused += len(emails) - granted
+
+    def invitation_email(self, invite):
+        subject, message = invitation_message(self.inviter, self.project, self.build_invite_url(invite.token))
+        return OutboundEmail(subject=subject, body=message, from_email=settings.EMAIL_HOST_USER, recipients=[invite.email])
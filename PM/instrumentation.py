@@ -0,0 +1,171 @@
+"""Per-request SQL accounting that works with DEBUG off.
+
+``QueryInstrumentationMiddleware`` wraps every query the view runs on the
+default connection, counts it, times it and groups it by shape so loops
+such as ``task.project`` or ``message.reply_to.user`` in a template show
+up as one shape repeated many times. Each response gets a Server-Timing
+header, and reports are folded into ``query_stats``, a rolling window the
+staff endpoint reads. The window lives in the worker process, so with
+several workers each one reports its own traffic.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("PM.sql")
+
+SQL_INSTRUMENTATION_LOG = getattr(settings, "SQL_INSTRUMENTATION_LOG", False)
+SQL_N_PLUS_ONE_THRESHOLD = getattr(settings, "SQL_N_PLUS_ONE_THRESHOLD", 5)
+SQL_STATS_WINDOW = getattr(settings, "SQL_STATS_WINDOW", 15 * 60)
+
+IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def query_shape(sql):
+    """Collapse a query to its shape so repeats with other values group together"""
+    return NUMBER_RE.sub("?", IN_LIST_RE.sub("IN (...)", sql))
+
+
+class QueryRecorder:
+    """execute_wrapper hook that tallies queries for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold=SQL_N_PLUS_ONE_THRESHOLD):
+        """Shapes run at least threshold times, most repeated first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def empty_totals():
+    return {"requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "n_plus_one": 0, "shapes": Counter()}
+
+
+class RollingQueryStats:
+    """Per-view query totals kept in one-minute buckets over a sliding window"""
+
+    def __init__(self, window=SQL_STATS_WINDOW, bucket_seconds=60):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        # A bucket is dropped once all of it has slid out of the window
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= now - self.window:
+            self._buckets.popleft()
+
+    def record(self, view, report, now=None):
+        now = time.time() if now is None else now
+        start = now - now % self.bucket_seconds
+        with self._lock:
+            self._trim(now)
+            if not self._buckets or self._buckets[-1][0] != start:
+                self._buckets.append((start, {}))
+            views = self._buckets[-1][1]
+            totals = views.setdefault(view, empty_totals())
+            totals["requests"] += 1
+            totals["queries"] += report["queries"]
+            totals["db_ms"] += report["db_ms"]
+            totals["max_queries"] = max(totals["max_queries"], report["queries"])
+            if report["repeated"]:
+                totals["n_plus_one"] += 1
+                totals["shapes"].update(dict(report["repeated"]))
+
+    def worst(self, limit=20, order_by="queries", now=None):
+        """Merge the window's buckets and rank views by average queries or DB time"""
+        now = time.time() if now is None else now
+        merged = {}
+        with self._lock:
+            self._trim(now)
+            for _, views in self._buckets:
+                for view, totals in views.items():
+                    into = merged.setdefault(view, empty_totals())
+                    for key in ("requests", "queries", "db_ms", "n_plus_one"):
+                        into[key] += totals[key]
+                    into["max_queries"] = max(into["max_queries"], totals["max_queries"])
+                    into["shapes"].update(totals["shapes"])
+
+        rows = [
+            {
+                "view": view,
+                "requests": totals["requests"],
+                "avg_queries": round(totals["queries"] / totals["requests"], 1),
+                "max_queries": totals["max_queries"],
+                "avg_db_ms": round(totals["db_ms"] / totals["requests"], 2),
+                "n_plus_one_requests": totals["n_plus_one"],
+                "repeated_shapes": [
+                    {"sql": shape, "count": count} for shape, count in totals["shapes"].most_common(5)
+                ],
+            }
+            for view, totals in merged.items()
+        ]
+        key = "avg_db_ms" if order_by == "db_ms" else "avg_queries"
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+query_stats = RollingQueryStats()
+
+
+def server_timing(report):
+    return (
+        f'db;dur={report["db_ms"]:.2f};desc="{report["queries"]} queries", '
+        f'app;dur={report["total_ms"]:.2f}'
+    )
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        report = {
+            "view": view,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "repeated": recorder.repeated(),
+        }
+        query_stats.record(view, report)
+
+        response["Server-Timing"] = server_timing(report)
+        if SQL_INSTRUMENTATION_LOG:
+            logger.info(json.dumps({
+                **report,
+                "path": request.path,
+                "repeated": [{"sql": shape, "count": count} for shape, count in report["repeated"]],
+            }))
+        return response
@@ -0,0 +1,39 @@
+import time
+
+from PM.archive import ARCHIVE_BATCH_SIZE, archive_project, due_projects
+from PM.management.polling import PollingCommand
+from PM.models import Project
+
+
+class Command(PollingCommand):
+    help = "Move finished projects' tasks, chat history and invites to compressed cold storage"
+    batch_size = ARCHIVE_BATCH_SIZE
+    batch_size_help = "Rows per segment"
+    interval = 60 * 60
+    loop_help = "Keep checking for finished projects instead of exiting"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "project_ids", nargs="*", type=int,
+            help="Archive these projects whatever their end date (also resumes an interrupted run)",
+        )
+        super().add_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options["project_ids"]:
+            options["loop"] = False
+        super().handle(*args, **options)
+
+    def poll(self, batch_size, project_ids, **options):
+        if project_ids:
+            projects = Project.objects.filter(pk__in=project_ids)
+        else:
+            projects = due_projects()
+        for project in projects.iterator():
+            started = time.monotonic()
+            rows = archive_project(project, batch_size=batch_size)
+            self.stdout.write(
+                f"Archived project {project.pk} ({rows} row(s), {time.monotonic() - started:.3f}s)."
+            )
+        # Each project is moved out completely, so there is never a batch left over
+        return 0
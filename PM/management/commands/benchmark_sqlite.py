@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from PM.benchmarks import concurrent_writes
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent write throughput on SQLite with plain settings and with the tuned mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="Concurrent writer threads")
+        parser.add_argument("--readers", type=int, default=4, help="Concurrent reader threads")
+        parser.add_argument("--writes", type=int, default=100, help="Writes per writer")
+        parser.add_argument("--output", help="Also write the results here as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in ("plain", "tuned"):
+            with tempfile.TemporaryDirectory() as directory:
+                results[mode] = concurrent_writes(
+                    os.path.join(directory, "bench.sqlite3"),
+                    tuned=mode == "tuned",
+                    writers=options["writers"],
+                    readers=options["readers"],
+                    writes_per_writer=options["writes"],
+                )
+            self.stdout.write(f"{mode}: {results[mode]}")
+
+        plain, tuned = results["plain"]["writes_per_second"], results["tuned"]["writes_per_second"]
+        if plain:
+            self.stdout.write(self.style.SUCCESS(f"Write throughput x{tuned / plain:.2f} with the tuned mode."))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write("\n")
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from PM.benchmarks import SCALES, compare, dump, run_benchmarks
+from project_management.test_runner import throwaway_cache
+
+
+class Command(BaseCommand):
+    help = "Benchmark the PM views against synthetic datasets in a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="small,medium", help=f"Comma-separated, from: {', '.join(SCALES)}")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per view")
+        parser.add_argument("--output", default="benchmark.json", help="Where to write the JSON results")
+        parser.add_argument("--baseline", help="Earlier results to compare against")
+        parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed wall time growth (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["scales"].split(",") if name.strip()]
+        unknown = set(names) - SCALES.keys()
+        if unknown:
+            raise CommandError(f"Unknown scale(s): {', '.join(sorted(unknown))}")
+
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # The live cache holds the site's sessions and entries keyed by ids the dataset reuses
+            with throwaway_cache():
+                results = run_benchmarks({name: SCALES[name] for name in names}, options["repeat"], log=self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        dump(results, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(results, baseline, options["time_tolerance"])
+            for line in regressions:
+                self.stderr.write(f"REGRESSION {line}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,52 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# A subscriber further behind than this is disconnected rather than buffered
+MAX_PENDING_BYTES = 1024 * 1024
+
+
+async def serve(host, port, ready=None):
+    """Relay every newline-delimited event to all connected worker processes"""
+    writers = set()
+
+    async def handle(reader, writer):
+        writers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(writers):
+                    if peer.is_closing():
+                        writers.discard(peer)
+                    elif peer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+                        writers.discard(peer)
+                        peer.close()
+                    else:
+                        peer.write(line)
+        except ConnectionError:
+            pass
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+class Command(BaseCommand):
+    help = "Run the local pub/sub relay that lets chat workers share realtime events"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default=getattr(settings, "CHAT_BROKER_HOST", "127.0.0.1"))
+        parser.add_argument("--port", type=int, default=getattr(settings, "CHAT_BROKER_PORT", 8765))
+
+    def handle(self, *args, **options):
+        host, port = options["host"], options["port"]
+        self.stdout.write(f"Chat broker listening on {host}:{port}")
+        try:
+            asyncio.run(serve(host, port))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PM.exporter import EXPORT_KINDS, export_stream
+from PM.models import Project
+
+
+class Command(BaseCommand):
+    help = "Dump a project's tasks, chat history and invites without loading them into memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_id", type=int)
+        parser.add_argument("--format", choices=["jsonl", "csv", "zip"], default="jsonl")
+        parser.add_argument("--kind", action="append", choices=list(EXPORT_KINDS), help="Repeatable; defaults to all kinds")
+        parser.add_argument("--no-attachments", action="store_true", help="Leave chat files out of zip exports")
+        parser.add_argument("--output", "-o", help="File to write (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options["project_id"])
+        except Project.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} does not exist.")
+
+        try:
+            content, _, _ = export_stream(
+                project,
+                options["format"],
+                options["kind"] or list(EXPORT_KINDS),
+                include_attachments=not options["no_attachments"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in content:
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from PM.synthetic import SYNTHETIC_PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, projects, tasks and chat history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--projects", type=int, default=10)
+        parser.add_argument("--tasks-per-project", type=int, default=20)
+        parser.add_argument("--messages-per-project", type=int, default=100)
+        parser.add_argument("--reply-ratio", type=float, default=0.3, help="Share of messages that reply to an earlier one")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="synthetic", help="Prefix for generated usernames and project names")
+
+    def handle(self, *args, **options):
+        dataset = generate_dataset(
+            users=options["users"],
+            projects=options["projects"],
+            tasks_per_project=options["tasks_per_project"],
+            messages_per_project=options["messages_per_project"],
+            reply_ratio=options["reply_ratio"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {dataset['users']} users, {dataset['projects']} projects, "
+            f"{dataset['tasks']} tasks and {dataset['messages']} messages. "
+            f"Log in as {dataset['hot_user'].username} / {SYNTHETIC_PASSWORD}."
+        ))
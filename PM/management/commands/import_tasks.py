@@ -0,0 +1,57 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from PM.importer import IMPORT_CHUNK_SIZE, TaskImporter, guess_format, iter_rows
+from PM.models import Project
+
+
+class Command(BaseCommand):
+    help = "Bulk-import tasks into a project from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_id", type=int)
+        parser.add_argument("path", help="CSV (with a header row) or JSONL file")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--inviter", help="Username sending invitations (defaults to the project manager)")
+        parser.add_argument("--base-url", default="http://localhost:8000", help="Site root used in invitation links")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.select_related("manager").get(pk=options["project_id"])
+        except Project.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} does not exist.")
+
+        inviter = project.manager
+        if options["inviter"]:
+            try:
+                inviter = User.objects.get(username=options["inviter"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['inviter']} does not exist.")
+
+        base_url = options["base_url"].rstrip("/")
+        importer = TaskImporter(
+            project,
+            inviter,
+            lambda token: f"{base_url}/invite/{token}/",
+            chunk_size=options["chunk_size"],
+        )
+        fmt = options["format"] or guess_format(options["path"])
+
+        with open(options["path"], "rb") as fileobj:
+            for event in importer.run(iter_rows(fileobj, fmt)):
+                if event["type"] == "error":
+                    self.stderr.write(f"Row {event['row']}: {json.dumps(event['errors'])}")
+                elif event["type"] == "progress":
+                    self.stdout.write(f"{event['rows']} rows read, {event['created']} created, {event['errors']} errors")
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Imported {event['created']} task(s) from {event['rows']} row(s); "
+                        f"{event['invited']} invitation(s) queued, {event['errors']} row(s) rejected."
+                    ))
+                    if event["not_invited"]:
+                        self.stderr.write(
+                            f"{event['not_invited']} address(es) not invited: {inviter.username} reached the invitation limit."
+                        )
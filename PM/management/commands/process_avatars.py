@@ -0,0 +1,13 @@
+from PM.avatars import AVATAR_BATCH_SIZE, process_pending_avatars
+from PM.management.polling import PollingCommand
+
+
+class Command(PollingCommand):
+    help = "Render resized WebP/JPEG derivatives for newly uploaded avatars"
+    batch_size = AVATAR_BATCH_SIZE
+
+    def poll(self, batch_size, **options):
+        done, failed = process_pending_avatars(batch_size)
+        if done or failed:
+            self.stdout.write(f"Rendered {done}, failed {failed}.")
+        return done + failed
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from PM.otp import purge_expired_otps
+
+
+class Command(BaseCommand):
+    help = "Delete expired one-time codes stored in the database"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Purged {purge_expired_otps()} expired code(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from PM.uploads import CHAT_UPLOAD_EXPIRY, purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Remove abandoned chunked uploads and attachment blobs no message uses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age", type=int, default=CHAT_UPLOAD_EXPIRY, help="Seconds since last activity")
+
+    def handle(self, *args, **options):
+        uploads, blobs = purge_stale_uploads(options["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {uploads} upload(s) and {blobs} blob(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from PM.search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from projects, tasks and chat messages"
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            self.stdout.write(self.style.WARNING("Full-text search needs SQLite; nothing to rebuild."))
+            return
+        rows = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {rows} document(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from PM.models import Project
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-status task counters on every project from one grouped query"
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_ids", nargs="*", type=int, help="Only reconcile these projects")
+
+    def handle(self, *args, **options):
+        project_ids = options["project_ids"] or None
+        changed = Project.recount_tasks(project_ids)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled task counters ({changed} project(s) corrected)."))
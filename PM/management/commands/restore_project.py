@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from PM.archive import restore_project
+from PM.models import Project
+
+
+class Command(BaseCommand):
+    help = "Bring an archived project's tasks, chat history and invites back from cold storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_id", type=int)
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options["project_id"])
+        except Project.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} does not exist.")
+
+        rows = restore_project(project)
+        self.stdout.write(self.style.SUCCESS(f"Restored {rows} row(s) to project {project.pk}."))
@@ -0,0 +1,15 @@
+from PM.management.polling import PollingCommand
+from PM.notifications import NOTIFICATION_DIGEST_BATCH_SIZE, send_digests
+
+
+class Command(PollingCommand):
+    help = "Queue one digest email per user whose notification window has closed"
+    batch_size = NOTIFICATION_DIGEST_BATCH_SIZE
+    interval = 30
+    loop_help = "Keep polling instead of exiting when nothing is due"
+
+    def poll(self, batch_size, **options):
+        digests, notifications = send_digests(batch_size=batch_size)
+        if digests:
+            self.stdout.write(f"Queued {digests} digest(s) covering {notifications} notification(s).")
+        return digests
@@ -0,0 +1,14 @@
+from PM.management.polling import PollingCommand
+from PM.outbox import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+class Command(PollingCommand):
+    help = "Deliver queued outbound emails in batches over one SMTP connection"
+    batch_size = OUTBOX_BATCH_SIZE
+    loop_help = "Keep polling instead of exiting when the outbox is empty"
+
+    def poll(self, batch_size, **options):
+        sent, failed = drain_outbox(batch_size)
+        if sent or failed:
+            self.stdout.write(f"Sent {sent}, failed {failed}.")
+        return sent + failed
@@ -0,0 +1,20 @@
+import time
+
+from PM.management.polling import PollingCommand
+from PM.reminders import TASK_REMINDER_BATCH_SIZE, send_due_reminders
+
+
+class Command(PollingCommand):
+    help = "Queue deadline reminder emails for tasks entering a reminder window"
+    batch_size = TASK_REMINDER_BATCH_SIZE
+    interval = 60
+    loop_help = "Keep scanning instead of exiting when nothing is due"
+
+    def poll(self, batch_size, **options):
+        started = time.monotonic()
+        reminders, emails = send_due_reminders(batch_size=batch_size)
+        if reminders:
+            self.stdout.write(
+                f"Queued {reminders} reminder(s) in {emails} email(s) ({time.monotonic() - started:.3f}s)."
+            )
+        return reminders
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class PollingCommand(BaseCommand):
+    """Base for the worker commands that handle pending work in batches.
+
+    Subclasses set the defaults below and implement ``poll``, which handles
+    at most one batch and returns how many items it took. A full batch is
+    followed straight away by the next one; otherwise the command exits,
+    or with --loop sleeps for --interval seconds and polls again.
+    """
+
+    batch_size = 100
+    batch_size_help = "Most items handled per batch"
+    interval = 5
+    loop_help = "Keep polling instead of exiting when nothing is pending"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=self.batch_size, help=self.batch_size_help)
+        parser.add_argument("--loop", action="store_true", help=self.loop_help)
+        parser.add_argument("--interval", type=float, default=self.interval, help="Seconds to sleep between polls with --loop")
+
+    def poll(self, batch_size, **options):
+        raise NotImplementedError("subclasses of PollingCommand must provide a poll() method")
+
+    def handle(self, *args, **options):
+        while True:
+            if self.poll(**options) >= options["batch_size"]:
+                # A full batch means more may be waiting
+                continue
+            if not options["loop"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
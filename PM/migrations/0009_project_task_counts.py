@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 09:29
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_task_counts(apps, schema_editor):
+    Project = apps.get_model('PM', 'Project')
+    Task = apps.get_model('PM', 'Task')
+    fields = {'todo': 'todo_count', 'in_progress': 'in_progress_count', 'done': 'done_count'}
+
+    counts = {}
+    rows = Task.objects.order_by().values_list('project_id', 'status').annotate(n=Count('id'))
+    for project_id, status, n in rows:
+        if status in fields:
+            counts.setdefault(project_id, {})[fields[status]] = n
+
+    projects = list(Project.objects.filter(pk__in=counts))
+    for project in projects:
+        for field, n in counts[project.pk].items():
+            setattr(project, field, n)
+    Project.objects.bulk_update(projects, list(fields.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0008_alter_taskinvite_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='done_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_task_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0009_project_task_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectmessage',
+            index=models.Index(fields=['project', 'created_at', 'id'], name='PM_projectm_project_b0b052_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 09:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_memberships(apps, schema_editor):
+    Project = apps.get_model('PM', 'Project')
+    Task = apps.get_model('PM', 'Task')
+    ProjectMembership = apps.get_model('PM', 'ProjectMembership')
+
+    rows = set()
+    for project_id, manager_id, client_id in Project.objects.values_list('id', 'manager_id', 'client_id'):
+        rows.add((project_id, manager_id, 'manager'))
+        if client_id:
+            rows.add((project_id, client_id, 'client'))
+    assignees = Task.objects.filter(assignee__isnull=False).order_by().values_list('project_id', 'assignee_id').distinct()
+    for project_id, user_id in assignees:
+        rows.add((project_id, user_id, 'assignee'))
+
+    ProjectMembership.objects.bulk_create(
+        [ProjectMembership(project_id=p, user_id=u, role=r) for p, u, r in rows],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0011_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('manager', 'Manager'), ('client', 'Client'), ('assignee', 'Assignee')], max_length=10)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='PM.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'project', 'role'), name='unique_project_membership')],
+            },
+        ),
+        migrations.RunPython(backfill_memberships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0012_projectmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200)),
+                ('window', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('key', 'window'), name='unique_rate_limit_window')],
+            },
+        ),
+    ]
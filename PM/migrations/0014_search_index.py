@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations
+
+# (kind code, source table, title column, body column, project column)
+SOURCES = [
+    (1, 'PM_project', 'name', 'description', 'id'),
+    (2, 'PM_task', 'title', 'description', 'project_id'),
+    (3, 'PM_projectmessage', "''", 'text', 'project_id'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE "PM_search" USING fts5('
+        'title, body, kind UNINDEXED, object_id UNINDEXED, project_id UNINDEXED, '
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    for code, table, title, body, project in SOURCES:
+        schema_editor.execute(
+            f'INSERT INTO "PM_search" (rowid, title, body, kind, object_id, project_id) '
+            f'SELECT id * 4 + {code}, {title}, {body}, {code}, id, {project} FROM "{table}"'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS "PM_search"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0013_ratelimitcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
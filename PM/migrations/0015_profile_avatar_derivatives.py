@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+def queue_existing_avatars(apps, schema_editor):
+    Profile = apps.get_model('PM', 'Profile')
+    Profile.objects.exclude(avatar='').exclude(avatar='avatars/default.png').update(avatar_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_pending',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(queue_existing_avatars, migrations.RunPython.noop),
+    ]
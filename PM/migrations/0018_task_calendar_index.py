@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0017_api_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assignee', 'status', 'deadline'], name='PM_task_assigne_7a3dee_idx'),
+        ),
+    ]
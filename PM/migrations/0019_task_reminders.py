@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0018_task_calendar_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('deadline', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'deadline'], name='PM_task_status_97c7d1_idx'),
+        ),
+        migrations.AddField(
+            model_name='taskreminder',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='PM.task'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskreminder',
+            constraint=models.UniqueConstraint(fields=('task', 'kind', 'deadline'), name='unique_task_reminder'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 15:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0019_task_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('assigned', 'Assigned'), ('status', 'Status change')], max_length=10)),
+                ('message', models.CharField(max_length=500)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='PM.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'created_at'], name='PM_notifica_recipie_c1640e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 15:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0020_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='emailotp',
+            name='is_verified',
+        ),
+        migrations.AlterField(
+            model_name='emailotp',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='otps', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='emailotp',
+            name='purpose',
+            field=models.CharField(choices=[('verify', 'Email verification'), ('reset', 'Password reset')], default='verify', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='emailotp',
+            name='otp',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddField(
+            model_name='emailotp',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        # Existing codes never expired; they expire now and the next purge drops them
+        migrations.AddField(
+            model_name='emailotp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='emailotp',
+            constraint=models.UniqueConstraint(fields=('user', 'purpose'), name='unique_user_otp'),
+        ),
+    ]
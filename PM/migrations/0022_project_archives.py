@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0021_expiring_otps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Tasks'), ('message', 'Chat messages'), ('invite', 'Invites')], max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('rows', models.PositiveIntegerField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('blob_ids', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='PM.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'kind', 'first_id'], name='PM_archives_project_a38993_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0022_project_archives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='projectmessage',
+            index=models.Index(fields=['project', 'id', 'user'], name='PM_projectm_project_2ac142_idx'),
+        ),
+        migrations.AddField(
+            model_name='chatreadcursor',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='PM.project'),
+        ),
+        migrations.AddField(
+            model_name='chatreadcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='chatreadcursor',
+            constraint=models.UniqueConstraint(fields=('user', 'project'), name='unique_chat_read_cursor'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0023_chat_read_cursors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='restored_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
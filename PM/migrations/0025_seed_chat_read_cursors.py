@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 18:20
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_read_cursors(apps, schema_editor):
+    # Everything posted before unread counts existed counts as read
+    ProjectMessage = apps.get_model('PM', 'ProjectMessage')
+    ProjectMembership = apps.get_model('PM', 'ProjectMembership')
+    ChatReadCursor = apps.get_model('PM', 'ChatReadCursor')
+    newest = dict(
+        ProjectMessage.objects.order_by().values('project_id').annotate(newest=Max('id')).values_list('project_id', 'newest')
+    )
+    members = (
+        ProjectMembership.objects.filter(project_id__in=newest).order_by()
+        .values_list('project_id', 'user_id').distinct()
+    )
+    ChatReadCursor.objects.bulk_create(
+        [ChatReadCursor(project_id=p, user_id=u, last_read_id=newest[p]) for p, u in members.iterator()],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PM', '0024_project_restored_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_read_cursors, migrations.RunPython.noop),
+    ]
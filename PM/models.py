@@ -1,8 +1,19 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F
 from django.contrib.auth.models import User
 from django.utils import timezone
 import secrets
 
+from .fragments import bump_versions
+from .search import reindex_tasks
+
+# Maps a task status to the counter column that tracks it on Project
+TASK_COUNT_FIELDS = {
+    "todo": "todo_count",
+    "in_progress": "in_progress_count",
+    "done": "done_count",
+}
+
 # Project Model
 class Project(models.Model):
     name = models.CharField(max_length=200)
@@ -12,16 +23,123 @@ class Project(models.Model):
     manager = models.ForeignKey(User, on_delete=models.CASCADE, related_name="managed_projects")
     client = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="client_projects")
 
+    # Denormalized task counters, kept in sync by the Task signals in signals.py
+    todo_count = models.IntegerField(default=0, editable=False)
+    in_progress_count = models.IntegerField(default=0, editable=False)
+    done_count = models.IntegerField(default=0, editable=False)
+    # Bumped on every change, counters included; feeds the API ETags
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set once the project's rows start moving to cold storage (see archive.py);
+    # an archived project is read-only
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Set by restore_project; the project is not due again until this is
+    # ARCHIVE_AFTER_DAYS old too
+    restored_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Manager as last read from or written to the database; None for new rows
+    _db_manager_id = None
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._db_manager_id = instance.__dict__.get("manager_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._db_manager_id = self.manager_id
+
+    @property
+    def is_archived(self):
+        return self.archived_at is not None
+
+    @property
+    def task_count(self):
+        return self.todo_count + self.in_progress_count + self.done_count
+
     @property
     def progress(self):
-        total = self.tasks.count()
+        total = self.task_count
         if total == 0:
             return 0
-        completed = self.tasks.filter(status="done").count()
-        return int((completed / total) * 100)
+        return int((self.done_count / total) * 100)
+
+    @classmethod
+    def adjust_task_count(cls, project_id, status, delta):
+        """Atomically add delta to the counter for status on one project"""
+        field = TASK_COUNT_FIELDS.get(status)
+        if project_id is None or field is None or not delta:
+            return
+        cls.objects.filter(pk=project_id).update(**{field: F(field) + delta, "updated_at": timezone.now()})
+
+    @classmethod
+    def recount_tasks(cls, project_ids=None):
+        """Rebuild the task counters from one grouped query.
+
+        Only the given projects are touched when project_ids is passed,
+        otherwise every project is reconciled. Returns the number of
+        projects whose counters changed.
+        """
+        rows = Task.objects.order_by().values_list("project_id", "status").annotate(n=Count("id"))
+        # Archived projects keep the counters their tasks had when moved out
+        projects = cls.objects.filter(archived_at__isnull=True).only("id", *TASK_COUNT_FIELDS.values())
+        if project_ids is not None:
+            project_ids = [pk for pk in project_ids if pk is not None]
+            rows = rows.filter(project_id__in=project_ids)
+            projects = projects.filter(pk__in=project_ids)
+
+        counts = {}
+        for project_id, status, n in rows:
+            field = TASK_COUNT_FIELDS.get(status)
+            if field:
+                counts.setdefault(project_id, {})[field] = n
+
+        changed = []
+        for project in projects.iterator():
+            project_counts = counts.get(project.id, {})
+            dirty = False
+            for field in TASK_COUNT_FIELDS.values():
+                value = project_counts.get(field, 0)
+                if getattr(project, field) != value:
+                    setattr(project, field, value)
+                    dirty = True
+            if dirty:
+                project.updated_at = timezone.now()
+                changed.append(project)
+
+        cls.objects.bulk_update(changed, [*TASK_COUNT_FIELDS.values(), "updated_at"], batch_size=500)
+        return len(changed)
+
+
+class TaskQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Queryset updates skip the post_save handlers, so rebuild the
+        # counters, memberships and search rows involved whenever the
+        # columns they depend on change, and drop the cached task rows.
+        kwargs.setdefault("updated_at", timezone.now())
+        changed = kwargs.keys()
+        recount = bool({"status", "project", "project_id"} & changed)
+        resync = bool({"assignee", "assignee_id", "project", "project_id"} & changed)
+        reindex = bool({"title", "description", "project", "project_id"} & changed)
+
+        with transaction.atomic(using=self.db):
+            project_ids = set(self.order_by().values_list("project_id", flat=True).distinct())
+            task_ids = list(self.values_list("id", flat=True))
+            rows = super().update(**kwargs)
+            bump_versions(Task, task_ids)
+            target = kwargs.get("project_id", kwargs.get("project"))
+            if target is not None:
+                project_ids.add(getattr(target, "pk", target))
+            if recount:
+                Project.recount_tasks(project_ids)
+            if resync:
+                ProjectMembership.sync_assignees(project_ids)
+            if reindex:
+                reindex_tasks(task_ids)
+        return rows
 
 
 # Task Model
@@ -40,10 +158,126 @@ class Task(models.Model):
     deadline = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="todo")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Covers the per-project ETag aggregates of the task API
+            models.Index(fields=["project", "updated_at"]),
+            # Calendar lookups: a user's open tasks by deadline
+            models.Index(fields=["assignee", "status", "deadline"]),
+            # Reminder scans: one deadline range per open status
+            models.Index(fields=["status", "deadline"]),
+        ]
+
+    # Column values as last read from or written to the database; empty for new rows
+    _db_state = {}
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._db_state = instance.snapshot()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save handlers have seen the old state by now
+        self._db_state = self.snapshot()
+
+    def snapshot(self):
+        """Return the tracked columns without triggering deferred loads"""
+        return {field: self.__dict__.get(field) for field in ("project_id", "status", "assignee_id")}
+
+
+class TaskReminder(models.Model):
+    """A deadline reminder already sent, so the scheduler never repeats it.
+
+    Keyed by the deadline it was sent for: moving the deadline re-arms
+    every reminder of the task.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="reminders")
+    kind = models.CharField(max_length=20)
+    deadline = models.DateTimeField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["task", "kind", "deadline"], name="unique_task_reminder"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} reminder for task {self.task_id}"
+
+
+class ProjectMembership(models.Model):
+    """Materialized "who belongs to which project", one row per role held"""
+    ROLE_CHOICES = [
+        ("manager", "Manager"),
+        ("client", "Client"),
+        ("assignee", "Assignee"),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="memberships")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="project_memberships")
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        constraints = [
+            # Leading user column also serves "projects for this user" lookups
+            models.UniqueConstraint(fields=["user", "project", "role"], name="unique_project_membership"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} is {self.role} of {self.project_id}"
+
+    @classmethod
+    def sync_project_roles(cls, project):
+        """Make the manager and client rows match the project's fields"""
+        wanted = {(role, user_id) for role, user_id in (("manager", project.manager_id), ("client", project.client_id)) if user_id}
+        existing = set(cls.objects.filter(project=project, role__in=["manager", "client"]).values_list("role", "user_id"))
+        for role, user_id in existing - wanted:
+            cls.objects.filter(project=project, role=role, user_id=user_id).delete()
+        cls.objects.bulk_create(
+            [cls(project=project, role=role, user_id=user_id) for role, user_id in wanted - existing],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def add_assignee(cls, project_id, user_id):
+        if project_id and user_id:
+            cls.objects.get_or_create(project_id=project_id, user_id=user_id, role="assignee")
+
+    @classmethod
+    def release_assignee(cls, project_id, user_id):
+        """Drop the assignee row once the user holds no tasks in the project"""
+        if not project_id or not user_id:
+            return
+        if not Task.objects.filter(project_id=project_id, assignee_id=user_id).exists():
+            cls.objects.filter(project_id=project_id, user_id=user_id, role="assignee").delete()
+
+    @classmethod
+    def sync_assignees(cls, project_ids):
+        """Rebuild the assignee rows of the given projects from their tasks"""
+        project_ids = [pk for pk in project_ids if pk is not None]
+        wanted = set(
+            Task.objects.filter(project_id__in=project_ids, assignee__isnull=False)
+            .order_by().values_list("project_id", "assignee_id").distinct()
+        )
+        existing = set(
+            cls.objects.filter(project_id__in=project_ids, role="assignee").values_list("project_id", "user_id")
+        )
+        for project_id, user_id in existing - wanted:
+            cls.objects.filter(project_id=project_id, user_id=user_id, role="assignee").delete()
+        cls.objects.bulk_create(
+            [cls(project_id=project_id, user_id=user_id, role="assignee") for project_id, user_id in wanted - existing],
+            ignore_conflicts=True,
+        )
+
 
 # Profile Model (extra info for User)
 class Profile(models.Model):
@@ -53,22 +287,96 @@ class Profile(models.Model):
     linkedin = models.URLField(blank=True, null=True)
     address = models.CharField(max_length=255, blank=True, null=True)
     occupation = models.CharField(max_length=120, blank=True)
+    # Content hash naming the resized avatar derivatives; empty until the
+    # process_avatars worker has rendered the current upload
+    avatar_hash = models.CharField(max_length=16, blank=True, editable=False)
+    avatar_pending = models.BooleanField(default=False, editable=False, db_index=True)
+
+    # Avatar name as last read from or written to the database; None for new rows
+    _db_avatar = None
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._db_avatar = instance.__dict__.get("avatar")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.avatar.name != self._db_avatar:
+            # Old derivatives belong to the previous image
+            self.avatar_hash = ""
+            self.avatar_pending = bool(self.avatar.name) and self.avatar.name != self._meta.get_field("avatar").default
+        super().save(*args, **kwargs)
+        self._db_avatar = self.avatar.name
+
 class EmailOTP(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    otp = models.CharField(max_length=6)
-    is_verified = models.BooleanField(default=False)
+    """A user's current one-time code for one purpose (see otp.py)"""
+    PURPOSE_CHOICES = [
+        ("verify", "Email verification"),
+        ("reset", "Password reset"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="otps")
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, default="verify")
+    # Keyed hash of the code, never the code itself
+    otp = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "purpose"], name="unique_user_otp"),
+        ]
+
+
+class ChatBlob(models.Model):
+    """Chat attachment content, stored once per distinct SHA-256 digest"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to="chat_blobs/")
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
+
+class ChatUpload(models.Model):
+    """A resumable, chunked attachment upload; bytes collect in a partial file on disk"""
+    token = models.CharField(max_length=64, unique=True, blank=True)
+    project = models.ForeignKey("Project", on_delete=models.CASCADE, related_name="uploads")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chat_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    blob = models.ForeignKey(ChatBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name="uploads")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        if not self.token:
+            self.token = secrets.token_urlsafe(32)
+        super().save(*args, **kwargs)
+
+    @property
+    def is_complete(self):
+        return self.blob_id is not None
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
 
 class ProjectMessage(models.Model):
     project = models.ForeignKey("Project", on_delete=models.CASCADE, related_name="messages")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField(blank=True)
     file = models.FileField(upload_to="chat_resources/", null=True, blank=True)
+    # Attachments sent through the chunked upload API point at shared content
+    blob = models.ForeignKey(ChatBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="messages")
+    blob_name = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     reply_to = models.ForeignKey(
         "self",
@@ -80,11 +388,32 @@ class ProjectMessage(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["project", "created_at", "id"]),
+            # Unread counts: a project's messages past a read cursor, minus the reader's own
+            models.Index(fields=["project", "id", "user"]),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.project.name}"
 
 
+class ChatReadCursor(models.Model):
+    """The newest message of a project's chat a user has seen"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chat_cursors")
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="read_cursors")
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "project"], name="unique_chat_read_cursor"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read project {self.project_id} up to {self.last_read_id}"
+
+
 class TaskInvite(models.Model):
     """Model for managing task assignment invitations via email"""
     email = models.EmailField()
@@ -109,3 +438,97 @@ class TaskInvite(models.Model):
 
     def __str__(self):
         return f"Invite to {self.email} by {self.inviter.username}"
+
+
+class OutboundEmail(models.Model):
+    """Email waiting to be delivered by the send_outbox worker"""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("dead", "Dead"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["next_attempt_at", "id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class Notification(models.Model):
+    """An event waiting to go out in its recipient's next digest email"""
+    KIND_CHOICES = [
+        ("assigned", "Assigned"),
+        ("status", "Status change"),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    task = models.ForeignKey("Task", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    message = models.CharField(max_length=500)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipient", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.recipient_id}: {self.message}"
+
+
+class RateLimitCounter(models.Model):
+    """Fallback storage for RateLimiter when the cache is unavailable"""
+    key = models.CharField(max_length=200)
+    window = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "window"], name="unique_rate_limit_window"),
+        ]
+
+    def __str__(self):
+        return f"{self.key}@{self.window}: {self.count}"
+
+
+class ArchiveSegment(models.Model):
+    """One compressed batch of an archived project's rows (see archive.py)"""
+    KIND_CHOICES = [
+        ("task", "Tasks"),
+        ("message", "Chat messages"),
+        ("invite", "Invites"),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="archive_segments")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Storage name of the gzipped JSONL file
+    name = models.CharField(max_length=255)
+    rows = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    # Attachment blobs the archived messages still use, kept from the blob purge
+    blob_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "kind", "first_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.rows} {self.kind}(s) of project {self.project_id}"
@@ -0,0 +1,113 @@
+"""Per-user notification digests.
+
+Assignment and status-change events are stored as Notification rows
+instead of being mailed one by one. Bulk operations queue all of their
+rows with a single insert. The send_digests worker waits until a user's
+oldest pending notification is NOTIFICATION_DIGEST_WINDOW old, then
+turns everything pending for that user into one email in the outbox.
+A burst of fifty assignments therefore costs one email, sent outside
+the request.
+
+With NOTIFICATION_DIGESTS off, each notification is queued in the
+outbox as its own email straight away, as before.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Notification, OutboundEmail, Task
+from .outbox import enqueue_mail
+
+NOTIFICATION_DIGESTS = getattr(settings, "NOTIFICATION_DIGESTS", True)
+NOTIFICATION_DIGEST_WINDOW = getattr(settings, "NOTIFICATION_DIGEST_WINDOW", 15 * 60)
+NOTIFICATION_DIGEST_BATCH_SIZE = getattr(settings, "NOTIFICATION_DIGEST_BATCH_SIZE", 100)
+
+# Digest section headings, in the order they appear
+SECTIONS = {
+    "assigned": "New assignments",
+    "status": "Status changes",
+}
+
+
+def assignment_notification(task, recipient):
+    deadline = timezone.localtime(task.deadline)
+    return Notification(
+        recipient=recipient, kind="assigned", task=task,
+        message=f"{task.title} ({task.project.name}), due {deadline:%Y-%m-%d %H:%M}",
+    )
+
+
+def status_notification(task, recipient, old_status):
+    statuses = dict(Task.STATUS_CHOICES)
+    return Notification(
+        recipient=recipient, kind="status", task=task,
+        message=f"{task.title} ({task.project.name}): {statuses.get(old_status, old_status)} -> {statuses.get(task.status, task.status)}",
+    )
+
+
+def queue_notifications(notifications):
+    """Store notifications for the next digests, or mail them one by one with digests off"""
+    notifications = [notification for notification in notifications if notification.recipient_id]
+    if not notifications:
+        return
+    if NOTIFICATION_DIGESTS:
+        Notification.objects.bulk_create(notifications)
+        return
+
+    recipients = User.objects.in_bulk({n.recipient_id for n in notifications})
+    OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=f"{SECTIONS[n.kind]}: {n.message}",
+            body=f"Hello {recipients[n.recipient_id].username},\n\n{n.message}\n\nPlease log in to update progress.",
+            from_email=settings.EMAIL_HOST_USER,
+            recipients=[recipients[n.recipient_id].email],
+        )
+        for n in notifications
+        if recipients[n.recipient_id].email
+    ])
+
+
+def digest_email(user, notifications):
+    """Return (subject, body) summarizing notifications for user"""
+    by_kind = defaultdict(list)
+    for notification in notifications:
+        by_kind[notification.kind].append(f"- {notification.message}")
+    sections = [f"{heading}:\n" + "\n".join(by_kind[kind]) for kind, heading in SECTIONS.items() if by_kind[kind]]
+    subject = f"ProjectFlow: {len(notifications)} update(s) on your projects"
+    body = f"Hello {user.username},\n\n" + "\n\n".join(sections) + "\n\nPlease log in to see the details.\n"
+    return subject, body
+
+
+def send_digests(now=None, window=NOTIFICATION_DIGEST_WINDOW, batch_size=NOTIFICATION_DIGEST_BATCH_SIZE):
+    """Queue one digest email per user whose window has closed; returns (digests, notifications)"""
+    cutoff = (now or timezone.now()) - timedelta(seconds=window)
+    recipient_ids = list(
+        Notification.objects.values("recipient")
+        .annotate(first=Min("created_at"))
+        .filter(first__lte=cutoff)
+        .order_by("first")
+        .values_list("recipient", flat=True)[:batch_size]
+    )
+    if not recipient_ids:
+        return 0, 0
+
+    with transaction.atomic():
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(recipient_id__in=recipient_ids)
+            .select_related("recipient")
+            .order_by("created_at", "id")
+        )
+        per_user = defaultdict(list)
+        for notification in pending:
+            per_user[notification.recipient].append(notification)
+        for user, notifications in per_user.items():
+            if user.email:
+                enqueue_mail(*digest_email(user, notifications), settings.EMAIL_HOST_USER, [user.email])
+        Notification.objects.filter(pk__in=[notification.pk for notification in pending]).delete()
+    return len(per_user), len(pending)
@@ -0,0 +1,79 @@
+"""One-time codes for email verification and password resets.
+
+A code lives for OTP_TTL seconds and survives OTP_MAX_ATTEMPTS wrong
+guesses; a correct one is consumed. Only a keyed hash of the code is
+stored, one EmailOTP row per user and purpose, and guesses are compared
+in constant time. The database is the only copy, so every worker sees
+the same code and attempt count. Each guess claims an attempt with a
+conditional UPDATE before it is checked, and a right guess consumes the
+code with a DELETE, so concurrent guesses can neither exceed the limit
+nor use one code twice. Expired rows are swept in bulk by
+``purge_expired_otps``, after every issued code and from the purge_otps
+command.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import EmailOTP
+
+OTP_TTL = getattr(settings, "OTP_TTL", 10 * 60)
+OTP_MAX_ATTEMPTS = getattr(settings, "OTP_MAX_ATTEMPTS", 5)
+
+
+def generate_code():
+    return f"{secrets.randbelow(10 ** 6):06d}"
+
+
+class OTPService:
+    def __init__(self, purpose, ttl=OTP_TTL, max_attempts=OTP_MAX_ATTEMPTS):
+        self.purpose = purpose
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    def digest(self, user_id, code):
+        return salted_hmac(f"PM.otp.{self.purpose}", f"{user_id}:{code}").hexdigest()
+
+    def issue(self, user):
+        """Create a fresh code for user, replacing any earlier one, and return it"""
+        code = generate_code()
+        EmailOTP.objects.update_or_create(user=user, purpose=self.purpose, defaults={
+            "otp": self.digest(user.pk, code), "attempts": 0,
+            "expires_at": timezone.now() + timedelta(seconds=self.ttl),
+        })
+        purge_expired_otps()
+        return code
+
+    def verify(self, username, code):
+        """Return the user when code is right, consuming it; otherwise None"""
+        if not username or not code:
+            return None
+        stored = (
+            EmailOTP.objects.select_related("user")
+            .filter(user__username=username, purpose=self.purpose, expires_at__gt=timezone.now())
+            .first()
+        )
+        if stored is None:
+            return None
+        # Matching on the hash as well leaves alone a code reissued since the read
+        current = EmailOTP.objects.filter(pk=stored.pk, otp=stored.otp)
+        if not current.filter(attempts__lt=self.max_attempts).update(attempts=F("attempts") + 1):
+            return None
+        if constant_time_compare(stored.otp, self.digest(stored.user_id, code)):
+            # Of several concurrent right guesses, only the one that deletes the row wins
+            return stored.user if current.delete()[0] else None
+        current.filter(attempts__gte=self.max_attempts).delete()
+        return None
+
+
+def purge_expired_otps(now=None):
+    """Delete every expired code; returns how many"""
+    return EmailOTP.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
+
+
+verification_otp = OTPService("verify")
+reset_otp = OTPService("reset")
@@ -0,0 +1,99 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = getattr(settings, "OUTBOX_BATCH_SIZE", 50)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+OUTBOX_BACKOFF_SECONDS = getattr(settings, "OUTBOX_BACKOFF_SECONDS", 60)
+OUTBOX_MAX_BACKOFF_SECONDS = getattr(settings, "OUTBOX_MAX_BACKOFF_SECONDS", 3600)
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    """Queue an email for the outbox worker; takes the same arguments as send_mail"""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or "",
+        recipients=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    return timedelta(seconds=min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Lease the next due emails so concurrent workers do not send them twice"""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)[:batch_size]
+        )
+        if batch:
+            # Push the rows out of the due window while they are being sent
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=OUTBOX_MAX_BACKOFF_SECONDS)
+            )
+    return batch
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, connection=None):
+    """Send one batch of due emails over a single SMTP connection.
+
+    Returns a (sent, failed) tuple. Failures are rescheduled with exponential
+    backoff and dead-lettered after OUTBOX_MAX_ATTEMPTS.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent, failed = 0, 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error("Could not connect to the mail server: %s", e)
+        for email in batch:
+            record_failure(email, e)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            message = EmailMessage(email.subject, email.body, email.from_email or None, email.recipients, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning("Failed to send outbox email %s: %s", email.pk, e)
+                record_failure(email, e)
+                failed += 1
+            else:
+                email.status = "sent"
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ""
+                email.save(update_fields=["status", "attempts", "sent_at", "last_error"])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        email.status = "dead"
+        logger.error("Outbox email %s dead-lettered after %s attempts", email.pk, email.attempts)
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=["status", "attempts", "last_error", "next_attempt_at"])
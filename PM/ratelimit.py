@@ -0,0 +1,111 @@
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse
+
+from .models import RateLimitCounter
+from .utils import shared_counters
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Sliding-window rate limiter with atomic check-and-increment.
+
+    Counts live in fixed windows; the previous window is weighted by how
+    much of it still overlaps the sliding window, which approximates a true
+    sliding log with two counters per key. Each check is a constant number
+    of cache operations regardless of history. The counters live in the
+    RateLimitCounter table instead unless the cache increments atomically
+    across worker processes (Redis or memcached), and while the cache
+    server is down.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def hit(self, key, now=None):
+        """Consume one slot for key; returns False (consuming nothing) when over the limit"""
+        return self.take(key, 1, now) == 1
+
+    def take(self, key, count, now=None):
+        """Consume up to count slots for key at once; returns how many were granted"""
+        now = time.time() if now is None else now
+        window, offset = divmod(now, self.window)
+        window = int(window)
+        key = f"pm:ratelimit:{self.name}:{key}"
+
+        if not shared_counters():
+            current, previous, release = self._db_hit(key, window, count)
+        else:
+            try:
+                current, previous, release = self._cache_hit(key, window, count)
+            except Exception as e:
+                logger.debug("Rate limit cache unavailable (%s), using database", e)
+                current, previous, release = self._db_hit(key, window, count)
+
+        weight = 1 - offset / self.window
+        granted = max(0, min(count, math.floor(self.limit - previous * weight - (current - count))))
+        if granted < count:
+            release(count - granted)
+        return granted
+
+    def _cache_hit(self, key, window, count):
+        current_key = f"{key}:{window}"
+        cache.add(current_key, 0, timeout=self.window * 2)
+        current = cache.incr(current_key, count)
+        previous = cache.get(f"{key}:{window - 1}", 0)
+        return current, previous, lambda excess: cache.decr(current_key, excess)
+
+    def _db_hit(self, key, window, count):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    RateLimitCounter.objects.get_or_create(key=key, window=window)
+            except IntegrityError:
+                pass
+            counters = RateLimitCounter.objects.filter(key=key)
+            counters.filter(window=window).update(count=F("count") + count)
+            counts = dict(counters.filter(window__in=[window, window - 1]).values_list("window", "count"))
+            counters.filter(window__lt=window - 1).delete()
+
+        def release(excess):
+            RateLimitCounter.objects.filter(key=key, window=window).update(count=F("count") - excess)
+
+        return counts.get(window, 0), counts.get(window - 1, 0), release
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def user_or_ip(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def ratelimit(name, limit, window, key=user_or_ip, methods=("POST",)):
+    """View decorator answering 429 once key(request) exceeds limit per window seconds"""
+    limiter = RateLimiter(name, limit, window)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method in methods and not limiter.hit(key(request)):
+                return HttpResponse("Too many requests. Please try again later.", status=429)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+INVITE_RATE_LIMIT, INVITE_RATE_WINDOW = getattr(settings, "INVITE_RATE_LIMIT", (10, 24 * 60 * 60))
+invite_limiter = RateLimiter("invite", INVITE_RATE_LIMIT, INVITE_RATE_WINDOW)
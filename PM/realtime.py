@@ -0,0 +1,192 @@
+"""In-process pub/sub hub used to push chat events to connected clients.
+
+Publishers call ``hub.publish(channel, event)`` from ordinary (sync) view
+code; subscribers are async SSE streams that each own an asyncio queue.
+The backend decides how a published event reaches ``Hub.deliver``:
+``LocalBackend`` hands it straight back within the process, while
+``BrokerBackend`` relays it through the ``chat_broker`` command so every
+worker process sees it.
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def project_channel(project_id):
+    return f"project:{project_id}"
+
+
+class LocalBackend:
+    """Deliver events to subscribers in this process only"""
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+
+class BrokerBackend:
+    """Share events between processes through the chat_broker relay.
+
+    One socket per process is used both ways: a daemon thread reads relayed
+    events off it and publishes are written to it. Events published while
+    the broker is unreachable are dropped; clients catch up on reconnect.
+    """
+
+    def __init__(self, host=None, port=None):
+        self.address = (
+            host or getattr(settings, "CHAT_BROKER_HOST", "127.0.0.1"),
+            port or getattr(settings, "CHAT_BROKER_PORT", 8765),
+        )
+        self._sock = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.connected = threading.Event()
+
+    def start(self, deliver):
+        thread = threading.Thread(target=self._listen, args=(deliver,), name="chat-broker-listener", daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            if self._sock is not None:
+                self._sock.shutdown(socket.SHUT_RDWR)
+
+    def _listen(self, deliver):
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                self._stopped.wait(1)
+                continue
+
+            with self._lock:
+                self._sock = sock
+            self.connected.set()
+            try:
+                for line in sock.makefile("rb"):
+                    try:
+                        message = json.loads(line)
+                        deliver(message["channel"], message["event"])
+                    except (ValueError, KeyError):
+                        logger.warning("Ignoring malformed broker message: %r", line[:200])
+            except OSError:
+                pass
+            finally:
+                self.connected.clear()
+                with self._lock:
+                    self._sock = None
+                sock.close()
+            if self._stopped.is_set():
+                break
+            logger.warning("Lost connection to chat broker at %s:%s, reconnecting", *self.address)
+
+    def publish(self, channel, event):
+        line = json.dumps({"channel": channel, "event": event}).encode() + b"\n"
+        with self._lock:
+            if self._sock is None:
+                logger.warning("Chat broker unavailable, dropping event for %s", channel)
+                return
+            try:
+                self._sock.sendall(line)
+            except OSError as e:
+                logger.warning("Failed to publish to chat broker: %s", e)
+
+
+class Subscription:
+    """A single stream's view of a channel, backed by an asyncio queue"""
+
+    def __init__(self, hub, channel, maxsize=100):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        # Called from whichever thread delivered the event
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The stream's loop has shut down; it will unsubscribe itself
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Events are only nudges to refetch, so dropping one is safe
+            pass
+
+    async def get(self, timeout=None):
+        """Wait for the next event, or return None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __enter__(self):
+        self.hub._add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.hub._remove(self)
+
+
+class Hub:
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.backend.start(self.deliver)
+
+    def publish(self, channel, event):
+        self._ensure_started()
+        self.backend.publish(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, channel):
+        """Return a Subscription to use as a context manager inside a stream"""
+        self._ensure_started()
+        return Subscription(self, channel)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.channel].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+def get_backend():
+    backend_path = getattr(settings, "CHAT_PUBSUB_BACKEND", "PM.realtime.LocalBackend")
+    return import_string(backend_path)()
+
+
+hub = Hub(get_backend())
@@ -0,0 +1,110 @@
+"""Deadline reminders.
+
+TASK_REMINDER_WINDOWS names how long before a deadline each reminder
+goes out ("24h" at 24 hours, "overdue" at the deadline itself). Every
+window covers a band of deadlines: from its own offset down to the next
+smaller one, so a task only gets the most urgent reminder that applies.
+A task created 30 minutes before its deadline gets the 1h reminder,
+never a late 24h one. Overdue reminders are only sent for deadlines
+passed within TASK_REMINDER_LOOKBACK, which keeps that band bounded
+too.
+
+Each band is a range scan per open status on the (status, deadline)
+index. An anti-join on TaskReminder's unique key drops reminders
+already sent, so a scan costs the same however many tasks exist beyond
+its band. The reminder rows and the emails (one per assignee, listing
+all of their tasks) are written to the outbox in the same transaction.
+A rerun, or a second scheduler, can therefore never send the same
+reminder twice.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .dashboard import OPEN_STATUSES
+from .models import Task, TaskReminder
+from .outbox import enqueue_mail
+
+logger = logging.getLogger(__name__)
+
+TASK_REMINDER_WINDOWS = getattr(settings, "TASK_REMINDER_WINDOWS", {"24h": 24 * 60 * 60, "1h": 60 * 60, "overdue": 0})
+TASK_REMINDER_LOOKBACK = getattr(settings, "TASK_REMINDER_LOOKBACK", 24 * 60 * 60)
+TASK_REMINDER_BATCH_SIZE = getattr(settings, "TASK_REMINDER_BATCH_SIZE", 1000)
+
+
+def reminder_bands(now, windows=None):
+    """Return (kind, after, until) deadline bands, most distant window first"""
+    windows = sorted((windows or TASK_REMINDER_WINDOWS).items(), key=lambda item: -item[1])
+    bands = []
+    for i, (kind, offset) in enumerate(windows):
+        until = now + timedelta(seconds=offset)
+        if i + 1 < len(windows):
+            after = now + timedelta(seconds=windows[i + 1][1])
+        else:
+            after = until - timedelta(seconds=TASK_REMINDER_LOOKBACK)
+        bands.append((kind, after, until))
+    return bands
+
+
+def due_reminders(kind, after, until, limit):
+    """Open, assigned tasks with a deadline in (after, until] not yet reminded of kind"""
+    sent = TaskReminder.objects.filter(task=OuterRef("pk"), kind=kind, deadline=OuterRef("deadline"))
+    return list(
+        Task.objects.filter(
+            status__in=OPEN_STATUSES, deadline__gt=after, deadline__lte=until, assignee__isnull=False
+        )
+        .exclude(Exists(sent))
+        .order_by("deadline")
+        .values_list("id", "title", "deadline", "project__name", "assignee__username", "assignee__email")[:limit]
+    )
+
+
+def reminder_email(username, reminders):
+    """Return (subject, body) for one assignee's reminders, grouped by window"""
+    by_kind = defaultdict(list)
+    for kind, title, deadline, project_name in reminders:
+        by_kind[kind].append(f"- {title} ({project_name}), due {timezone.localtime(deadline):%Y-%m-%d %H:%M}")
+    sections = [
+        ("Overdue:" if TASK_REMINDER_WINDOWS.get(kind, 0) == 0 else f"Due in the next {kind}:") + "\n" + "\n".join(lines)
+        for kind, lines in by_kind.items()
+    ]
+    subject = f"Reminder: {len(reminders)} task(s) need your attention"
+    body = f"Hello {username},\n\n" + "\n\n".join(sections) + "\n\nPlease log in to update progress.\n"
+    return subject, body
+
+
+def send_due_reminders(now=None, batch_size=TASK_REMINDER_BATCH_SIZE):
+    """Queue reminders for tasks that entered a window; returns (reminders, emails)"""
+    now = now or timezone.now()
+    found = []
+    for kind, after, until in reminder_bands(now):
+        found += [(kind, row) for row in due_reminders(kind, after, until, batch_size - len(found))]
+        if len(found) >= batch_size:
+            break
+    if not found:
+        return 0, 0
+
+    per_assignee = defaultdict(list)
+    for kind, (task_id, title, deadline, project_name, username, email) in found:
+        per_assignee[(username, email)].append((kind, title, deadline, project_name))
+
+    try:
+        with transaction.atomic():
+            TaskReminder.objects.bulk_create(
+                TaskReminder(task_id=row[0], kind=kind, deadline=row[2]) for kind, row in found
+            )
+            emails = 0
+            for (username, email), reminders in per_assignee.items():
+                if email:
+                    enqueue_mail(*reminder_email(username, reminders), settings.EMAIL_HOST_USER, [email])
+                    emails += 1
+    except IntegrityError:
+        # Another scheduler sent some of these first; the next scan skips them
+        logger.info("Reminder batch raced with another scheduler; retrying next cycle")
+        return 0, 0
+    return len(found), emails
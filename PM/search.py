@@ -0,0 +1,184 @@
+"""Full-text search over projects, tasks and chat messages.
+
+Everything searchable lives in one SQLite FTS5 table, ``PM_search``. A
+row's rowid is derived from the source object (``id * 4 + kind``), so the
+save/delete signals can replace or drop it directly, with no lookup
+table. Results are ranked with bm25, titles weighing more than bodies,
+and are limited to the projects the user belongs to. The index only
+exists on SQLite; on other databases indexing is skipped and searches
+come back empty.
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SEARCH_TABLE = "PM_search"
+SEARCH_PAGE_SIZE = getattr(settings, "SEARCH_PAGE_SIZE", 20)
+SEARCH_CANDIDATES = getattr(settings, "SEARCH_CANDIDATES", 1000)
+
+KIND_CODES = {"project": 1, "task": 2, "message": 3}
+KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+# (kind, source table, title column, body expression, project column)
+SOURCES = [
+    ("project", "PM_project", "name", "description", "id"),
+    ("task", "PM_task", "title", "description", "project_id"),
+    ("message", "PM_projectmessage", "''", "text", "project_id"),
+]
+
+# Snippet markers that cannot appear in user text, swapped for <mark> after escaping
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def search_enabled():
+    return connection.vendor == "sqlite"
+
+
+def search_rowid(kind, object_id):
+    return object_id * 4 + KIND_CODES[kind]
+
+
+def document(instance):
+    """Return (kind, title, body, project_id) for an indexable model instance"""
+    from .models import Project, ProjectMessage, Task
+
+    if isinstance(instance, Project):
+        return "project", instance.name, instance.description, instance.id
+    if isinstance(instance, Task):
+        return "task", instance.title, instance.description, instance.project_id
+    if isinstance(instance, ProjectMessage):
+        return "message", "", instance.text, instance.project_id
+    raise TypeError(f"{type(instance).__name__} is not searchable")
+
+
+def index_object(instance):
+    if not search_enabled():
+        return
+    kind, title, body, project_id = document(instance)
+    rowid = search_rowid(kind, instance.pk)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, body, kind, object_id, project_id) '
+            f"VALUES (%s, %s, %s, %s, %s, %s)",
+            [rowid, title, body, KIND_CODES[kind], instance.pk, project_id],
+        )
+
+
+def unindex_object(instance):
+    if not search_enabled():
+        return
+    kind = document(instance)[0]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', [search_rowid(kind, instance.pk)])
+
+
+def reindex_objects(kind, object_ids, batch_size=500):
+    """Refresh the rows of objects changed without their save signals"""
+    if not search_enabled():
+        return
+    code = KIND_CODES[kind]
+    table, title, body, project = next(source[1:] for source in SOURCES if source[0] == kind)
+    object_ids = list(object_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(object_ids), batch_size):
+            batch = object_ids[start:start + batch_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid IN ({placeholders})',
+                [object_id * 4 + code for object_id in batch],
+            )
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, body, kind, object_id, project_id) '
+                f'SELECT id * 4 + {code}, {title}, {body}, {code}, id, {project} FROM "{table}" '
+                f"WHERE id IN ({placeholders})",
+                batch,
+            )
+
+
+def reindex_tasks(task_ids, batch_size=500):
+    """Refresh the rows of tasks changed by a queryset update"""
+    reindex_objects("task", task_ids, batch_size)
+
+
+def rebuild_index():
+    """Repopulate the whole index from the source tables and compact it"""
+    if not search_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+        for kind, table, title, body, project in SOURCES:
+            code = KIND_CODES[kind]
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, body, kind, object_id, project_id) '
+                f'SELECT id * 4 + {code}, {title}, {body}, {code}, id, {project} FROM "{table}"'
+            )
+        cursor.execute(f"INSERT INTO \"{SEARCH_TABLE}\" (\"{SEARCH_TABLE}\") VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM "{SEARCH_TABLE}"')
+        return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 expression: every word must match, as a prefix.
+
+    Each word is quoted, so user input can never be parsed as FTS5 syntax.
+    """
+    terms = [word.replace('"', '""') for word in query.split()]
+    return " ".join(f'"{term}"*' for term in terms if term.strip('"'))
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+
+
+def search_documents(user, query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """Return (results, has_next) for one page of ranked matches.
+
+    Each result is a dict with kind, object_id, project_id, title and a
+    highlighted snippet. Only projects the user belongs to are searched.
+    Scoring every match of a very common word is what makes a search slow,
+    so only the newest SEARCH_CANDIDATES matches of each kind are ranked: a
+    cheap walk down the rowids finds the oldest of them per kind, and the
+    ranked query starts from there. The cap is per kind so that a flood of
+    recent chat messages cannot crowd out projects and tasks, whose ids are
+    much lower.
+    """
+    expression = match_expression(query)
+    if not search_enabled() or not expression:
+        return [], False
+
+    members_only = 'project_id IN (SELECT project_id FROM "PM_projectmembership" WHERE user_id = %s)'
+    offset = (max(page, 1) - 1) * page_size
+    with connection.cursor() as cursor:
+        codes = sorted(KINDS)
+        cutoffs = ", ".join(
+            f'(SELECT rowid FROM "{SEARCH_TABLE}" WHERE "{SEARCH_TABLE}" MATCH %s AND kind = {code} '
+            f"AND {members_only} ORDER BY rowid DESC LIMIT 1 OFFSET %s)"
+            for code in codes
+        )
+        cursor.execute(f"SELECT {cutoffs}", [expression, user.id, SEARCH_CANDIDATES - 1] * len(codes))
+        oldest = [rowid or 0 for rowid in cursor.fetchone()]
+        recent = " OR ".join(f"kind = {code} AND rowid >= %s" for code in codes)
+
+        cursor.execute(
+            f'SELECT kind, object_id, project_id, title, '
+            f'snippet("{SEARCH_TABLE}", -1, %s, %s, %s, 16) '
+            f'FROM "{SEARCH_TABLE}" '
+            f'WHERE "{SEARCH_TABLE}" MATCH %s AND ({recent}) AND {members_only} '
+            f'ORDER BY bm25("{SEARCH_TABLE}", 5.0, 1.0) LIMIT %s OFFSET %s',
+            [MARK_START, MARK_END, "…", expression, *oldest, user.id, page_size + 1, offset],
+        )
+        rows = cursor.fetchall()
+
+    results = [
+        {
+            "kind": KINDS[kind],
+            "object_id": object_id,
+            "project_id": project_id,
+            "title": title,
+            "snippet": highlight(snippet),
+        }
+        for kind, object_id, project_id, title, snippet in rows[:page_size]
+    ]
+    return results, len(rows) > page_size
@@ -1,9 +1,41 @@
-from django.db.models.signals import post_save
+import threading
+from contextlib import contextmanager
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile, Task
-from django.core.mail import send_mail
-from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from .models import ArchiveSegment, Profile, Project, ProjectMembership, ProjectMessage, Task
+from .auth import invalidate_cached_user
+from .dashboard import invalidate_dashboard
+from .realtime import hub, project_channel
+from .notifications import assignment_notification, queue_notifications, status_notification
+from .search import index_object, unindex_object
+from .fragments import bump_version, bump_versions
+
+# Set while archive.py deletes rows it has copied to cold storage
+_archiving = threading.local()
+
+
+@contextmanager
+def moving_to_archive():
+    """Delete rows as moved to cold storage rather than gone.
+
+    Inside the block the delete receivers leave the project as it was: its
+    task counters and assignee memberships stay, and open chats are not
+    told its messages were deleted.
+    """
+    _archiving.active = True
+    try:
+        yield
+    finally:
+        _archiving.active = False
+
+
+def archiving():
+    return getattr(_archiving, "active", False)
 
 
 @receiver(post_save, sender=User)
@@ -14,7 +46,157 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Task)
 def notify_assignee(sender, instance, created, **kwargs):
-    if created and instance.assignee:
-        subject = f"New Task Assigned: {instance.title}"
-        message = f"Hello {instance.assignee.username},\n\nYou have been assigned a new task: {instance.title}.\nDeadline: {instance.deadline}.\n\nPlease log in to update progress."
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [instance.assignee.email])
+    if instance.assignee_id and (created or instance._db_state.get("assignee_id") != instance.assignee_id):
+        queue_notifications([assignment_notification(instance, instance.assignee)])
+
+
+@receiver(post_save, sender=Task)
+def notify_status_change(sender, instance, created, **kwargs):
+    old_status = instance._db_state.get("status")
+    if created or old_status is None or old_status == instance.status:
+        return
+    # The manager follows progress; an assignee knows what they changed
+    manager_id = instance.project.manager_id
+    if manager_id != instance.assignee_id:
+        queue_notifications([status_notification(instance, User(pk=manager_id), old_status)])
+
+
+@receiver(post_save, sender=Task)
+def update_project_task_counts(sender, instance, created, **kwargs):
+    old_project_id = instance._db_state.get("project_id")
+    old_status = instance._db_state.get("status")
+    if not created and old_status is None:
+        # Status was deferred when loaded, so the previous value is unknown
+        Project.recount_tasks({old_project_id, instance.project_id})
+    elif (old_project_id, old_status) != (instance.project_id, instance.status):
+        Project.adjust_task_count(old_project_id, old_status, -1)
+        Project.adjust_task_count(instance.project_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=Task)
+def release_project_task_count(sender, instance, **kwargs):
+    if archiving():
+        return
+    Project.adjust_task_count(instance._db_state.get("project_id"), instance._db_state.get("status"), -1)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_dashboards(sender, instance, **kwargs):
+    invalidate_dashboard(instance._db_state.get("assignee_id"), instance.assignee_id)
+
+
+@receiver(post_save, sender=Project)
+def invalidate_project_dashboards(sender, instance, created, **kwargs):
+    assignee_ids = []
+    if not created:
+        # Assigned tasks show the project name, so their assignees are stale too
+        assignee_ids = Task.objects.filter(project_id=instance.pk).values_list("assignee_id", flat=True).distinct()
+    invalidate_dashboard(instance._db_manager_id, instance.manager_id, *assignee_ids)
+
+
+@receiver(post_delete, sender=Project)
+def invalidate_deleted_project_dashboards(sender, instance, **kwargs):
+    # Cascaded task deletes already cleared their assignees
+    invalidate_dashboard(instance._db_manager_id, instance.manager_id)
+
+
+@receiver(post_save, sender=ProjectMessage)
+def publish_chat_message(sender, instance, created, **kwargs):
+    if created:
+        event = {"type": "message.created", "id": instance.id, "user_id": instance.user_id}
+        transaction.on_commit(lambda: hub.publish(project_channel(instance.project_id), event))
+
+
+@receiver(post_delete, sender=ProjectMessage)
+def publish_chat_message_deleted(sender, instance, **kwargs):
+    if archiving():
+        return
+    event = {"type": "message.deleted", "id": instance.id}
+    transaction.on_commit(lambda: hub.publish(project_channel(instance.project_id), event))
+
+
+@receiver(post_save, sender=Project)
+def sync_project_memberships(sender, instance, **kwargs):
+    ProjectMembership.sync_project_roles(instance)
+
+
+@receiver(post_save, sender=Task)
+def sync_task_membership(sender, instance, **kwargs):
+    old_project_id = instance._db_state.get("project_id")
+    old_assignee_id = instance._db_state.get("assignee_id")
+    if (old_project_id, old_assignee_id) == (instance.project_id, instance.assignee_id):
+        return
+    ProjectMembership.add_assignee(instance.project_id, instance.assignee_id)
+    ProjectMembership.release_assignee(old_project_id, old_assignee_id)
+
+
+@receiver(post_delete, sender=Task)
+def release_task_membership(sender, instance, **kwargs):
+    if archiving():
+        return
+    ProjectMembership.release_assignee(instance._db_state.get("project_id"), instance._db_state.get("assignee_id"))
+
+
+# Columns each model contributes to the search index
+SEARCH_FIELDS = {
+    Project: {"name", "description"},
+    Task: {"title", "description", "project", "project_id"},
+    ProjectMessage: {"text"},
+}
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=ProjectMessage)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS[sender] & set(update_fields):
+        return
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=ProjectMessage)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=ProjectMessage)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=ProjectMessage)
+def invalidate_fragments(sender, instance, **kwargs):
+    bump_version(instance)
+
+
+@receiver(pre_delete, sender=ProjectMessage)
+def invalidate_reply_fragments(sender, instance, **kwargs):
+    # Replies quote this message, and the delete clears their reply_to without signals
+    bump_versions(ProjectMessage, instance.replies.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_auth_profile(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_cached_user(user.pk)
+
+
+@receiver(post_delete, sender=ArchiveSegment)
+def delete_archive_file(sender, instance, **kwargs):
+    # Segments go once restored, or with their project
+    transaction.on_commit(lambda: default_storage.delete(instance.name))
@@ -0,0 +1,83 @@
+"""SQLite tuning for many concurrent readers and writers.
+
+``configure_connection`` runs on every new SQLite connection and applies
+``SQLITE_PRAGMAS``: WAL lets readers carry on while a write is in
+progress, and busy_timeout makes a writer wait for the lock instead of
+failing at once. The database settings pair this with IMMEDIATE
+transactions, so a writer takes the lock when its transaction begins
+rather than failing halfway through when it tries to upgrade. Databases
+listed in ``SQLITE_ROLLBACK_JOURNAL`` keep the rollback journal instead of
+WAL.
+
+``serialized_write`` covers the remaining gap. Writers within one process
+queue on a lock, and a write that still finds the database busy after the
+timeout is retried from the start with backoff.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PRAGMAS = getattr(settings, "SQLITE_PRAGMAS", {})
+SQLITE_ROLLBACK_JOURNAL = {str(path) for path in getattr(settings, "SQLITE_ROLLBACK_JOURNAL", [])}
+SQLITE_WRITE_RETRIES = getattr(settings, "SQLITE_WRITE_RETRIES", 5)
+SQLITE_RETRY_BACKOFF = getattr(settings, "SQLITE_RETRY_BACKOFF", 0.05)
+
+write_lock = threading.Lock()
+
+
+def apply_pragmas(cursor, pragmas=None):
+    for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        pragmas = SQLITE_PRAGMAS
+        if str(connection.settings_dict["NAME"]) in SQLITE_ROLLBACK_JOURNAL:
+            pragmas = {**pragmas, "journal_mode": "DELETE"}
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, pragmas)
+
+
+def is_busy_error(exc):
+    message = str(exc).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def retry_on_busy(func, retries=SQLITE_WRITE_RETRIES, backoff=SQLITE_RETRY_BACKOFF, errors=(OperationalError,)):
+    """Call func, calling it again with jittered exponential backoff while SQLite reports busy"""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except errors as exc:
+            if attempt == retries or not is_busy_error(exc):
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("Database busy, retrying write in %.3fs (attempt %d)", delay, attempt + 1)
+            time.sleep(delay)
+
+
+def serialized_write(func, *args, **kwargs):
+    """Run func(*args, **kwargs) as one transaction, queued behind other writers.
+
+    Inside an enclosing atomic block a retry would replay only part of the
+    outer transaction, so there the call runs as is and errors propagate.
+    Other database vendors are left alone.
+    """
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        return func(*args, **kwargs)
+
+    def attempt():
+        with write_lock, transaction.atomic():
+            return func(*args, **kwargs)
+
+    return retry_on_busy(attempt)
@@ -0,0 +1,122 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Profile, Project, ProjectMembership, ProjectMessage, Task
+from .search import reindex_objects
+
+BATCH_SIZE = 1000
+SYNTHETIC_PASSWORD = "synthetic-pass-123"
+
+WORDS = (
+    "api auth backlog bug build cache calendar chat client config deploy design docs "
+    "email export feature fix import index invite login migrate mobile onboarding "
+    "payment release report review search security sprint storage test ui upload"
+).split()
+
+
+def sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate_dataset(users=20, projects=10, tasks_per_project=20, messages_per_project=100,
+                     reply_ratio=0.3, seed=0, prefix="synthetic"):
+    """Bulk-insert a realistic dataset and return what was created.
+
+    The first generated user manages every project and holds tasks in each
+    of them, so it is the heaviest possible viewer for benchmarks. Other
+    users are spread over projects as clients, assignees and chat authors.
+    Replies point at earlier messages in the same project, forming chains.
+    Bulk inserts skip signals, so counters, memberships and the search
+    index are rebuilt afterwards the same way the reconciliation helpers do.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    with transaction.atomic():
+        start = User.objects.count()
+        people = User.objects.bulk_create(
+            [
+                User(
+                    username=f"{prefix}_user_{start + i}",
+                    email=f"{prefix}_user_{start + i}@example.com",
+                    password=password,
+                )
+                for i in range(users)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Profile.objects.bulk_create([Profile(user=user) for user in people], batch_size=BATCH_SIZE)
+        hot_user = people[0]
+
+        project_rows = Project.objects.bulk_create(
+            [
+                Project(
+                    name=f"{prefix} project {i}",
+                    description=sentence(rng, 20),
+                    start_date=now - timedelta(days=rng.randint(0, 365)),
+                    end_date=now + timedelta(days=rng.randint(1, 365)),
+                    manager=hot_user,
+                    client=rng.choice(people),
+                )
+                for i in range(projects)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        statuses = [status for status, _ in Task.STATUS_CHOICES]
+        tasks = []
+        for project in project_rows:
+            for i in range(tasks_per_project):
+                tasks.append(Task(
+                    project=project,
+                    title=sentence(rng, 4),
+                    description=sentence(rng, 15),
+                    assignee=hot_user if i == 0 else rng.choice(people),
+                    deadline=now + timedelta(days=rng.randint(-30, 90), hours=rng.randint(0, 23)),
+                    status=rng.choice(statuses),
+                ))
+        Task.objects.bulk_create(tasks, batch_size=BATCH_SIZE)
+
+        message_ids = []
+        for project in project_rows:
+            for offset in range(0, messages_per_project, BATCH_SIZE):
+                batch = ProjectMessage.objects.bulk_create([
+                    ProjectMessage(project=project, user=rng.choice(people), text=sentence(rng, rng.randint(3, 25)))
+                    for _ in range(min(BATCH_SIZE, messages_per_project - offset))
+                ])
+                # Replies need the targets' ids, so they are wired up after the insert
+                replies = []
+                for i, message in enumerate(batch[1:], start=1):
+                    if rng.random() < reply_ratio:
+                        message.reply_to = batch[rng.randint(max(0, i - 50), i - 1)]
+                        replies.append(message)
+                ProjectMessage.objects.bulk_update(replies, ["reply_to"], batch_size=BATCH_SIZE)
+                message_ids += [message.pk for message in batch]
+
+        project_ids = [project.pk for project in project_rows]
+        Project.recount_tasks(project_ids)
+        ProjectMembership.objects.bulk_create(
+            [ProjectMembership(project=p, user_id=p.manager_id, role="manager") for p in project_rows]
+            + [ProjectMembership(project=p, user_id=p.client_id, role="client") for p in project_rows],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        ProjectMembership.sync_assignees(project_ids)
+        reindex_objects("project", project_ids)
+        reindex_objects("task", [task.pk for task in tasks])
+        reindex_objects("message", message_ids)
+
+    return {
+        "users": len(people),
+        "projects": len(project_rows),
+        "tasks": len(tasks),
+        "messages": len(message_ids),
+        "hot_user": hot_user,
+        "project_ids": project_ids,
+    }
@@ -0,0 +1,16 @@
+from django import template
+
+from PM.avatars import avatar_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("avatar.html")
+def avatar(profile, size=128, css_class=""):
+    """Render a profile's avatar at size CSS pixels, picking the closest derivative"""
+    return {
+        "profile": profile,
+        "size": size,
+        "css_class": css_class,
+        "sources": avatar_sources(profile, size),
+    }
@@ -0,0 +1,51 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from PM.fragments import FRAGMENT_CACHE_TIMEOUT, fragment_stats, get_version
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        obj = self.obj.resolve(context)
+        vary = "|".join(str(value.resolve(context)) for value in self.vary_on)
+        key = "fragment:{}:{}:{}:{}:{}".format(
+            name, obj._meta.label_lower, obj.pk, get_version(obj), hashlib.md5(vary.encode()).hexdigest()
+        )
+
+        html = cache.get(key)
+        fragment_stats.record(name, html is not None)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+        return mark_safe(html)
+
+
+@register.tag
+def cachefragment(parser, token):
+    """Cache the enclosed markup until obj is saved or deleted.
+
+    Usage: {% cachefragment "name" obj [vary_on ...] %} ... {% endcachefragment %}
+    Anything else the markup depends on (the viewer, counters) goes in vary_on.
+    Never cache markup holding per-user secrets such as {% csrf_token %}.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"{bits[0]} takes a fragment name and an object.")
+    nodelist = parser.parse(("endcachefragment",))
+    parser.delete_first_token()
+    return CachedFragmentNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
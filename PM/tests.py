@@ -1,9 +1,56 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import json
+import tempfile
+import threading
+import zipfile
+from importlib import import_module
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from PIL import Image
+
+from django.apps import apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import F
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from .models import Project, Task, TaskInvite
+from .benchmarks import compare, concurrent_writes, run_benchmarks
+from .instrumentation import QueryRecorder, RollingQueryStats, query_shape, query_stats
+from .management.commands.chat_broker import serve
+from .models import ChatBlob, ChatReadCursor, ChatUpload, EmailOTP, Notification, OutboundEmail, Profile, Project, ProjectMembership, ProjectMessage, RateLimitCounter, Task, TaskInvite, TaskReminder
+from .chat import mark_read, unread_counts
+from .notifications import send_digests
+from .otp import OTP_MAX_ATTEMPTS, OTP_TTL, reset_otp, verification_otp
+from .outbox import OUTBOX_MAX_ATTEMPTS, drain_outbox, enqueue_mail
+from .importer import TaskImporter
+from .ratelimit import RateLimiter, invite_limiter
+from .reminders import send_due_reminders
+from .realtime import BrokerBackend, Hub, LocalBackend
+from .checks import check_shared_cache
+from .archive import ARCHIVE_AFTER_DAYS, archive_batch, archived_message_page, due_projects
+from .avatars import AVATAR_SIZES, derivative_name, derivative_path, process_pending_avatars
+from .dashboard import calendar_tasks, invalidate_dashboard
+from .fragments import fragment_stats
+from .search import search_documents
+from .transitions import apply_transitions
+from .uploads import partial_path, purge_stale_uploads
+from .sqlite import retry_on_busy, serialized_write
+from .synthetic import generate_dataset
+from .utils import is_project_team_member
 
 
 class TaskInviteTestCase(TestCase):
@@ -268,3 +315,1907 @@ class TaskInviteTestCase(TestCase):
         # Should return form with errors
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Please either select an assignee or provide an email')
+
+
+class ProjectTaskCountTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Counted', manager=self.manager)
+        self.other = Project.objects.create(name='Other', manager=self.manager)
+
+    def make_task(self, project=None, status='todo'):
+        return Task.objects.create(
+            project=project or self.project,
+            title='Task',
+            deadline=timezone.now() + timedelta(days=1),
+            status=status
+        )
+
+    def counts(self, project):
+        project.refresh_from_db()
+        return project.todo_count, project.in_progress_count, project.done_count
+
+    def test_save_and_delete_keep_counters(self):
+        """Test counters follow creates, status changes and deletes"""
+        task = self.make_task()
+        self.make_task(status='done')
+        self.assertEqual(self.counts(self.project), (1, 0, 1))
+
+        task.status = 'in_progress'
+        task.save()
+        self.assertEqual(self.counts(self.project), (0, 1, 1))
+
+        task = Task.objects.get(pk=task.pk)
+        task.project = self.other
+        task.save()
+        self.assertEqual(self.counts(self.project), (0, 0, 1))
+        self.assertEqual(self.counts(self.other), (0, 1, 0))
+
+        task.delete()
+        self.assertEqual(self.counts(self.other), (0, 0, 0))
+
+    def test_queryset_update_recounts(self):
+        """Test queryset updates touching status or project recount both sides"""
+        for _ in range(3):
+            self.make_task()
+        Task.objects.filter(project=self.project).update(status='done')
+        self.assertEqual(self.counts(self.project), (0, 0, 3))
+
+        Task.objects.filter(project=self.project).update(project=self.other)
+        self.assertEqual(self.counts(self.project), (0, 0, 0))
+        self.assertEqual(self.counts(self.other), (0, 0, 3))
+
+    def test_progress_needs_no_queries(self):
+        """Test progress is computed from the loaded row"""
+        self.make_task(status='done')
+        self.make_task()
+        project = Project.objects.get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(project.progress, 50)
+
+    def test_reconcile_command(self):
+        """Test the reconcile command repairs drifted counters"""
+        self.make_task(status='done')
+        Project.objects.filter(pk=self.project.pk).update(todo_count=7, done_count=0)
+        call_command('reconcile_task_counts', stdout=StringIO())
+        self.assertEqual(self.counts(self.project), (0, 0, 1))
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Dash', manager=self.user)
+        self.client.login(username='worker', password='testpass123')
+
+    def add_tasks(self, count):
+        for i in range(count):
+            project = Project.objects.create(name=f'P{i}', manager=self.user)
+            Task.objects.create(
+                project=project,
+                title=f'Task {i}',
+                assignee=self.user,
+                deadline=timezone.now() + timedelta(days=i + 1)
+            )
+
+    def test_query_count_is_flat(self):
+        """Test dashboard queries do not grow with the number of tasks"""
+        self.add_tasks(2)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('dashboard'))
+        invalidate_dashboard(self.user.pk)
+        self.add_tasks(10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context['assigned_tasks']), 12)
+
+    def test_cached_payload_invalidated_on_task_change(self):
+        """Test task changes drop the cached dashboard"""
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(len(cold) - len(cached), 2)
+
+        task = Task.objects.create(
+            project=self.project,
+            title='Fresh',
+            assignee=self.user,
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        response = self.client.get(reverse('dashboard'))
+        self.assertIn(task, response.context['assigned_tasks'])
+
+    def test_per_process_cache_is_flagged_for_deploys(self):
+        """Test the deploy check warns when workers cannot share the cache"""
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['PM.W001'])
+
+    def test_pending_email_tasks_linked(self):
+        """Test tasks invited by email are linked and shown on the dashboard"""
+        self.client.get(reverse('dashboard'))
+        Task.objects.create(
+            project=self.project,
+            title='Invited',
+            assignee_email='worker@test.com',
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        response = self.client.get(reverse('dashboard'))
+        titles = [task.title for task in response.context['assigned_tasks']]
+        self.assertIn('Invited', titles)
+        self.assertContains(response, '1 pending task(s) have been assigned to you.')
+
+    def calendar(self, start, end, **headers):
+        return self.client.get(reverse('calendar_feed'), {
+            'start': start.isoformat(), 'end': end.isoformat()
+        }, **headers)
+
+    def test_calendar_only_returns_window(self):
+        """Test the calendar feed returns open tasks overlapping the window only"""
+        self.add_tasks(40)
+        # Each task starts a day before its deadline
+        Task.objects.update(created_at=F('deadline') - timedelta(days=1))
+        Task.objects.filter(title='Task 15').update(status='done')
+        now = timezone.now()
+        response = self.calendar(now + timedelta(days=9, hours=12), now + timedelta(days=19, hours=12))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [event['title'] for event in response.json()], [f'Task {i}' for i in range(9, 20) if i != 15]
+        )
+
+        self.assertEqual(self.calendar(now - timedelta(days=30), now - timedelta(days=1)).json(), [])
+        self.assertEqual(self.calendar(now, now - timedelta(days=1)).status_code, 400)
+        self.assertEqual(self.calendar(now, now + timedelta(days=400)).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('calendar_feed'), {'start': '2026-01-01', 'end': '2026-02-01'}).status_code, 200
+        )
+
+    def test_calendar_conditional_get(self):
+        """Test an unchanged window is answered with 304 and a change refreshes it"""
+        self.add_tasks(3)
+        now = timezone.now()
+        etag = self.calendar(now, now + timedelta(days=30))['ETag']
+        self.assertEqual(self.calendar(now, now + timedelta(days=30), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Task.objects.filter(title='Task 1').update(status='done')
+        response = self.calendar(now, now + timedelta(days=30), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_calendar_uses_index(self):
+        """Test the window lookup is served by the (assignee, status, deadline) index"""
+        now = timezone.now()
+        plan = calendar_tasks(self.user, now, now + timedelta(days=30)).explain()
+        self.assertIn('assigne', plan)
+
+
+class ProjectChatPaginationTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Chatty', manager=self.manager)
+        self.client.login(username='manager', password='testpass123')
+
+    def post_messages(self, count, reply=False):
+        previous = None
+        for i in range(count):
+            previous = ProjectMessage.objects.create(
+                project=self.project,
+                user=self.manager,
+                text=f'message {i}',
+                reply_to=previous if reply else None
+            )
+
+    def test_chat_renders_newest_page(self):
+        """Test the chat page renders only the newest messages"""
+        self.post_messages(60)
+        response = self.client.get(reverse('project_chat', kwargs={'pk': self.project.id}))
+        texts = [message.text for message in response.context['messages']]
+        self.assertEqual(texts[0], 'message 10')
+        self.assertEqual(texts[-1], 'message 59')
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_history_walks_back_to_start(self):
+        """Test the history endpoint returns older pages until exhausted"""
+        self.post_messages(60)
+        response = self.client.get(reverse('project_chat', kwargs={'pk': self.project.id}))
+        cursor = response.context['next_cursor']
+
+        response = self.client.get(
+            reverse('project_chat_history', kwargs={'pk': self.project.id}),
+            {'before': cursor}
+        )
+        data = response.json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('message 9', data['html'])
+        self.assertIn('message 0', data['html'])
+        self.assertNotIn('message 10<', data['html'])
+
+    def test_history_query_count_is_constant(self):
+        """Test reply chains do not add queries per message"""
+        self.post_messages(5, reply=True)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('project_chat_history', kwargs={'pk': self.project.id}))
+        self.post_messages(40, reply=True)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('project_chat_history', kwargs={'pk': self.project.id}))
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get(
+            reverse('project_chat_history', kwargs={'pk': self.project.id}),
+            {'before': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RealtimeChatTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Live', manager=self.manager)
+        self.client.login(username='manager', password='testpass123')
+
+    def test_local_hub_fans_out(self):
+        """Test events published from a sync thread reach async subscribers"""
+        test_hub = Hub(LocalBackend())
+
+        async def listen():
+            with test_hub.subscribe('project:1') as first, test_hub.subscribe('project:1') as second:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, test_hub.publish, 'project:1', {'type': 'message.created', 'id': 7}
+                )
+                return await first.get(timeout=2), await second.get(timeout=2)
+
+        self.assertEqual(async_to_sync(listen)(), ({'type': 'message.created', 'id': 7},) * 2)
+
+    def test_broker_relays_between_hubs(self):
+        """Test two processes' hubs share events through the broker"""
+        started = threading.Event()
+        holder = {}
+
+        def run_broker():
+            loop = asyncio.new_event_loop()
+            holder['loop'] = loop
+
+            def ready(server):
+                holder['port'] = server.sockets[0].getsockname()[1]
+                started.set()
+
+            holder['task'] = loop.create_task(serve('127.0.0.1', 0, ready))
+            try:
+                loop.run_until_complete(holder['task'])
+            except asyncio.CancelledError:
+                pass
+
+        threading.Thread(target=run_broker, daemon=True).start()
+        self.assertTrue(started.wait(5))
+
+        publisher = BrokerBackend('127.0.0.1', holder['port'])
+        listener = BrokerBackend('127.0.0.1', holder['port'])
+        publishing_hub, listening_hub = Hub(publisher), Hub(listener)
+
+        async def listen():
+            with listening_hub.subscribe('project:2') as subscription:
+                await asyncio.get_running_loop().run_in_executor(None, listener.connected.wait, 5)
+                publishing_hub._ensure_started()
+                await asyncio.get_running_loop().run_in_executor(None, publisher.connected.wait, 5)
+                publishing_hub.publish('project:2', {'type': 'message.deleted', 'id': 3})
+                return await subscription.get(timeout=5)
+
+        self.assertEqual(async_to_sync(listen)(), {'type': 'message.deleted', 'id': 3})
+        publisher.stop()
+        listener.stop()
+        holder['loop'].call_soon_threadsafe(holder['task'].cancel)
+
+    def test_ajax_post_and_catch_up(self):
+        """Test posting over XHR returns JSON and the message is fetched after the cursor"""
+        chat_url = reverse('project_chat', kwargs={'pk': self.project.id})
+        cursor = self.client.get(chat_url).context['latest_cursor']
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(chat_url, {'text': 'hello live'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+
+        response = self.client.get(
+            reverse('project_chat_history', kwargs={'pk': self.project.id}),
+            {'after': cursor}
+        )
+        data = response.json()
+        self.assertIn('hello live', data['html'])
+        self.assertFalse(data['has_more'])
+
+    def test_wsgi_polls_instead_of_streaming(self):
+        """Test the chat page skips the event stream when served over WSGI"""
+        response = self.client.get(reverse('project_chat', kwargs={'pk': self.project.id}))
+        self.assertFalse(response.context['chat_streaming'])
+        self.assertNotContains(response, 'data-stream-url')
+        self.assertContains(response, 'data-poll-interval="5"')
+
+        response = self.client.get(reverse('project_chat_stream', kwargs={'pk': self.project.id}))
+        self.assertEqual(response.status_code, 204)
+
+    def test_ajax_delete(self):
+        """Test deleting over XHR returns the deleted id"""
+        message = ProjectMessage.objects.create(project=self.project, user=self.manager, text='bye')
+        response = self.client.post(
+            reverse('project_message_delete', kwargs={'pk': self.project.id, 'message_id': message.id}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json(), {'deleted': message.id})
+        self.assertFalse(ProjectMessage.objects.filter(pk=message.pk).exists())
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """Email backend that counts connections and rejects @bad.test recipients"""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if any(r.endswith('@bad.test') for r in message.recipients()):
+                raise SMTPException('mailbox unavailable')
+            mail.outbox.append(message)
+        return len(email_messages)
+
+
+class OutboxTestCase(TestCase):
+    def test_views_enqueue_instead_of_sending(self):
+        """Test invitations are queued rather than sent inside the request"""
+        manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        project = Project.objects.create(name='Mail', manager=manager)
+        self.client.login(username='manager', password='testpass123')
+        self.client.post(
+            reverse('task_create', kwargs={'project_id': project.id}),
+            {
+                'title': 'Invite',
+                'assignee_email': 'someone@test.com',
+                'deadline': (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M'),
+                'status': 'todo'
+            }
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.recipients, ['someone@test.com'])
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+
+    @override_settings(EMAIL_BACKEND='PM.tests.FlakyEmailBackend')
+    def test_batch_reuses_connection_and_retries(self):
+        """Test one connection per batch and backoff for failed rows"""
+        FlakyEmailBackend.opened = 0
+        for i in range(3):
+            enqueue_mail('Hi', 'Body', 'from@test.com', [f'user{i}@test.com'])
+        failing = enqueue_mail('Hi', 'Body', 'from@test.com', ['user@bad.test'])
+
+        self.assertEqual(drain_outbox(), (3, 1))
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'pending')
+        self.assertEqual(failing.attempts, 1)
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='PM.tests.FlakyEmailBackend')
+    def test_dead_letter_after_max_attempts(self):
+        """Test emails stop retrying after the attempt limit"""
+        failing = enqueue_mail('Hi', 'Body', 'from@test.com', ['user@bad.test'])
+        for _ in range(OUTBOX_MAX_ATTEMPTS):
+            OutboundEmail.objects.filter(pk=failing.pk).update(next_attempt_at=timezone.now())
+            drain_outbox()
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'dead')
+        self.assertEqual(failing.attempts, OUTBOX_MAX_ATTEMPTS)
+
+
+class ProjectMembershipTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.worker = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Team', manager=self.manager)
+
+    def roles(self, user):
+        return set(ProjectMembership.objects.filter(user=user, project=self.project).values_list('role', flat=True))
+
+    def make_task(self, **kwargs):
+        return Task.objects.create(
+            project=self.project,
+            title='Task',
+            deadline=timezone.now() + timedelta(days=1),
+            **kwargs
+        )
+
+    def test_roles_follow_project_and_tasks(self):
+        """Test membership rows track manager, client and assignees"""
+        self.assertEqual(self.roles(self.manager), {'manager'})
+
+        self.project.client = self.worker
+        self.project.save()
+        self.assertEqual(self.roles(self.worker), {'client'})
+
+        first = self.make_task(assignee=self.worker)
+        second = self.make_task(assignee=self.worker)
+        self.assertEqual(self.roles(self.worker), {'client', 'assignee'})
+
+        first.delete()
+        self.assertEqual(self.roles(self.worker), {'client', 'assignee'})
+        second.assignee = self.manager
+        second.save()
+        self.assertEqual(self.roles(self.worker), {'client'})
+        self.assertEqual(self.roles(self.manager), {'manager', 'assignee'})
+
+    def test_queryset_update_resyncs(self):
+        """Test linking email invites through update() creates memberships"""
+        self.make_task(assignee_email='worker@test.com')
+        Task.objects.filter(assignee_email='worker@test.com').update(assignee=self.worker, assignee_email=None)
+        self.assertEqual(self.roles(self.worker), {'assignee'})
+
+    def test_membership_check_is_memoized(self):
+        """Test repeated checks for the same user cost one query"""
+        self.make_task(assignee=self.worker)
+        other = Project.objects.create(name='Other', manager=self.manager)
+        user = User.objects.get(pk=self.worker.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_project_team_member(user, self.project))
+            self.assertFalse(is_project_team_member(user, other))
+            self.assertTrue(is_project_team_member(user, self.project))
+
+    def test_project_list_includes_assigned_projects(self):
+        """Test project list shows projects where the user only holds tasks"""
+        self.make_task(assignee=self.worker)
+        self.client.login(username='worker', password='testpass123')
+        response = self.client.get(reverse('project_list'))
+        self.assertEqual(list(response.context['projects']), [self.project])
+
+
+class RateLimiterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_blocks_after_limit_without_consuming(self):
+        """Test hits beyond the limit are refused and not counted"""
+        limiter = RateLimiter('test', 3, 60)
+        now = 6000.0
+        self.assertEqual([limiter.hit('k', now) for _ in range(5)], [True, True, True, False, False])
+        self.assertEqual(RateLimitCounter.objects.get(key='pm:ratelimit:test:k', window=100).count, 3)
+
+    def test_take_grants_what_is_left(self):
+        """Test taking several slots grants up to the limit and counts only those"""
+        limiter = RateLimiter('test', 5, 60)
+        self.assertEqual(limiter.take('k', 3, 6000.0), 3)
+        self.assertEqual(limiter.take('k', 4, 6000.0), 2)
+        self.assertEqual(limiter.take('k', 1, 6000.0), 0)
+        self.assertEqual(RateLimitCounter.objects.get(key='pm:ratelimit:test:k', window=100).count, 5)
+
+    @patch('PM.ratelimit.shared_counters', return_value=True)
+    def test_counts_in_cache_when_atomic(self, shared_counters):
+        """Test a cache with atomic increments holds the counters instead"""
+        limiter = RateLimiter('test', 3, 60)
+        self.assertEqual([limiter.hit('k', 6000.0) for _ in range(4)], [True, True, True, False])
+        self.assertEqual(cache.get('pm:ratelimit:test:k:100'), 3)
+        self.assertFalse(RateLimitCounter.objects.exists())
+
+    def test_window_slides(self):
+        """Test the previous window is weighted by its remaining overlap"""
+        limiter = RateLimiter('test', 4, 60)
+        for _ in range(4):
+            self.assertTrue(limiter.hit('k', 6000.0))
+        # Half way into the next window half of the old hits still count
+        self.assertTrue(limiter.hit('k', 6090.0))
+        self.assertTrue(limiter.hit('k', 6090.0))
+        self.assertFalse(limiter.hit('k', 6090.0))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_database_fallback(self):
+        """Test counting uses the database when the cache cannot store"""
+        limiter = RateLimiter('test', 2, 60)
+        self.assertEqual([limiter.hit('k', 6000.0) for _ in range(3)], [True, True, False])
+        self.assertEqual(RateLimitCounter.objects.get(key='pm:ratelimit:test:k', window=100).count, 2)
+
+    def test_invites_are_limited(self):
+        """Test the eleventh invitation in a day is refused"""
+        manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        project = Project.objects.create(name='Limits', manager=manager)
+        self.client.login(username='manager', password='testpass123')
+        for i in range(11):
+            response = self.client.post(
+                reverse('task_create', kwargs={'project_id': project.id}),
+                {
+                    'title': f'Task {i}',
+                    'assignee_email': f'user{i}@test.com',
+                    'deadline': (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M'),
+                    'status': 'todo'
+                },
+                follow=True
+            )
+        self.assertEqual(TaskInvite.objects.count(), 10)
+        self.assertContains(response, 'maximum number of invitations')
+
+    def test_decorator_returns_429(self):
+        """Test the view decorator answers 429 once the limit is hit"""
+        for _ in range(5):
+            self.client.post(reverse('forgot_password'), {'email': 'nobody@test.com'})
+        response = self.client.post(reverse('forgot_password'), {'email': 'nobody@test.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(reverse('forgot_password')).status_code, 200)
+
+
+class TaskImportTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.worker = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Import', manager=self.manager)
+        self.client.login(username='manager', password='testpass123')
+
+    def csv_upload(self, rows):
+        lines = ['title,description,assignee_email,deadline,status']
+        lines += [','.join(row) for row in rows]
+        return SimpleUploadedFile('tasks.csv', '\n'.join(lines).encode())
+
+    def import_file(self, upload):
+        response = self.client.post(
+            reverse('task_import', kwargs={'project_id': self.project.id}),
+            {'file': upload}
+        )
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_csv_import(self):
+        """Test rows are created, unknown emails invited once and bad rows reported"""
+        events = self.import_file(self.csv_upload([
+            ('One', 'first', 'worker@test.com', '2030-01-01 10:00', 'todo'),
+            ('Two', '', 'new@test.com', '2030-01-02 10:00', 'done'),
+            ('Three', '', 'new@test.com', '2030-01-03 10:00', ''),
+            ('Bad', '', '', 'not a date', 'todo'),
+        ]))
+        self.assertEqual(events[0]['type'], 'error')
+        self.assertEqual(events[0]['row'], 4)
+        self.assertEqual(events[-1], {
+            'type': 'done', 'rows': 4, 'created': 3, 'errors': 1, 'invited': 1, 'not_invited': 0
+        })
+
+        self.assertEqual(Task.objects.get(title='One').assignee, self.worker)
+        self.assertEqual(Task.objects.get(title='Three').assignee_email, 'new@test.com')
+        self.assertEqual(TaskInvite.objects.filter(email='new@test.com').count(), 1)
+
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.todo_count, self.project.done_count), (2, 1))
+        self.assertTrue(ProjectMembership.objects.filter(user=self.worker, project=self.project, role='assignee').exists())
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(Notification.objects.get(recipient=self.worker).message, f'1 new task(s) in {self.project.name}')
+
+    def test_jsonl_query_count_is_flat(self):
+        """Test import queries do not grow with the number of rows"""
+        def upload(count):
+            lines = [
+                json.dumps({
+                    'title': f'Task {i}',
+                    'assignee_email': f'user{i}@test.com',
+                    'deadline': '2030-01-01T10:00',
+                })
+                for i in range(count)
+            ]
+            return SimpleUploadedFile('tasks.jsonl', '\n'.join(lines).encode())
+
+        self.client.get(reverse('home'))
+        # Room for every invitation, with the counter row already in place
+        limiter = RateLimiter('invite', 1000, 24 * 60 * 60)
+        limiter.hit(f'user:{self.manager.pk}')
+        with patch('PM.importer.invite_limiter', limiter):
+            with CaptureQueriesContext(connection) as small:
+                self.import_file(upload(5))
+            with CaptureQueriesContext(connection) as large:
+                events = self.import_file(upload(50))
+        self.assertEqual(events[-1]['created'], 50)
+        self.assertEqual(len(small), len(large))
+
+    def test_invitations_count_against_the_limit(self):
+        """Test an import invites no more addresses than the invitation limit allows"""
+        events = self.import_file(self.csv_upload([
+            (f'Task {i}', '', f'guest{i}@test.com', '2030-01-01 10:00', 'todo') for i in range(12)
+        ]))
+        self.assertEqual(events[-1]['created'], 12)
+        self.assertEqual((events[-1]['invited'], events[-1]['not_invited']), (10, 2))
+        self.assertEqual(TaskInvite.objects.count(), 10)
+        self.assertFalse(invite_limiter.hit(f'user:{self.manager.pk}'))
+
+    def test_bookkeeping_is_committed_per_chunk(self):
+        """Test counters and memberships are current after each chunk, even if the import stops"""
+        rows = iter([
+            (1, {'title': 'One', 'assignee_email': 'worker@test.com', 'deadline': '2030-01-01 10:00'}),
+            (2, {'title': 'Two', 'assignee_email': 'worker@test.com', 'deadline': '2030-01-01 10:00'}),
+        ])
+        events = TaskImporter(self.project, self.manager, str, chunk_size=1).run(rows)
+        self.assertEqual(next(events)['created'], 1)
+        # The client went away: the rest of the generator never runs
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.todo_count, 1)
+        self.assertTrue(ProjectMembership.objects.filter(user=self.worker, project=self.project, role='assignee').exists())
+        self.assertEqual(Notification.objects.get(recipient=self.worker).message, f'1 new task(s) in {self.project.name}')
+
+    def test_imported_tasks_are_searchable(self):
+        """Test bulk-imported tasks are added to the search index"""
+        events = self.import_file(self.csv_upload([
+            ('Zebrafish tank', 'clean the filters', 'worker@test.com', '2030-01-01 10:00', 'todo'),
+        ]))
+        self.assertEqual(events[-1]['created'], 1)
+        results, _ = search_documents(self.manager, 'zebrafish')
+        self.assertEqual([result['object_id'] for result in results], [Task.objects.get(title='Zebrafish tank').pk])
+
+    def test_only_manager_can_import(self):
+        """Test other users cannot import into the project"""
+        self.client.login(username='worker', password='testpass123')
+        response = self.client.post(
+            reverse('task_import', kwargs={'project_id': self.project.id}),
+            {'file': self.csv_upload([])}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ProjectExportTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Export', manager=self.manager)
+        Task.objects.create(
+            project=self.project,
+            title='Ship it',
+            assignee=self.manager,
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        ProjectMessage.objects.create(project=self.project, user=self.manager, text='hello')
+        TaskInvite.objects.create(email='guest@test.com', inviter=self.manager, project=self.project)
+        self.client.login(username='manager', password='testpass123')
+
+    def export(self, **params):
+        response = self.client.get(reverse('project_export', kwargs={'pk': self.project.id}), params)
+        return response, b''.join(response.streaming_content)
+
+    def test_jsonl_export(self):
+        """Test every kind is exported and invite tokens are left out"""
+        response, body = self.export()
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['type'] for record in records], ['task', 'message', 'invite'])
+        self.assertEqual(records[0]['assignee__username'], 'manager')
+        self.assertNotIn('token', records[2])
+
+    def test_csv_export(self):
+        """Test CSV exports one kind with a header row"""
+        response, body = self.export(format='csv', kind='tasks')
+        rows = list(csv.reader(StringIO(body.decode())))
+        self.assertEqual(rows[0][:2], ['id', 'title'])
+        self.assertEqual(rows[1][1], 'Ship it')
+
+    def test_zip_export(self):
+        """Test the zip holds one JSONL file per kind"""
+        response, body = self.export(format='zip')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertEqual(archive.namelist(), ['tasks.jsonl', 'messages.jsonl', 'invites.jsonl'])
+            self.assertIn(b'hello', archive.read('messages.jsonl'))
+
+    def test_command_export(self):
+        """Test the management command writes the same JSONL"""
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as output:
+            call_command('export_project', self.project.id, '--kind', 'tasks', '-o', output.name)
+            self.assertIn(b'Ship it', output.read())
+
+
+class BenchmarkTestCase(TestCase):
+    def test_generate_dataset(self):
+        """Test the generator creates consistent rows in bulk"""
+        dataset = generate_dataset(users=5, projects=3, tasks_per_project=4, messages_per_project=10, reply_ratio=0.5)
+        self.assertEqual(Task.objects.count(), 12)
+        self.assertEqual(ProjectMessage.objects.count(), 30)
+        self.assertTrue(ProjectMessage.objects.filter(reply_to__isnull=False).exists())
+        project = Project.objects.get(pk=dataset['project_ids'][0])
+        self.assertEqual(project.task_count, 4)
+        self.assertTrue(is_project_team_member(dataset['hot_user'], project))
+        message = ProjectMessage.objects.filter(project=project).first()
+        results, _ = search_documents(dataset['hot_user'], message.text)
+        self.assertIn(('message', message.pk), [(result['kind'], result['object_id']) for result in results])
+
+    def test_run_and_compare(self):
+        """Test every view is measured and regressions are reported"""
+        results = run_benchmarks(
+            {'tiny': {'users': 3, 'projects': 2, 'tasks_per_project': 3, 'messages_per_project': 5}},
+            repeat=1
+        )
+        views = results['tiny']['views']
+        self.assertEqual(set(views), {'dashboard', 'project_list', 'project_detail', 'project_chat', 'project_chat_history'})
+        self.assertGreater(views['project_detail']['cold_queries'], 0)
+        self.assertEqual(compare(results, results), [])
+
+        baseline = json.loads(json.dumps(results))
+        baseline['tiny']['views']['dashboard']['queries'] -= 1
+        self.assertEqual(len(compare(results, baseline)), 1)
+
+
+class QueryInstrumentationTestCase(TestCase):
+    def setUp(self):
+        query_stats.clear()
+        self.manager = User.objects.create_user(username='manager', password='testpass123', is_staff=True)
+        self.member = User.objects.create_user(username='member', password='testpass123')
+        self.project = Project.objects.create(
+            name='Instrumented', description='d', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30), manager=self.manager, client=self.member
+        )
+
+    def tearDown(self):
+        query_stats.clear()
+
+    def test_query_shape(self):
+        """Test values and IN lists collapse so repeats group together"""
+        self.assertEqual(
+            query_shape('SELECT * FROM "PM_task" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT * FROM "PM_task" WHERE "id" IN (...) LIMIT ?'
+        )
+
+    def test_recorder_flags_repeated_shapes(self):
+        """Test a lookup inside a loop is reported as a likely N+1"""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for user in User.objects.all():
+                Project.objects.filter(manager=user).exists()
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.repeated(threshold=2)[0][1], 2)
+        self.assertEqual(recorder.repeated(threshold=3), [])
+
+    def test_server_timing_header(self):
+        """Test every response reports its DB time and query count"""
+        self.client.login(username='member', password='testpass123')
+        response = self.client.get(reverse('project_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+
+    def test_rolling_window(self):
+        """Test reports are merged per view and expire with the window"""
+        stats = RollingQueryStats(window=120)
+        report = {'queries': 10, 'db_ms': 4.0, 'repeated': [('SELECT ?', 8)]}
+        stats.record('project_detail', report, now=1000)
+        stats.record('project_detail', {'queries': 2, 'db_ms': 1.0, 'repeated': []}, now=1070)
+        stats.record('dashboard', {'queries': 3, 'db_ms': 9.0, 'repeated': []}, now=1070)
+
+        worst = stats.worst(now=1075)
+        self.assertEqual([row['view'] for row in worst], ['project_detail', 'dashboard'])
+        self.assertEqual(worst[0]['avg_queries'], 6)
+        self.assertEqual(worst[0]['max_queries'], 10)
+        self.assertEqual(worst[0]['n_plus_one_requests'], 1)
+        self.assertEqual(worst[0]['repeated_shapes'], [{'sql': 'SELECT ?', 'count': 8}])
+        self.assertEqual(stats.worst(order_by='db_ms', now=1075)[0]['view'], 'dashboard')
+
+        worst = stats.worst(now=1150)
+        self.assertEqual(worst[0]['requests'], 1)
+        self.assertEqual(worst[0]['avg_queries'], 3)
+
+    def test_staff_endpoint(self):
+        """Test only staff can read the aggregated stats"""
+        self.client.login(username='member', password='testpass123')
+        self.client.get(reverse('project_detail', kwargs={'pk': self.project.id}))
+        self.assertEqual(self.client.get(reverse('query_stats')).status_code, 403)
+
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get(reverse('query_stats'))
+        self.assertEqual(response.status_code, 200)
+        views = {row['view']: row for row in response.json()['views']}
+        self.assertEqual(views['project_detail']['requests'], 1)
+        self.assertGreater(views['project_detail']['avg_queries'], 0)
+
+
+class SQLiteTuningTestCase(TestCase):
+    def test_pragmas_applied(self):
+        """Test new connections pick up the configured pragmas"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -32000)
+
+    def test_tracked_database_keeps_rollback_journal(self):
+        """Test WAL is applied except to databases listed in SQLITE_ROLLBACK_JOURNAL"""
+        directory = tempfile.mkdtemp()
+        tracked, other = f'{directory}/tracked.sqlite3', f'{directory}/other.sqlite3'
+        modes = {}
+        with patch('PM.sqlite.SQLITE_ROLLBACK_JOURNAL', {tracked}):
+            for name in (tracked, other):
+                wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': name})
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    modes[name] = cursor.fetchone()[0]
+                wrapper.close()
+        self.assertEqual(modes, {tracked: 'delete', other: 'wal'})
+
+    def test_retry_on_busy(self):
+        """Test a write that finds the database locked is retried, other errors are not"""
+        calls = []
+
+        def flaky_write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return "saved"
+
+        self.assertEqual(retry_on_busy(flaky_write, backoff=0), "saved")
+        self.assertEqual(len(calls), 3)
+
+        def broken_write():
+            calls.append(1)
+            raise OperationalError("no such table: PM_task")
+
+        with self.assertRaises(OperationalError):
+            retry_on_busy(broken_write, backoff=0)
+        self.assertEqual(len(calls), 4)
+
+    def test_serialized_write_inside_atomic(self):
+        """Test writes inside an outer transaction are not replayed"""
+        def locked():
+            raise OperationalError("database is locked")
+
+        with self.assertRaises(OperationalError):
+            serialized_write(locked)
+
+    def test_concurrent_writes(self):
+        """Test the tuned mode absorbs a burst of concurrent writes"""
+        with tempfile.TemporaryDirectory() as directory:
+            result = concurrent_writes(f"{directory}/bench.sqlite3", tuned=True, writers=4, readers=2, writes_per_writer=20)
+        self.assertEqual(result['writes_ok'], 80)
+        self.assertEqual(result['writes_failed'], 0)
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpass123')
+        self.outsider = User.objects.create_user(username='outsider', password='testpass123')
+        self.project = Project.objects.create(
+            name='Payment gateway', description='Card processing for checkout', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30), manager=self.manager
+        )
+        self.task = Task.objects.create(
+            project=self.project, title='Refund flow', description='Handle partial refunds for payments',
+            deadline=timezone.now() + timedelta(days=3)
+        )
+        self.message = ProjectMessage.objects.create(project=self.project, user=self.manager, text='Refund <b>API</b> is flaky')
+
+    def kinds(self, user, query):
+        return [(result['kind'], result['object_id']) for result in search_documents(user, query)[0]]
+
+    def test_ranked_and_scoped_to_members(self):
+        """Test matches are ranked by relevance and hidden from non-members"""
+        self.assertEqual(self.kinds(self.manager, 'refund'), [('task', self.task.id), ('message', self.message.id)])
+        self.assertEqual(self.kinds(self.manager, 'pay'), [('project', self.project.id), ('task', self.task.id)])
+        self.assertEqual(self.kinds(self.outsider, 'refund'), [])
+
+    def test_index_follows_changes(self):
+        """Test saves, queryset updates and deletes keep the index current"""
+        self.task.title = 'Chargeback flow'
+        self.task.save()
+        self.assertIn(('task', self.task.id), self.kinds(self.manager, 'chargeback'))
+
+        Task.objects.filter(pk=self.task.pk).update(title='Dispute flow')
+        self.assertEqual(self.kinds(self.manager, 'chargeback'), [])
+        self.assertIn(('task', self.task.id), self.kinds(self.manager, 'dispute'))
+
+        self.message.delete()
+        self.assertEqual(self.kinds(self.manager, 'flaky'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Test FTS5 operators typed by users are searched as plain words"""
+        self.assertEqual(self.kinds(self.manager, 'refund AND ("'), [])
+        self.assertEqual(self.kinds(self.manager, '"refund" NEAR'), [])
+        self.assertEqual(self.kinds(self.manager, '   '), [])
+
+    def test_pagination(self):
+        """Test pages are cut at the page size and report whether more follow"""
+        for i in range(4):
+            ProjectMessage.objects.create(project=self.project, user=self.manager, text=f'refund note {i}')
+        results, has_next = search_documents(self.manager, 'refund', page=1, page_size=4)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(has_next)
+        results, has_next = search_documents(self.manager, 'refund', page=2, page_size=4)
+        self.assertEqual(len(results), 2)
+        self.assertFalse(has_next)
+
+    def test_only_newest_candidates_ranked(self):
+        """Test very common words only rank the newest matches of each kind"""
+        newest = ProjectMessage.objects.create(project=self.project, user=self.manager, text='refund again')
+        with patch('PM.search.SEARCH_CANDIDATES', 1):
+            self.assertEqual(
+                sorted(self.kinds(self.manager, 'refund')), [('message', newest.id), ('task', self.task.id)]
+            )
+
+    def test_messages_do_not_crowd_out_tasks(self):
+        """Test a flood of newer messages leaves older projects and tasks ranked"""
+        for i in range(5):
+            ProjectMessage.objects.create(project=self.project, user=self.manager, text=f'payment retry {i}')
+        with patch('PM.search.SEARCH_CANDIDATES', 2):
+            kinds = self.kinds(self.manager, 'pay')
+        self.assertIn(('project', self.project.id), kinds)
+        self.assertIn(('task', self.task.id), kinds)
+        self.assertEqual(len(kinds), 4)
+
+    def test_rebuild_command(self):
+        """Test a rebuild restores rows missing from the index"""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM "PM_search"')
+        self.assertEqual(self.kinds(self.manager, 'refund'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.kinds(self.manager, 'refund')), 2)
+
+    def test_search_view(self):
+        """Test the results page highlights matches and escapes message HTML"""
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get(reverse('search'), {'q': 'api'})
+        self.assertContains(response, '&lt;b&gt;<mark>API</mark>&lt;/b&gt;')
+        self.assertContains(response, reverse('project_chat', kwargs={'pk': self.project.id}))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AvatarDerivativeTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='photographer', password='testpass123')
+        self.client.login(username='photographer', password='testpass123')
+
+    def upload(self, size=(1200, 800), orientation=None):
+        image = Image.new('RGB', size, 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('camera.jpg', buffer.getvalue(), content_type='image/jpeg')
+        self.client.post(reverse('profile_edit'), {'avatar': upload, 'occupation': 'Dev'})
+        return Profile.objects.get(user=self.user)
+
+    def test_upload_queues_rendering(self):
+        """Test a new upload is queued and only the upload is settled"""
+        profile = self.upload()
+        self.assertTrue(profile.avatar_pending)
+        self.assertEqual(profile.avatar_hash, '')
+
+        profile.occupation = 'Lead'
+        profile.save()
+        self.assertTrue(Profile.objects.get(pk=profile.pk).avatar_pending)
+
+        self.assertEqual(process_pending_avatars(), (1, 0))
+        profile = Profile.objects.get(pk=profile.pk)
+        self.assertFalse(profile.avatar_pending)
+        self.assertEqual(len(profile.avatar_hash), 16)
+
+    def test_derivatives_are_square_and_stripped(self):
+        """Test every size is rendered upright, square and without EXIF"""
+        self.upload(size=(1200, 800), orientation=6)
+        process_pending_avatars()
+        avatar_hash = Profile.objects.get(user=self.user).avatar_hash
+        for size in AVATAR_SIZES:
+            for ext in ('webp', 'jpg'):
+                with default_storage.open(derivative_path(derivative_name(avatar_hash, size, ext))) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.size, (size, size))
+                    self.assertEqual(len(image.getexif()), 0)
+
+    def test_identical_uploads_share_derivatives(self):
+        """Test the same photo uploaded twice renders to the same names"""
+        first = self.upload()
+        process_pending_avatars()
+        first_hash = Profile.objects.get(pk=first.pk).avatar_hash
+        self.upload()
+        process_pending_avatars()
+        self.assertEqual(Profile.objects.get(pk=first.pk).avatar_hash, first_hash)
+
+    def test_broken_upload_falls_back(self):
+        """Test an unreadable image is settled without derivatives"""
+        profile = Profile.objects.get(user=self.user)
+        profile.avatar = SimpleUploadedFile('broken.jpg', b'not an image')
+        profile.save()
+        self.assertEqual(process_pending_avatars(), (0, 1))
+        profile = Profile.objects.get(pk=profile.pk)
+        self.assertFalse(profile.avatar_pending)
+        self.assertEqual(profile.avatar_hash, '')
+
+    def test_served_immutable(self):
+        """Test derivatives are served with long-lived cache headers and the profile uses them"""
+        self.upload()
+        process_pending_avatars()
+        avatar_hash = Profile.objects.get(user=self.user).avatar_hash
+
+        response = self.client.get(reverse('avatar_file', kwargs={'name': derivative_name(avatar_hash, 128, 'webp')}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response.close()
+
+        self.assertEqual(self.client.get(reverse('avatar_file', kwargs={'name': 'settings.py'})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('avatar_file', kwargs={'name': 'ffffffffffffffff-64.jpg'})).status_code, 404)
+
+        response = self.client.get(reverse('profile'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, derivative_name(avatar_hash, 256, 'webp'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CHAT_UPLOAD_TEMP_DIR=tempfile.mkdtemp())
+class ChunkedUploadTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpass123')
+        self.projects = [
+            Project.objects.create(
+                name=f'Upload {i}', description='d', start_date=timezone.now(),
+                end_date=timezone.now() + timedelta(days=30), manager=self.manager
+            )
+            for i in range(2)
+        ]
+        self.client.login(username='manager', password='testpass123')
+
+    def start(self, project, content, filename='spec.pdf'):
+        response = self.client.post(
+            reverse('chat_upload_start', kwargs={'pk': project.id}), {'filename': filename, 'size': len(content)}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, upload, content, start, end):
+        return self.client.put(
+            upload['url'], content[start:end], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(content)}'
+        )
+
+    def send(self, project, content, chunk=4):
+        upload = self.start(project, content)
+        for start in range(0, len(content), chunk):
+            self.assertEqual(self.put(upload, content, start, min(start + chunk, len(content))).status_code, 200)
+        return upload
+
+    def test_chunks_assemble_into_blob(self):
+        """Test chunks are appended in order and stored under their hash"""
+        content = b'0123456789abcdef-tail'
+        upload = self.send(self.projects[0], content)
+        self.assertTrue(self.client.get(upload['url']).json()['complete'])
+
+        blob = ChatBlob.objects.get()
+        self.assertEqual(blob.size, len(content))
+        self.assertIn(blob.sha256, blob.file.name)
+        with blob.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertFalse(partial_path(ChatUpload.objects.get()).exists())
+
+    def test_resume_after_dropped_chunk(self):
+        """Test a client that lost track of the offset is told where to resume"""
+        content = b'abcdefghijkl'
+        upload = self.start(self.projects[0], content)
+        self.put(upload, content, 0, 4)
+
+        response = self.put(upload, content, 0, 4)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+        self.assertEqual(self.client.get(upload['url']).json()['offset'], 4)
+
+        self.put(upload, content, 4, 12)
+        with ChatBlob.objects.get().file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_bad_ranges_rejected(self):
+        """Test chunks past the declared size or over the limit are refused"""
+        content = b'abcdefgh'
+        upload = self.start(self.projects[0], content)
+        response = self.client.put(
+            upload['url'], b'abcdefghij', content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-9/10'
+        )
+        self.assertEqual(response.status_code, 400)
+        with patch('PM.uploads.CHAT_UPLOAD_CHUNK_SIZE', 4):
+            self.assertEqual(self.put(upload, content, 0, 8).status_code, 400)
+        self.assertEqual(self.client.get(upload['url']).json()['offset'], 0)
+
+    def test_identical_files_share_blob(self):
+        """Test the same attachment posted in two projects is stored once"""
+        content = b'same bytes everywhere'
+        for project in self.projects:
+            upload = self.send(project, content)
+            response = self.client.post(
+                reverse('project_chat', kwargs={'pk': project.id}), {'text': '', 'upload': upload['upload']},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(ChatBlob.objects.count(), 1)
+        self.assertEqual(ProjectMessage.objects.filter(blob__isnull=False).count(), 2)
+        self.assertFalse(ChatUpload.objects.exists())
+        response = self.client.get(reverse('project_chat', kwargs={'pk': self.projects[1].id}))
+        self.assertContains(response, 'download="spec.pdf"')
+
+    def test_upload_bound_to_owner_and_project(self):
+        """Test an upload cannot be attached from another project"""
+        upload = self.send(self.projects[0], b'private')
+        response = self.client.post(
+            reverse('project_chat', kwargs={'pk': self.projects[1].id}), {'text': 'x', 'upload': upload['upload']}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge(self):
+        """Test abandoned uploads and unused blobs are removed"""
+        unfinished = self.start(self.projects[0], b'abcdefgh')
+        self.send(self.projects[0], b'finished')
+        self.assertEqual(purge_stale_uploads(max_age=3600), (0, 0))
+
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            self.assertEqual(purge_stale_uploads(max_age=3600), (2, 1))
+        self.assertFalse(ChatUpload.objects.filter(token=unfinished['upload']).exists())
+        self.assertFalse(ChatBlob.objects.exists())
+
+
+class FragmentCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_stats.clear()
+        self.manager = User.objects.create_user(username='manager', password='testpass123')
+        self.member = User.objects.create_user(username='member', password='testpass123')
+        self.project = Project.objects.create(
+            name='Cached', description='d', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30), manager=self.manager
+        )
+        ProjectMembership.objects.get_or_create(project=self.project, user=self.member)
+        self.task = Task.objects.create(
+            project=self.project, title='First title', status='todo', assignee=self.member,
+            deadline=timezone.now() + timedelta(days=3)
+        )
+        self.client.login(username='manager', password='testpass123')
+
+    def counts(self, name):
+        return fragment_stats.summary().get(name, {'hits': 0, 'misses': 0})
+
+    def test_second_render_hits(self):
+        """Test project cards and task rows are served from cache on repeat views"""
+        self.client.get(reverse('project_list'))
+        self.client.get(reverse('project_detail', kwargs={'pk': self.project.id}))
+        response = self.client.get(reverse('project_detail', kwargs={'pk': self.project.id}))
+        self.assertContains(response, 'First title')
+        self.client.get(reverse('project_list'))
+        self.assertEqual(self.counts('task_row'), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+        self.assertEqual(self.counts('project_card')['hits'], 1)
+
+    def test_save_and_update_invalidate(self):
+        """Test saves and queryset updates replace the cached task row"""
+        url = reverse('project_detail', kwargs={'pk': self.project.id})
+        self.client.get(url)
+        self.task.title = 'Second title'
+        self.task.save()
+        self.assertContains(self.client.get(url), 'Second title')
+
+        Task.objects.filter(pk=self.task.pk).update(title='Third title')
+        response = self.client.get(url)
+        self.assertContains(response, 'Third title')
+        self.assertNotContains(response, 'Second title')
+        self.assertEqual(self.counts('task_row')['hits'], 0)
+
+    def test_project_card_follows_progress(self):
+        """Test the cached card changes when a task is completed"""
+        self.client.get(reverse('project_list'))
+        self.task.status = 'done'
+        self.task.save()
+        self.client.get(reverse('project_list'))
+        self.assertEqual(self.counts('project_card')['hits'], 0)
+
+    def test_chat_message_varies_per_viewer(self):
+        """Test a message is cached separately for its author and other members"""
+        ProjectMessage.objects.create(project=self.project, user=self.manager, text='hello team')
+        url = reverse('project_chat', kwargs={'pk': self.project.id})
+        self.client.get(url)
+        self.client.get(url)
+
+        other = Client()
+        other.login(username='member', password='testpass123')
+        response = other.get(url)
+        self.assertContains(response, 'hello team')
+        self.assertEqual(self.counts('chat_message'), {'hits': 1, 'misses': 2, 'hit_ratio': 0.333})
+
+    def test_deleting_message_invalidates_replies(self):
+        """Test replies stop quoting a message once it is deleted"""
+        original = ProjectMessage.objects.create(project=self.project, user=self.manager, text='quoted words')
+        ProjectMessage.objects.create(project=self.project, user=self.member, text='answer', reply_to=original)
+        url = reverse('project_chat', kwargs={'pk': self.project.id})
+        self.assertContains(self.client.get(url), 'quoted words')
+
+        self.client.post(reverse('project_message_delete', kwargs={'pk': self.project.id, 'message_id': original.id}))
+        self.assertNotContains(self.client.get(url), 'quoted words')
+
+    def test_renamed_user_is_not_stale(self):
+        """Test chat messages, replies and task rows show a user's new name"""
+        original = ProjectMessage.objects.create(project=self.project, user=self.member, text='first')
+        ProjectMessage.objects.create(project=self.project, user=self.manager, text='answer', reply_to=original)
+        chat = reverse('project_chat', kwargs={'pk': self.project.id})
+        detail = reverse('project_detail', kwargs={'pk': self.project.id})
+        self.client.get(chat)
+        self.client.get(detail)
+
+        self.member.first_name, self.member.last_name = 'Mira', 'Renamed'
+        self.member.save()
+        response = self.client.get(chat)
+        # The author line, the reply quoting it and the uncached reply button
+        self.assertContains(response, 'Mira Renamed', count=3)
+        self.assertContains(self.client.get(detail), 'Mira Renamed')
+
+    def test_unread_badge_does_not_split_the_card(self):
+        """Test new chat messages leave the cached project card in place"""
+        self.client.get(reverse('project_list'))
+        ProjectMessage.objects.create(project=self.project, user=self.member, text='ping')
+        response = self.client.get(reverse('project_list'))
+        self.assertContains(response, 'title="Unread chat messages">1</a>', html=False)
+        self.assertEqual(self.counts('project_card')['hits'], 1)
+
+    def test_stats_staff_only(self):
+        """Test the fragment statistics endpoint is limited to staff"""
+        self.assertEqual(self.client.get(reverse('fragment_stats')).status_code, 403)
+        self.manager.is_staff = True
+        self.manager.save()
+        self.client.get(reverse('project_list'))
+        response = self.client.get(reverse('fragment_stats'))
+        self.assertEqual(response.json()['fragments']['project_card']['misses'], 1)
+
+
+
+class JsonApiTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpass123')
+        self.outsider = User.objects.create_user(username='outsider', password='testpass123')
+        self.project = Project.objects.create(
+            name='API', description='d', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30), manager=self.manager
+        )
+        self.other = Project.objects.create(
+            name='Hidden', description='d', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30), manager=self.outsider
+        )
+        for project in (self.project, self.other):
+            for i in range(5):
+                Task.objects.create(
+                    project=project, title=f'{project.name} task {i}', status='todo',
+                    deadline=timezone.now() + timedelta(days=i)
+                )
+        self.client.login(username='manager', password='testpass123')
+
+    def test_sparse_fields_and_scope(self):
+        """Test only requested fields of the user's own rows are returned"""
+        response = self.client.get(reverse('api_tasks'), {'fields': 'title,status'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(set(results[0]), {'id', 'title', 'status'})
+        self.assertTrue(all(row['title'].startswith('API') for row in results))
+
+        response = self.client.get(reverse('api_tasks'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
+
+    def test_keyset_pagination(self):
+        """Test following next links visits every row once"""
+        url, seen = reverse('api_tasks') + '?limit=2&fields=title', []
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, sorted(Task.objects.filter(project=self.project).values_list('id', flat=True)))
+
+    def test_not_modified_skips_rows(self):
+        """Test a matching If-None-Match gets a 304 from one aggregate query"""
+        response = self.client.get(reverse('api_projects'))
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api_projects'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len([q for q in queries if 'PM_project' in q['sql']]), 1)
+
+        self.assertNotEqual(self.client.get(reverse('api_projects'), {'fields': 'name'})['ETag'], etag)
+
+    def test_etag_changes_with_rows(self):
+        """Test edits, queryset updates, counter changes and deletes all change the ETag"""
+        url = reverse('api_tasks')
+        etags = [self.client.get(url)['ETag']]
+        task = Task.objects.filter(project=self.project).first()
+
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=1)):
+            task.title = 'Renamed'
+            task.save()
+        etags.append(self.client.get(url)['ETag'])
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=2)):
+            Task.objects.filter(pk=task.pk).update(status='done')
+        etags.append(self.client.get(url)['ETag'])
+        task.delete()
+        etags.append(self.client.get(url)['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+
+    def test_messages_members_only(self):
+        """Test chat messages are served only to project members"""
+        ProjectMessage.objects.create(project=self.project, user=self.manager, text='hello')
+        ProjectMessage.objects.create(project=self.other, user=self.outsider, text='secret')
+        response = self.client.get(reverse('api_project_messages', kwargs={'pk': self.project.id}))
+        self.assertEqual([row['text'] for row in response.json()['results']], ['hello'])
+        response = self.client.get(reverse('api_project_messages', kwargs={'pk': self.other.id}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.post(reverse('api_projects')).status_code, 405)
+
+
+class TaskBatchStatusTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='worker', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.projects = [Project.objects.create(name=f'Batch {i}', manager=self.other) for i in range(2)]
+        self.tasks = [
+            Task.objects.create(
+                project=self.projects[i % 2], title=f'Task {i}', assignee=self.user,
+                deadline=timezone.now() + timedelta(days=1)
+            )
+            for i in range(6)
+        ]
+        self.foreign = Task.objects.create(
+            project=self.projects[0], title='Not mine', assignee=self.other, deadline=timezone.now() + timedelta(days=1)
+        )
+        self.client.login(username='worker', password='testpass123')
+
+    def post(self, transitions):
+        return self.client.post(
+            reverse('task_batch_status'), json.dumps({'transitions': transitions}), content_type='application/json'
+        )
+
+    def test_one_update_per_status(self):
+        """Test each target status is applied with a single UPDATE and progress follows"""
+        ids = [task.id for task in self.tasks]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'done': ids[:4] + [self.foreign.id], 'in_progress': ids[4:]})
+        self.assertEqual(response.status_code, 200)
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "PM_task"')]
+        self.assertEqual(len(updates), 2)
+
+        data = response.json()
+        self.assertEqual(data['moved'], {'done': ids[:4], 'in_progress': ids[4:]})
+        self.assertEqual(
+            [(p['id'], p['done_count'], p['in_progress_count'], p['progress']) for p in data['projects']],
+            [(self.projects[0].id, 2, 1, 50), (self.projects[1].id, 2, 1, 66)]
+        )
+        self.assertEqual(Task.objects.get(pk=self.foreign.pk).status, 'todo')
+        self.assertEqual(Project.objects.get(pk=self.projects[0].pk).progress, 50)
+
+        # Tasks already in their target status are left alone
+        self.assertEqual(self.post({'done': ids[:2]}).json(), {'moved': {'done': []}, 'projects': []})
+
+    def test_invalid_batches_rejected(self):
+        """Test unknown statuses, bad ids and conflicting targets are refused"""
+        task_id = self.tasks[0].id
+        self.assertEqual(self.post({'archived': [task_id]}).status_code, 400)
+        self.assertEqual(self.post({'done': ['x']}).status_code, 400)
+        self.assertEqual(self.post({'done': [task_id], 'todo': [task_id]}).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        with patch('PM.transitions.TASK_BATCH_LIMIT', 2):
+            self.assertEqual(self.post({'done': [t.id for t in self.tasks]}).status_code, 400)
+        self.assertEqual(Task.objects.filter(status='todo').count(), 7)
+
+    def test_dashboard_form(self):
+        """Test the dashboard checkbox form moves the selected tasks and refreshes the page"""
+        self.client.get(reverse('dashboard'))
+        response = self.client.post(
+            reverse('task_batch_status'), {'status': 'done', 'task': [self.tasks[0].id, self.tasks[1].id]}, follow=True
+        )
+        self.assertContains(response, '2 task(s) updated.')
+        statuses = {task.id: task.status for task in response.context['assigned_tasks']}
+        self.assertEqual(statuses[self.tasks[0].id], 'done')
+        self.assertEqual(statuses[self.tasks[2].id], 'todo')
+
+
+class DeadlineReminderTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Deadlines', manager=self.user)
+        self.now = timezone.now()
+        OutboundEmail.objects.all().delete()
+
+    def task(self, title, due_in, status='todo', assignee=True):
+        return Task.objects.create(
+            project=self.project, title=title, status=status, deadline=self.now + due_in,
+            assignee=self.user if assignee else None
+        )
+
+    def test_most_urgent_window_only(self):
+        """Test each task gets the single window its deadline falls in"""
+        tomorrow = self.task('Tomorrow', timedelta(hours=20))
+        soon = self.task('Soon', timedelta(minutes=30))
+        late = self.task('Late', -timedelta(hours=2))
+        self.task('Long overdue', -timedelta(days=3))
+        self.task('Next week', timedelta(days=7))
+        self.task('Finished', timedelta(minutes=30), status='done')
+        self.task('Unassigned', timedelta(minutes=30), assignee=False)
+
+        self.assertEqual(send_due_reminders(now=self.now), (3, 1))
+        self.assertEqual(
+            set(TaskReminder.objects.values_list('task_id', 'kind')),
+            {(tomorrow.id, '24h'), (soon.id, '1h'), (late.id, 'overdue')}
+        )
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.recipients, ['worker@test.com'])
+        self.assertIn('Due in the next 24h:\n- Tomorrow (Deadlines)', email.body)
+        self.assertIn('Overdue:\n- Late (Deadlines)', email.body)
+
+    def test_reruns_are_idempotent(self):
+        """Test a reminder is sent once, and again only when its window or deadline changes"""
+        task = self.task('Tomorrow', timedelta(hours=20))
+        self.assertEqual(send_due_reminders(now=self.now), (1, 1))
+        self.assertEqual(send_due_reminders(now=self.now), (0, 0))
+
+        # Nineteen and a half hours later it enters the 1h window
+        self.assertEqual(send_due_reminders(now=self.now + timedelta(hours=19, minutes=30)), (1, 1))
+
+        task.deadline = self.now + timedelta(hours=22)
+        task.save()
+        self.assertEqual(send_due_reminders(now=self.now), (1, 1))
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+    def test_batches_and_command(self):
+        """Test large scans are split into batches and the command drains them"""
+        for i in range(5):
+            self.task(f'Task {i}', timedelta(hours=i + 2))
+        self.assertEqual(send_due_reminders(now=self.now, batch_size=2), (2, 1))
+        out = StringIO()
+        call_command('send_reminders', '--batch-size', '2', stdout=out)
+        self.assertEqual(TaskReminder.objects.count(), 5)
+        self.assertIn('Queued 1 reminder(s) in 1 email(s)', out.getvalue())
+
+
+class NotificationDigestTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.worker = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(name='Digest', manager=self.manager)
+
+    def create_tasks(self, count):
+        return [
+            Task.objects.create(
+                project=self.project, title=f'Task {i}', assignee=self.worker,
+                deadline=timezone.now() + timedelta(days=1)
+            )
+            for i in range(count)
+        ]
+
+    def test_burst_becomes_one_digest(self):
+        """Test many assignments queue no email until the window closes, then one digest"""
+        self.create_tasks(50)
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.worker, kind='assigned').count(), 50)
+
+        self.assertEqual(send_digests(), (0, 0))
+        later = timezone.now() + timedelta(minutes=20)
+        self.assertEqual(send_digests(now=later), (1, 50))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.recipients, ['worker@test.com'])
+        self.assertIn('New assignments:\n- Task 0 (Digest)', email.body)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(send_digests(now=later), (0, 0))
+
+    def test_status_changes_reach_manager(self):
+        """Test status changes by the assignee are summarized for the manager, batch moves included"""
+        first, second, third = self.create_tasks(3)
+        first.status = 'in_progress'
+        first.save()
+        apply_transitions(self.worker, {'done': {second.id, third.id}})
+        self.assertEqual(
+            list(Notification.objects.filter(recipient=self.manager).values_list('message', flat=True)),
+            ['Task 0 (Digest): To Do -> In Progress', 'Task 1 (Digest): To Do -> Done', 'Task 2 (Digest): To Do -> Done']
+        )
+
+        out = StringIO()
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=1)):
+            call_command('send_digests', stdout=out)
+        self.assertIn('Queued 2 digest(s) covering 6 notification(s).', out.getvalue())
+        body = OutboundEmail.objects.get(recipients=['manager@test.com']).body
+        self.assertIn('Status changes:\n- Task 0 (Digest): To Do -> In Progress', body)
+
+    def test_unknown_status_is_refused(self):
+        """Test the status link rejects values outside the status choices"""
+        task, = self.create_tasks(1)
+        self.client.login(username='worker', password='testpass123')
+        response = self.client.get(reverse('task_update_status', kwargs={'pk': task.pk, 'status': 'bogus'}))
+        self.assertRedirects(response, reverse('dashboard'))
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'todo')
+        self.assertFalse(Notification.objects.filter(kind='status').exists())
+
+    def test_digests_off_mails_each(self):
+        """Test each notification becomes its own queued email with digests off"""
+        with patch('PM.notifications.NOTIFICATION_DIGESTS', False):
+            self.create_tasks(2)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(OutboundEmail.objects.filter(recipients=['worker@test.com']).count(), 2)
+
+
+
+class OTPTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='coder', email='coder@test.com', password='testpass123')
+
+    def sent_code(self):
+        return OutboundEmail.objects.latest('pk').body.rsplit(' ', 1)[-1]
+
+    def test_registration_code_is_single_use(self):
+        """Test the emailed code verifies once, read with a single query"""
+        self.client.post(reverse('register'), {
+            'username': 'newbie', 'email': 'newbie@test.com',
+            'password1': 'ComplexPass123!', 'password2': 'ComplexPass123!'
+        })
+        code = self.sent_code()
+        self.assertTrue(EmailOTP.objects.filter(user__username='newbie', purpose='verify').exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('email_verification'), {'username': 'newbie', 'otp': code})
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+        self.assertIsNone(verification_otp.verify('newbie', code))
+
+    def test_attempts_and_expiry(self):
+        """Test wrong guesses burn the code and old codes stop working"""
+        code = reset_otp.issue(self.user)
+        wrong = f'{(int(code) + 1) % 10 ** 6:06d}'
+        for _ in range(OTP_MAX_ATTEMPTS - 1):
+            self.assertIsNone(reset_otp.verify('coder', wrong))
+        self.assertEqual(reset_otp.verify('coder', code), self.user)
+
+        code = reset_otp.issue(self.user)
+        for _ in range(OTP_MAX_ATTEMPTS):
+            reset_otp.verify('coder', wrong)
+        self.assertIsNone(reset_otp.verify('coder', code))
+
+        code = reset_otp.issue(self.user)
+        self.assertIsNone(verification_otp.verify('coder', code))
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=OTP_TTL + 1)):
+            self.assertIsNone(reset_otp.verify('coder', code))
+
+    def test_attempts_are_claimed_atomically(self):
+        """Test the right code is refused once other guesses have used up the attempts"""
+        code = reset_otp.issue(self.user)
+        # Concurrent wrong guesses on other workers claimed every attempt
+        EmailOTP.objects.update(attempts=OTP_MAX_ATTEMPTS)
+        self.assertIsNone(reset_otp.verify('coder', code))
+        self.assertEqual(EmailOTP.objects.get().attempts, OTP_MAX_ATTEMPTS)
+
+    def test_hashed_rows_and_purge(self):
+        """Test codes are one hashed row per user and purpose, swept once expired"""
+        code = reset_otp.issue(self.user)
+        reset_otp.issue(self.user)
+        stored = EmailOTP.objects.get()
+        self.assertNotIn(code, stored.otp)
+        self.assertIsNone(reset_otp.verify('coder', code))
+        self.assertEqual(EmailOTP.objects.get().attempts, 1)
+
+        code = reset_otp.issue(self.user)
+        self.assertEqual(reset_otp.verify('coder', code), self.user)
+        self.assertFalse(EmailOTP.objects.exists())
+
+        reset_otp.issue(self.user)
+        verification_otp.issue(self.user)
+        out = StringIO()
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=OTP_TTL + 1)):
+            call_command('purge_otps', stdout=out)
+        self.assertIn('Purged 2 expired code(s).', out.getvalue())
+
+    def test_password_reset_flow(self):
+        """Test the reset code from forgot_password sets the new password"""
+        self.client.post(reverse('forgot_password'), {'email': 'coder@test.com'})
+        code = self.sent_code()
+        response = self.client.post(reverse('reset_password'), {'otp': code, 'new_password': 'N3wSecret!x'})
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertTrue(self.client.login(username='coder', password='N3wSecret!x'))
+
+
+class CachedAuthTestCase(TestCase):
+    AUTH_TABLES = ('auth_user', 'django_session', 'PM_profile')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='member', email='member@test.com', password='testpass123')
+        self.client.login(username='member', password='testpass123')
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in queries if any(f'"{table}"' in q['sql'] for table in self.AUTH_TABLES)]
+
+    def test_warm_requests_skip_auth_queries(self):
+        """Test the user, profile and session come from the cache once loaded"""
+        self.client.get(reverse('home'))
+        response, queries = self.auth_queries(reverse('profile'))
+        self.assertEqual(response.context['profile'].user, self.user)
+        self.assertEqual(queries, [])
+
+    def test_anonymous_requests_make_no_queries(self):
+        """Test anonymous page views touch no tables"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client_class().get(reverse('home'))
+        self.assertEqual(len(queries), 0)
+
+    def test_profile_edit_invalidates(self):
+        """Test saving the profile drops the cached copy"""
+        self.client.get(reverse('profile'))
+        self.client.post(reverse('profile_edit'), {'occupation': 'Engineer', 'github': '', 'linkedin': '', 'address': ''})
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['profile'].occupation, 'Engineer')
+
+    def test_password_change_logs_out_other_sessions(self):
+        """Test a cached user is not trusted after their password changes"""
+        self.client.get(reverse('profile'))
+        self.user.set_password('N3wSecret!x')
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_reads_database(self):
+        """Test users are not cached where other workers could not invalidate them"""
+        self.client.get(reverse('profile'))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response, queries = self.auth_queries(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(any('"auth_user"' in sql for sql in queries))
+
+    def test_logout_invalidates(self):
+        """Test logging out drops the cached user and session"""
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(f'pm:auth-user:{self.user.pk}'))
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProjectArchiveTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.worker = User.objects.create_user(username='worker', email='worker@test.com', password='testpass123')
+        self.project = Project.objects.create(
+            name='Finished', manager=self.manager,
+            start_date=timezone.now() - timedelta(days=120), end_date=timezone.now() - timedelta(days=60)
+        )
+        for i, status in enumerate(['done', 'done', 'in_progress']):
+            Task.objects.create(
+                project=self.project, title=f'Archived task {i}', assignee=self.worker, status=status,
+                deadline=timezone.now() - timedelta(days=70)
+            )
+        previous = None
+        for i in range(5):
+            previous = ProjectMessage.objects.create(
+                project=self.project, user=self.worker, text=f'legacy message {i}', reply_to=previous
+            )
+        TaskInvite.objects.create(email='late@test.com', project=self.project, inviter=self.manager)
+        self.client.login(username='worker', password='testpass123')
+
+    def archive(self):
+        call_command('archive_projects', '--batch-size', '2', stdout=StringIO())
+        self.project.refresh_from_db()
+
+    def test_archive_moves_rows_in_batches(self):
+        """Test finished projects move to segments, keeping counters and memberships"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.archive()
+        # Open chats are not told the archived messages were deleted
+        self.assertEqual(callbacks, [])
+        self.assertTrue(self.project.is_archived)
+        self.assertFalse(Task.objects.filter(project=self.project).exists())
+        self.assertFalse(ProjectMessage.objects.filter(project=self.project).exists())
+        self.assertFalse(TaskInvite.objects.filter(project=self.project).exists())
+        self.assertEqual(
+            sorted(self.project.archive_segments.values_list('kind', 'rows')),
+            [('invite', 1), ('message', 1), ('message', 2), ('message', 2), ('task', 1), ('task', 2)]
+        )
+        self.assertEqual((self.project.done_count, self.project.in_progress_count), (2, 1))
+        self.assertTrue(ProjectMembership.objects.filter(project=self.project, user=self.worker).exists())
+        self.assertEqual(search_documents(self.worker, 'legacy')[0], [])
+
+    def test_archived_project_is_read_only_but_viewable(self):
+        """Test the detail and chat pages read from the archive and refuse writes"""
+        self.archive()
+        response = self.client.get(reverse('project_detail', kwargs={'pk': self.project.id}))
+        self.assertEqual([task.title for task in response.context['tasks']], [f'Archived task {i}' for i in range(3)])
+        self.assertEqual(response.context['tasks'][0].assignee, self.worker)
+        self.assertNotContains(response, reverse('task_create', kwargs={'project_id': self.project.id}))
+
+        response = self.client.get(reverse('project_chat', kwargs={'pk': self.project.id}))
+        messages_list = response.context['messages']
+        self.assertEqual([message.text for message in messages_list], [f'legacy message {i}' for i in range(5)])
+        self.assertEqual(messages_list[4].reply_to.text, 'legacy message 3')
+        self.assertContains(response, 'read-only')
+
+        response = self.client.post(reverse('project_chat', kwargs={'pk': self.project.id}), {'text': 'Hello?'})
+        self.assertEqual(response.status_code, 403)
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get(reverse('task_create', kwargs={'project_id': self.project.id}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_archived_history_pages(self):
+        """Test archived chat history walks back page by page"""
+        self.archive()
+        url = reverse('project_chat_history', kwargs={'pk': self.project.id})
+        page, cursor = archived_message_page(self.project, limit=2)
+        self.assertEqual([message.text for message in page], ['legacy message 3', 'legacy message 4'])
+        page, cursor = archived_message_page(self.project, before=cursor, limit=2)
+        self.assertEqual([message.text for message in page], ['legacy message 1', 'legacy message 2'])
+
+        data = self.client.get(url, {'before': cursor}).json()
+        self.assertIn('legacy message 0', data['html'])
+        self.assertNotIn('legacy message 1', data['html'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_restore_brings_rows_back(self):
+        """Test restoring puts every row back as it was and drops the segments"""
+        before = {
+            'tasks': list(Task.objects.filter(project=self.project).order_by('id').values()),
+            'messages': list(ProjectMessage.objects.filter(project=self.project).order_by('id').values()),
+            'invites': list(TaskInvite.objects.filter(project=self.project).order_by('id').values()),
+        }
+        self.archive()
+        names = list(self.project.archive_segments.values_list('name', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('restore_project', self.project.id, stdout=StringIO())
+        self.project.refresh_from_db()
+
+        self.assertFalse(self.project.is_archived)
+        self.assertEqual(before, {
+            'tasks': list(Task.objects.filter(project=self.project).order_by('id').values()),
+            'messages': list(ProjectMessage.objects.filter(project=self.project).order_by('id').values()),
+            'invites': list(TaskInvite.objects.filter(project=self.project).order_by('id').values()),
+        })
+        self.assertFalse(self.project.archive_segments.exists())
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+        self.assertEqual(len(search_documents(self.worker, 'legacy')[0]), 5)
+
+    def test_restored_project_is_not_archived_again(self):
+        """Test the next archive run leaves a restored project in the hot tables"""
+        self.archive()
+        call_command('restore_project', self.project.id, stdout=StringIO())
+        self.archive()
+        self.assertFalse(self.project.is_archived)
+        self.assertEqual(Task.objects.filter(project=self.project).count(), 3)
+        self.assertFalse(self.project.archive_segments.exists())
+        later = timezone.now() + timedelta(days=ARCHIVE_AFTER_DAYS + 1)
+        self.assertEqual(list(due_projects(later)), [self.project])
+
+    def test_only_finished_projects_are_due(self):
+        """Test open-ended and recently finished projects stay in the hot tables"""
+        Project.objects.create(name='Ongoing', manager=self.manager)
+        Project.objects.create(name='Just ended', manager=self.manager, end_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(list(due_projects()), [self.project])
+
+    def test_interrupted_run_is_due_again(self):
+        """Test an archived project with rows still in the hot tables is picked up again"""
+        archive_batch(self.project, 'task', 2)
+        Project.objects.filter(pk=self.project.pk).update(archived_at=timezone.now())
+        self.assertEqual(list(due_projects()), [self.project])
+        self.archive()
+        self.assertFalse(Task.objects.filter(project=self.project).exists())
+        self.assertEqual(list(due_projects()), [])
+
+    def test_export_and_api(self):
+        """Test the export reads archived rows while the API refuses them clearly"""
+        self.archive()
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get(reverse('project_export', kwargs={'pk': self.project.id}), {'kind': ['tasks', 'messages']})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(
+            [(record['type'], record.get('title') or record.get('text')) for record in records],
+            [('task', f'Archived task {i}') for i in range(3)] + [('message', f'legacy message {i}') for i in range(5)]
+        )
+        self.assertEqual(records[0]['assignee__username'], 'worker')
+        self.assertEqual(records[-1]['reply_to_id'], records[-2]['id'])
+
+        response = self.client.get(reverse('api_tasks'), {'project': self.project.id})
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('archived', response.json()['error'])
+        response = self.client.get(reverse('api_project_messages', kwargs={'pk': self.project.id}))
+        self.assertEqual(response.status_code, 409)
+        response = self.client.get(reverse('api_projects'), {'fields': 'id,archived_at'})
+        self.assertIsNotNone(response.json()['results'][0]['archived_at'])
+
+    def test_api_hides_archived_projects_from_outsiders(self):
+        """Test non-members cannot learn that a project exists or is archived"""
+        self.archive()
+        User.objects.create_user(username='outsider', password='testpass123')
+        self.client.login(username='outsider', password='testpass123')
+        response = self.client.get(reverse('api_tasks'), {'project': self.project.id})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('api_tasks'), {'project': self.project.id + 1000})
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatUnreadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', email='manager@test.com', password='testpass123')
+        self.reader = User.objects.create_user(username='reader', email='reader@test.com', password='testpass123')
+        self.projects = [Project.objects.create(name=f'Room {i}', manager=self.manager) for i in range(2)]
+        for project in self.projects:
+            ProjectMembership.objects.create(project=project, user=self.reader, role='client')
+        self.client.login(username='reader', password='testpass123')
+
+    def post(self, project, user, count=1):
+        for i in range(count):
+            ProjectMessage.objects.create(project=project, user=user, text=f'note {i}')
+
+    def test_counts_skip_own_messages(self):
+        """Test unread counts cover other people's messages in every project"""
+        self.post(self.projects[0], self.manager, 3)
+        self.post(self.projects[0], self.reader, 2)
+        self.post(self.projects[1], self.manager)
+        self.assertEqual(unread_counts(self.reader), {self.projects[0].id: 3, self.projects[1].id: 1})
+        self.assertEqual(unread_counts(self.manager), {self.projects[0].id: 2})
+
+    def test_viewing_chat_advances_cursor(self):
+        """Test opening a chat, or catching up live, marks its messages read"""
+        self.post(self.projects[0], self.manager, 3)
+        self.client.get(reverse('project_chat', kwargs={'pk': self.projects[0].id}))
+        self.assertEqual(unread_counts(self.reader), {})
+
+        self.post(self.projects[0], self.manager)
+        response = self.client.get(reverse('project_list'))
+        self.assertEqual([project.unread for project in response.context['projects']], [1, 0])
+
+        mark_read(self.reader, self.projects[0], 1)
+        self.assertEqual(unread_counts(self.reader), {self.projects[0].id: 1})
+        cursor = ChatReadCursor.objects.get(user=self.reader, project=self.projects[0])
+        self.client.get(reverse('project_chat_history', kwargs={'pk': self.projects[0].id}), {'after': ''})
+        self.assertEqual(unread_counts(self.reader), {})
+        self.assertGreater(ChatReadCursor.objects.get(pk=cursor.pk).last_read_id, cursor.last_read_id)
+
+    def test_up_to_date_chat_skips_the_write(self):
+        """Test reopening a chat already read does not touch the cursor"""
+        self.post(self.projects[0], self.manager, 3)
+        url = reverse('project_chat', kwargs={'pk': self.projects[0].id})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query for query in queries if 'UPDATE "PM_chatreadcursor"' in query['sql']])
+        self.assertFalse([query for query in queries if 'INSERT INTO "PM_chatreadcursor"' in query['sql']])
+
+    def test_existing_history_is_seeded_as_read(self):
+        """Test the cursor migration marks history from before it as read"""
+        self.post(self.projects[0], self.manager, 3)
+        self.post(self.projects[1], self.manager)
+        seed = import_module('PM.migrations.0025_seed_chat_read_cursors').seed_read_cursors
+        seed(apps, None)
+        self.assertEqual(unread_counts(self.reader), {})
+        self.assertEqual(unread_counts(self.manager), {})
+
+    def test_counts_are_capped(self):
+        """Test counting stops past the cap and shows as more"""
+        self.post(self.projects[0], self.reader, 4)
+        self.client.login(username='manager', password='testpass123')
+        with patch('PM.chat.UNREAD_COUNT_CAP', 2):
+            self.assertEqual(unread_counts(self.manager), {self.projects[0].id: 3})
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '2+</a>')
+
+    def test_one_query_for_all_projects(self):
+        """Test the project list costs the same however many projects have unread messages"""
+        self.post(self.projects[0], self.manager)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('project_list'))
+        for i in range(10):
+            project = Project.objects.create(name=f'Extra {i}', manager=self.manager)
+            ProjectMembership.objects.create(project=project, user=self.reader, role='client')
+            self.post(project, self.manager, 2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('project_list'))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(sum(project.unread for project in response.context['projects']), 21)
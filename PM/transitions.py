@@ -0,0 +1,83 @@
+"""Batch task status changes.
+
+A batch maps each target status to the tasks moving there. Each status
+is applied with a single queryset UPDATE, and TaskQuerySet.update keeps
+the project counters (and so progress), memberships and cached
+fragments in step. Only tasks assigned to the user move; others in the
+batch are ignored, as are tasks already in their target status. Project
+managers hear about the moves in their next digest, with one insert for
+the whole batch.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .dashboard import invalidate_dashboard
+from .models import TASK_COUNT_FIELDS, Task
+from .notifications import queue_notifications, status_notification
+
+TASK_BATCH_LIMIT = getattr(settings, "TASK_BATCH_LIMIT", 500)
+
+
+class TransitionError(ValueError):
+    pass
+
+
+def parse_transitions(transitions):
+    """Validate {status: [task ids]} and return it with the ids as sets"""
+    if not isinstance(transitions, dict) or not transitions:
+        raise TransitionError("Expected a mapping of status to task ids.")
+    statuses = dict(Task.STATUS_CHOICES)
+    parsed, seen = {}, set()
+    for status, task_ids in transitions.items():
+        if status not in statuses:
+            raise TransitionError(f"Unknown status {status!r}; use one of {', '.join(statuses)}.")
+        if not isinstance(task_ids, list):
+            raise TransitionError(f"Task ids for {status} must be a list.")
+        try:
+            task_ids = {int(task_id) for task_id in task_ids}
+        except (TypeError, ValueError):
+            raise TransitionError(f"Task ids for {status} must be integers.")
+        if task_ids & seen:
+            raise TransitionError("A task can only move to one status.")
+        seen |= task_ids
+        parsed[status] = task_ids
+    if len(seen) > TASK_BATCH_LIMIT:
+        raise TransitionError(f"At most {TASK_BATCH_LIMIT} tasks can change at once.")
+    return parsed
+
+
+def apply_transitions(user, transitions):
+    """Move the user's tasks and return (moved ids per status, affected projects).
+
+    Each project is a dict with its task counters and progress after the change.
+    """
+    moved, old_statuses = {}, {}
+    with transaction.atomic():
+        for status, task_ids in transitions.items():
+            tasks = Task.objects.filter(pk__in=task_ids, assignee=user, project__archived_at__isnull=True)
+            tasks = tasks.exclude(status=status)
+            old_statuses.update(tasks.values_list("id", "status"))
+            moved[status] = sorted(pk for pk in old_statuses if pk in task_ids)
+            if moved[status]:
+                Task.objects.filter(pk__in=moved[status]).update(status=status)
+
+        changed = list(Task.objects.filter(pk__in=old_statuses).select_related("project"))
+        queue_notifications(
+            status_notification(task, User(pk=task.project.manager_id), old_statuses[task.pk])
+            for task in changed
+            if task.project.manager_id != user.pk
+        )
+        # Read after the updates, so the projects carry their new counters
+        projects = sorted({task.project_id: task.project for task in changed}.values(), key=lambda project: project.pk)
+
+    # Queryset updates skip the post_save handlers that drop cached dashboards
+    invalidate_dashboard(user.pk, *(project.manager_id for project in projects))
+    return moved, [
+        {
+            "id": project.id,
+            **{field: getattr(project, field) for field in TASK_COUNT_FIELDS.values()},
+            "progress": project.progress,
+        }
+        for project in projects
+    ]
@@ -0,0 +1,180 @@
+"""Chunked, resumable chat attachment uploads stored by content hash.
+
+A client starts an upload with the file name and size, then PUTs the
+bytes in order, one chunk per request. Each chunk is streamed into a
+partial file on local disk and into a running SHA-256, so no request
+holds more than READ_SIZE bytes in memory. After a dropped connection
+the client asks for the current offset and carries on from there. The
+last chunk turns the partial file into a ChatBlob named after its
+digest. If that content is already stored, the new copy is discarded
+and the upload points at the existing blob.
+
+Running digests are kept per process. When a chunk lands on a worker
+that has not seen the earlier ones, the digest is recomputed from disk
+once the upload completes.
+"""
+import hashlib
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .archive import archived_blob_ids
+from .models import ChatBlob, ChatUpload
+
+CHAT_UPLOAD_CHUNK_SIZE = getattr(settings, "CHAT_UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024)
+CHAT_UPLOAD_MAX_SIZE = getattr(settings, "CHAT_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+CHAT_UPLOAD_EXPIRY = getattr(settings, "CHAT_UPLOAD_EXPIRY", 24 * 60 * 60)
+READ_SIZE = 64 * 1024
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the stored bytes end"""
+
+    def __init__(self, expected):
+        super().__init__(f"Expected a chunk at offset {expected}.")
+        self.expected = expected
+
+
+def partial_dir():
+    return Path(getattr(settings, "CHAT_UPLOAD_TEMP_DIR", Path(settings.MEDIA_ROOT) / "partial_uploads"))
+
+
+def partial_path(upload):
+    return partial_dir() / upload.token
+
+
+def blob_name(digest):
+    return f"chat_blobs/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def start_upload(project, user, filename, size):
+    filename = Path(filename or "").name[:255]
+    if not filename:
+        raise UploadError("A file name is required.")
+    if not 0 < size <= CHAT_UPLOAD_MAX_SIZE:
+        raise UploadError(f"Uploads must be between 1 byte and {CHAT_UPLOAD_MAX_SIZE} bytes.")
+    upload = ChatUpload.objects.create(project=project, user=user, filename=filename, size=size)
+    partial_dir().mkdir(parents=True, exist_ok=True)
+    partial_path(upload).touch()
+    return upload
+
+
+def write_chunk(upload, offset, length, stream):
+    """Append length bytes read from stream at offset and return the new offset.
+
+    Completes the upload when the last byte arrives. A chunk that stops
+    short is rolled back, so the client can resend it whole.
+    """
+    if upload.is_complete or offset != upload.received:
+        raise OffsetMismatch(upload.received)
+    if not 0 < length <= CHAT_UPLOAD_CHUNK_SIZE or offset + length > upload.size:
+        raise UploadError(f"Chunks must be 1 to {CHAT_UPLOAD_CHUNK_SIZE} bytes and end within the file.")
+
+    with _digests_lock:
+        position, digest = _digests.pop(upload.token, (0, hashlib.sha256()))
+    if position != offset:
+        digest = None
+
+    path = partial_path(upload)
+    written = 0
+    with open(path, "r+b") as partial:
+        # Drop anything left over from an interrupted earlier attempt
+        partial.truncate(offset)
+        partial.seek(offset)
+        while written < length:
+            piece = stream.read(min(READ_SIZE, length - written))
+            if not piece:
+                break
+            partial.write(piece)
+            if digest is not None:
+                digest.update(piece)
+            written += len(piece)
+        if written != length:
+            partial.truncate(offset)
+
+    if written != length:
+        raise UploadError(f"Chunk ended after {written} of {length} bytes.")
+
+    updated = ChatUpload.objects.filter(pk=upload.pk, received=offset).update(
+        received=offset + length, updated_at=timezone.now()
+    )
+    if not updated:
+        upload.refresh_from_db()
+        raise OffsetMismatch(upload.received)
+    upload.received = offset + length
+
+    if upload.received == upload.size:
+        finish_upload(upload, digest)
+    elif digest is not None:
+        with _digests_lock:
+            _digests[upload.token] = (upload.received, digest)
+    return upload.received
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while piece := source.read(READ_SIZE):
+            digest.update(piece)
+    return digest
+
+
+def finish_upload(upload, digest=None):
+    """Store the assembled file as a blob, reusing an identical one if it exists"""
+    path = partial_path(upload)
+    sha256 = (digest or file_digest(path)).hexdigest()
+
+    blob = ChatBlob.objects.filter(sha256=sha256).first()
+    if blob is None:
+        with open(path, "rb") as source:
+            name = default_storage.save(blob_name(sha256), File(source))
+        try:
+            with transaction.atomic():
+                blob = ChatBlob.objects.create(sha256=sha256, file=name, size=upload.size)
+        except IntegrityError:
+            # Another upload of the same content finished first
+            default_storage.delete(name)
+            blob = ChatBlob.objects.get(sha256=sha256)
+
+    path.unlink(missing_ok=True)
+    upload.blob = blob
+    upload.save(update_fields=["blob", "updated_at"])
+    return blob
+
+
+def purge_stale_uploads(max_age=CHAT_UPLOAD_EXPIRY):
+    """Drop abandoned uploads with their partial files, then blobs nothing refers to.
+
+    Returns (uploads, blobs) removed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = ChatUpload.objects.filter(updated_at__lt=cutoff)
+    uploads = 0
+    for upload in stale.iterator():
+        partial_path(upload).unlink(missing_ok=True)
+        uploads += 1
+    stale.delete()
+
+    blobs = 0
+    orphans = ChatBlob.objects.filter(messages__isnull=True, uploads__isnull=True, created_at__lt=cutoff)
+    # Archived messages keep their attachments for when they are restored
+    orphans = orphans.exclude(pk__in=archived_blob_ids())
+    for blob in orphans.iterator():
+        # Re-check under the delete so a message attached meanwhile keeps it
+        if ChatBlob.objects.filter(pk=blob.pk, messages__isnull=True, uploads__isnull=True).delete()[0]:
+            default_storage.delete(blob.file.name)
+            blobs += 1
+    return uploads, blobs
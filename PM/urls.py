@@ -13,6 +13,7 @@ urlpatterns = [
     # Dashboard
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/calendar/', views.calendar_feed, name='calendar_feed'),
 
     # Projects
     path('projects/', views.project_list, name='project_list'),
@@ -20,22 +21,42 @@ urlpatterns = [
     path('projects/<int:pk>/', views.project_detail, name='project_detail'),
     path('projects/<int:pk>/edit/', views.project_edit, name='project_edit'),
     path('projects/<int:pk>/delete/', views.project_delete, name='project_delete'),
+    path('projects/<int:pk>/export/', views.project_export, name='project_export'),
 
     # Tasks
     path('projects/<int:project_id>/tasks/create/', views.task_create, name='task_create'),
+    path('projects/<int:project_id>/tasks/import/', views.task_import, name='task_import'),
     path('tasks/<int:pk>/edit/', views.task_edit, name='task_edit'),
     path('tasks/<int:pk>/delete/', views.task_delete, name='task_delete'),
     path('tasks/<int:pk>/status/<str:status>/', views.task_update_status, name='task_update_status'),
+    path('tasks/status/', views.task_batch_status, name='task_batch_status'),
 
     # Profile
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.profile_edit, name='profile_edit'),
+    path('avatars/<str:name>', views.avatar_file, name='avatar_file'),
     
     # Invitations
     path('invite/<str:token>/', views.accept_invite, name='accept_invite'),
     
     # Project Chat
     path("projects/<int:pk>/chat/", views.project_chat, name="project_chat"),
+    path("projects/<int:pk>/chat/history/", views.project_chat_history, name="project_chat_history"),
+    path("projects/<int:pk>/chat/stream/", views.project_chat_stream, name="project_chat_stream"),
     path("projects/<int:pk>/chat/messages/<int:message_id>/delete/", views.project_message_delete, name="project_message_delete"),
+    path("projects/<int:pk>/chat/uploads/", views.chat_upload_start, name="chat_upload_start"),
+    path("projects/<int:pk>/chat/uploads/<str:token>/", views.chat_upload_chunk, name="chat_upload_chunk"),
+
+    # Search
+    path("search/", views.search, name="search"),
+
+    # JSON API
+    path("api/projects/", views.api_projects, name="api_projects"),
+    path("api/projects/<int:pk>/messages/", views.api_project_messages, name="api_project_messages"),
+    path("api/tasks/", views.api_tasks, name="api_tasks"),
+
+    # Staff
+    path("staff/query-stats/", views.query_stats_view, name="query_stats"),
+    path("staff/fragment-stats/", views.fragment_stats_view, name="fragment_stats"),
 
 ]
@@ -1,8 +1,65 @@
-from .models import Task
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyLibMCCache, PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+
+from .models import ProjectMembership
+
+
+def user_project_ids(user):
+    """Return the ids of every project user belongs to.
+
+    Loaded with one indexed query and memoized on the user object, which
+    AuthenticationMiddleware builds fresh for each request, so repeated
+    checks within a request are free.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    project_ids = getattr(user, "_project_ids", None)
+    if project_ids is None:
+        project_ids = frozenset(ProjectMembership.objects.filter(user=user).values_list("project_id", flat=True))
+        user._project_ids = project_ids
+    return project_ids
+
 
 def is_project_team_member(user, project):
-    if user == project.manager:
-        return True
-    if hasattr(project, "client") and user == project.client:
-        return True
-    return Task.objects.filter(project=project, assignee=user).exists()
+    return project.pk in user_project_ids(user)
+
+
+def invitation_message(inviter, project, invite_url):
+    """Return the (subject, body) of a task invitation email"""
+    subject = f"You've been invited to join a project on ProjectFlow"
+    message = f"""Hello,
+
+{inviter.username} has invited you to collaborate on a project: {project.name}.
+
+To accept this invitation and view your assigned tasks, please click the link below:
+
+{invite_url}
+
+If you already have an account, you'll be logged in. Otherwise, you can create a new account.
+
+Best regards,
+ProjectFlow Team
+"""
+    return subject, message
+
+
+def shared_cache():
+    """Whether the default cache is one every worker process sees.
+
+    LocMemCache lives inside one process and DummyCache stores nothing, so
+    state that must hold across workers (rate-limit counters, cached users)
+    goes to the database instead when either is configured.
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def shared_counters():
+    """Whether cache.incr is atomic across worker processes.
+
+    Only the Redis and memcached backends increment on the server; the
+    others read and write the value back, losing concurrent updates.
+    """
+    return isinstance(caches["default"], (RedisCache, PyMemcacheCache, PyLibMCCache))
@@ -1,39 +1,59 @@
-from django.http import HttpResponseForbidden
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, PasswordResetForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
-import random
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST, require_safe
 
-from .models import Project, Task, Profile, EmailOTP, ProjectMessage, TaskInvite
+from .models import ChatUpload, Project, ProjectMembership, Task, Profile, ProjectMessage, TaskInvite
 from .forms import UserRegisterForm, ProjectForm, TaskForm, ProfileForm, ProjectMessageForm
-from .utils import is_project_team_member
-
-def generate_otp():
-    return str(random.randint(100000, 999999))
+from .utils import invitation_message, is_project_team_member
+from .chat import InvalidCursor, annotate_unread, encode_cursor, has_read, mark_read, message_page, messages_after
+from .realtime import hub, project_channel
+from .dashboard import (
+    calendar_events, calendar_tasks, get_dashboard, invalidate_dashboard, link_pending_email_tasks, parse_window,
+)
+from .outbox import enqueue_mail
+from .importer import TaskImporter, guess_format, iter_rows
+from .exporter import EXPORT_KINDS, export_stream
+from .ratelimit import client_ip, invite_limiter, ratelimit
+from .instrumentation import query_stats
+from .fragments import fragment_stats, prime_versions
+from .sqlite import serialized_write
+from .search import search_documents
+from .avatars import DERIVATIVE_NAME_RE, derivative_path
+from .archive import archived_message_page, archived_tasks
+from .api import (
+    MESSAGE_FIELDS, PROJECT_FIELDS, TASK_FIELDS, ApiError, collection_etag, etag_for, message_collection, page_of,
+    project_collection, task_collection,
+)
+from .otp import reset_otp, verification_otp
+from .transitions import TransitionError, apply_transitions, parse_transitions
+from .uploads import CHAT_UPLOAD_CHUNK_SIZE, OffsetMismatch, UploadError, start_upload, write_chunk
+
+CHAT_STREAM_KEEPALIVE = getattr(settings, "CHAT_STREAM_KEEPALIVE", 15)
+CHAT_POLL_INTERVAL = getattr(settings, "CHAT_POLL_INTERVAL", 5)
+CONTENT_RANGE_RE = re.compile(r"^bytes (?P<start>\d+)-(?P<end>\d+)/(?P<total>\d+)$")
+ARCHIVED_MESSAGE = "This project is archived and read-only."
 
 
 def create_task_invitation(email, inviter, project, request):
     """Create a task invitation and send email"""
-    # Check rate limiting: max 10 invites per user per day
-    today = timezone.now().date()
-    today_start = timezone.datetime.combine(today, timezone.datetime.min.time())
-    today_start = timezone.make_aware(today_start)
-    
-    invites_today = TaskInvite.objects.filter(
-        inviter=inviter,
-        created_at__gte=today_start
-    ).count()
-    
-    if invites_today >= 10:
-        return False, "You have reached the maximum number of invitations for today (10)."
+    # Check rate limiting: max 10 invites per user in any 24 hours
+    if not invite_limiter.hit(f"user:{inviter.pk}"):
+        return False, f"You have reached the maximum number of invitations for today ({invite_limiter.limit})."
     
     # Create invitation
     invite = TaskInvite.objects.create(
@@ -48,31 +68,10 @@ def create_task_invitation(email, inviter, project, request):
     )
     
     # Send email
-    subject = f"You've been invited to join a project on ProjectFlow"
-    message = f"""Hello,
-
-{inviter.username} has invited you to collaborate on a project: {project.name}.
-
-To accept this invitation and view your assigned tasks, please click the link below:
-
-{invite_url}
-
-If you already have an account, you'll be logged in. Otherwise, you can create a new account.
-
-Best regards,
-ProjectFlow Team
-"""
-    
-    try:
-        send_mail(subject, message, settings.EMAIL_HOST_USER, [email])
-        return True, "Invitation sent successfully."
-    except Exception as e:
-        # Keep the invite even if email fails (e.g., in testing/dev environments)
-        # In production, you may want to handle this differently
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Failed to send invitation email to {email}: {str(e)}")
-        return True, "Invitation created but email could not be sent."
+    subject, message = invitation_message(inviter, project, invite_url)
+    # Delivered by the outbox worker, so a slow mail server never blocks the request
+    enqueue_mail(subject, message, settings.EMAIL_HOST_USER, [email])
+    return True, "Invitation sent successfully."
 
 
 def handle_email_assignment(task, assignee_email, inviter, project, request):
@@ -112,9 +111,8 @@ def register(request):
                 return render(request, "register.html", {"form": form, "invited_email": invited_email})
             
             user = form.save()
-            otp = generate_otp()
-            EmailOTP.objects.create(user=user, otp=otp)
-            send_mail("Your OTP Code", f"Your OTP is {otp}", settings.EMAIL_HOST_USER, [user.email])
+            otp = verification_otp.issue(user)
+            enqueue_mail("Your OTP Code", f"Your OTP is {otp}", settings.EMAIL_HOST_USER, [user.email])
             
             # Link any pending tasks to this user
             if invited_email:
@@ -145,37 +143,27 @@ def register(request):
 
 def email_verification(request):
     if request.method == 'POST':
-        username = request.POST.get('username')
-        otp_input = request.POST.get('otp')
-        try:
-            user = User.objects.get(username=username)
-            email_otp = EmailOTP.objects.get(user=user)
-            if email_otp.otp == otp_input:
-                user.is_active = True
-                user.save()
-                email_otp.is_verified = True
-                email_otp.save()
-                messages.success(request, "Email verified! You can login now.")
-                return redirect('login')
-            else:
-                messages.error(request, "Invalid OTP.")
-        except:
-            messages.error(request, "Invalid user or OTP.")
+        user = verification_otp.verify(request.POST.get('username'), request.POST.get('otp'))
+        if user is not None:
+            user.is_active = True
+            user.save(update_fields=['is_active'])
+            messages.success(request, "Email verified! You can login now.")
+            return redirect('login')
+        messages.error(request, "Invalid or expired OTP.")
     return render(request, 'email_verification.html')
 def reset_password(request):
     if request.method == 'POST':
-        otp = request.POST.get('otp')
         new_pass = request.POST.get('new_password')
-        username = request.session.get('reset_user')
-        user = User.objects.get(username=username)
-        email_otp = EmailOTP.objects.get(user=user)
-        if email_otp.otp == otp:
+        # Check the password first so a missing one does not use up the code
+        user = reset_otp.verify(request.session.get('reset_user'), request.POST.get('otp')) if new_pass else None
+        if user is not None:
             user.set_password(new_pass)
-            user.save()
+            user.save(update_fields=['password'])
+            request.session.pop('reset_user', None)
             messages.success(request, "Password reset successful! Login again.")
             return redirect('login')
         else:
-            messages.error(request, "Invalid OTP")
+            messages.error(request, "Invalid or expired OTP")
     return render(request, 'reset_password.html')
 
 def user_login(request):
@@ -197,14 +185,14 @@ def user_logout(request):
 
 # ---------------- FORGOT PASSWORD ----------------
 
+@ratelimit("forgot_password", 5, 60 * 60, key=client_ip)
 def forgot_password(request):
     if request.method == 'POST':
         email = request.POST.get('email')
         try:
             user = User.objects.get(email=email)
-            otp = generate_otp()
-            EmailOTP.objects.update_or_create(user=user, defaults={'otp': otp})
-            send_mail("Password Reset OTP", f"Your OTP is {otp}", "shorif.12005011@student.brur.ac.bd", [user.email])
+            otp = reset_otp.issue(user)
+            enqueue_mail("Password Reset OTP", f"Your OTP is {otp}", "shorif.12005011@student.brur.ac.bd", [user.email])
             request.session['reset_user'] = user.username
             messages.info(request, "OTP sent to your email.")
             return redirect('reset_password')
@@ -235,39 +223,54 @@ def forgot_password(request):
 
 @login_required
 def dashboard(request):
-    my_projects = Project.objects.filter(manager=request.user)
-    assigned_tasks = Task.objects.filter(assignee=request.user)
-    
-    # Check for pending tasks assigned by email
-    pending_email_tasks = Task.objects.filter(
-        assignee_email=request.user.email,
-        assignee__isnull=True
-    )
-    if pending_email_tasks.exists():
-        # Auto-link them
-        pending_email_tasks.update(assignee=request.user, assignee_email=None)
-        assigned_tasks = Task.objects.filter(assignee=request.user)
-        messages.info(request, f"{pending_email_tasks.count()} pending task(s) have been assigned to you.")
-    
-    return render(request, "dashboard.html", {
-        "my_projects": my_projects,
-        "assigned_tasks": assigned_tasks
-    })
+    linked = link_pending_email_tasks(request.user)
+    if linked:
+        messages.info(request, f"{linked} pending task(s) have been assigned to you.")
+
+    data = get_dashboard(request.user)
+    # Unread counts change with every message, so they stay out of the cached payload
+    annotate_unread(request.user, [*data["my_projects"], *(task.project for task in data["assigned_tasks"])])
+    return render(request, "dashboard.html", data)
+
+
+def calendar_etag(request):
+    try:
+        start, end = parse_window(request.GET)
+    except ValueError:
+        return None
+    return collection_etag(request, calendar_tasks(request.user, start, end), "updated_at")
+
+
+@require_safe
+@login_required
+@condition(etag_func=calendar_etag)
+def calendar_feed(request):
+    """Open tasks of the user overlapping ?start=&end=, as FullCalendar events"""
+    try:
+        start, end = parse_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    response = JsonResponse(calendar_events(calendar_tasks(request.user, start, end)), safe=False)
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # ---------------- PROJECT VIEWS ----------------
 
 @login_required
 def project_list(request):
-    user = request.user
-    projects = Project.objects.filter(Q(manager=user) | Q(client=user))
+    memberships = ProjectMembership.objects.filter(user=request.user).values("project_id")
+    projects = annotate_unread(request.user, prime_versions(Project.objects.filter(pk__in=memberships)))
     return render(request, "project_list.html", {"projects": projects})
 
 
 @login_required
 def project_detail(request, pk):
     project = get_object_or_404(Project, pk=pk)
-    tasks = project.tasks.all()
+    if project.is_archived:
+        tasks = prime_versions(archived_tasks(project))
+    else:
+        tasks = prime_versions(project.tasks.select_related("assignee"))
     return render(request, "project_detail.html", {
         "project": project,
         "tasks": tasks,
@@ -291,6 +294,8 @@ def project_create(request):
 @login_required
 def project_edit(request, pk):
     project = get_object_or_404(Project, pk=pk)
+    if project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
     if request.method == "POST":
         form = ProjectForm(request.POST, instance=project)
         if form.is_valid():
@@ -310,11 +315,36 @@ def project_delete(request, pk):
     return redirect("project_list")
 
 
+@login_required
+def project_export(request, pk):
+    """Stream a project's tasks, chat and invites as JSONL, CSV or a zip with attachments"""
+    project = get_object_or_404(Project, pk=pk)
+    if project.manager != request.user:
+        return HttpResponseForbidden("Only the project manager can export this project.")
+
+    fmt = request.GET.get("format", "jsonl")
+    kinds = request.GET.getlist("kind") or list(EXPORT_KINDS)
+    if fmt not in ("jsonl", "csv", "zip") or not set(kinds) <= EXPORT_KINDS.keys():
+        return HttpResponseBadRequest("Unknown export format or kind.")
+    try:
+        content, content_type, extension = export_stream(
+            project, fmt, kinds, include_attachments=request.GET.get("attachments") != "0"
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="project-{project.id}.{extension}"'
+    return response
+
+
 # ---------------- TASK VIEWS ----------------
 
 @login_required
 def task_create(request, project_id):
     project = get_object_or_404(Project, id=project_id)
+    if project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
     if request.method == "POST":
         form = TaskForm(request.POST)
         if form.is_valid():
@@ -339,9 +369,38 @@ def task_create(request, project_id):
     return render(request, "task_form.html", {"form": form, "project": project})
 
 
+@require_POST
+@login_required
+def task_import(request, project_id):
+    """Bulk-create tasks from an uploaded CSV/JSONL file, streaming progress as JSON lines"""
+    project = get_object_or_404(Project, id=project_id)
+    if project.manager != request.user:
+        return HttpResponseForbidden("Only the project manager can import tasks.")
+    if project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return HttpResponseBadRequest("Upload a CSV or JSONL file as 'file'.")
+    fmt = request.POST.get("format") or guess_format(upload.name)
+    if fmt not in ("csv", "jsonl"):
+        return HttpResponseBadRequest("Format must be csv or jsonl.")
+
+    importer = TaskImporter(
+        project,
+        request.user,
+        lambda token: request.build_absolute_uri(f'/invite/{token}/'),
+    )
+    events = importer.run(iter_rows(upload.open("rb"), fmt))
+    return StreamingHttpResponse(
+        (json.dumps(event) + "\n" for event in events),
+        content_type="application/x-ndjson",
+    )
+
+
 @login_required
 def task_edit(request, pk):
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(Task, pk=pk, project__archived_at__isnull=True)
     project = task.project
     if project.manager != request.user:
         return HttpResponseForbidden("Only the project manager can edit this project.")
@@ -376,7 +435,7 @@ def task_edit(request, pk):
 
 @login_required
 def task_delete(request, pk):
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(Task, pk=pk, project__archived_at__isnull=True)
     project = task.project
     if project.manager != request.user:
         return HttpResponseForbidden("<h2>Only the project manager can delete this project.</h2>")
@@ -389,13 +448,50 @@ def task_delete(request, pk):
 
 @login_required
 def task_update_status(request, pk, status):
-    task = get_object_or_404(Task, pk=pk, assignee=request.user)
+    task = get_object_or_404(Task, pk=pk, assignee=request.user, project__archived_at__isnull=True)
+    if status not in dict(Task.STATUS_CHOICES):
+        messages.error(request, "Unknown task status.")
+        return redirect("dashboard")
     task.status = status
-    task.save()
+    serialized_write(task.save)
     messages.success(request, f"Task marked as {status}.")
     return redirect("dashboard")
 
 
+@require_POST
+@login_required
+def task_batch_status(request):
+    """Move several of the user's tasks to new statuses in one request.
+
+    Scripts post JSON, {"transitions": {"done": [1, 2], "in_progress": [3]}},
+    and get back the moved task ids and the affected projects' progress.
+    The dashboard posts a form with one status and the checked tasks.
+    """
+    as_json = request.content_type == "application/json"
+    try:
+        if as_json:
+            try:
+                body = json.loads(request.body)
+            except ValueError:
+                raise TransitionError("The request body is not valid JSON.")
+            transitions = body.get("transitions") if isinstance(body, dict) else None
+        else:
+            transitions = {request.POST.get("status", ""): request.POST.getlist("task")}
+        transitions = parse_transitions(transitions)
+    except TransitionError as e:
+        if as_json:
+            return JsonResponse({"error": str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect("dashboard")
+
+    moved, projects = serialized_write(apply_transitions, request.user, transitions)
+    if as_json:
+        return JsonResponse({"moved": moved, "projects": projects})
+    count = sum(len(task_ids) for task_ids in moved.values())
+    messages.success(request, f"{count} task(s) updated.")
+    return redirect("dashboard")
+
+
 # ---------------- INVITE VIEWS ----------------
 
 def accept_invite(request, token):
@@ -414,6 +510,7 @@ def accept_invite(request, token):
                     assignee=request.user,
                     assignee_email=None
                 )
+                invalidate_dashboard(request.user.pk)
                 invite.accepted_at = timezone.now()
                 invite.is_active = False
                 invite.save()
@@ -437,7 +534,10 @@ def accept_invite(request, token):
 
 @login_required
 def profile_view(request):
-    profile, created = Profile.objects.get_or_create(user=request.user)
+    try:
+        profile = request.user.profile
+    except Profile.DoesNotExist:
+        profile = Profile.objects.create(user=request.user)
     return render(request, "profile.html", {"profile": profile})
 
 
@@ -454,12 +554,43 @@ def profile_edit(request):
         form = ProfileForm(instance=profile)
     return render(request, "profile_edit.html", {"form": form})
 
+def avatar_file(request, name):
+    """Serve a rendered avatar; names are content hashes, so caches may keep them forever"""
+    if not DERIVATIVE_NAME_RE.match(name):
+        raise Http404("Unknown avatar")
+    path = derivative_path(name)
+    if not default_storage.exists(path):
+        raise Http404("Unknown avatar")
+    response = FileResponse(default_storage.open(path, "rb"), content_type=f"image/{'jpeg' if name.endswith('.jpg') else 'webp'}")
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
 # ---------------- PROJECT CHAT VIEWS ----------------
 
 
 
 
 
+def is_ajax(request):
+    return request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+
+def prepare_chat_messages(request, messages_list):
+    """Mark the viewer's own messages and load their fragment cache versions"""
+    for message in messages_list:
+        message.is_mine = message.user_id == request.user.id
+    prime_versions(messages_list)
+    return messages_list
+
+
+def render_chat_messages(request, project, messages_list):
+    prepare_chat_messages(request, messages_list)
+    return "".join(
+        render_to_string("project_chat_message.html", {"message": message, "project": project}, request=request)
+        for message in messages_list
+    )
+
+
 @login_required
 def project_chat(request, pk):
     project = get_object_or_404(Project, pk=pk)
@@ -467,7 +598,8 @@ def project_chat(request, pk):
     if not is_project_team_member(request.user, project):
         return HttpResponseForbidden("You are not allowed to access this chat.")
 
-    messages_list = project.messages.order_by("created_at")  # recommended
+    if request.method == "POST" and project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
 
     if request.method == "POST":
         form = ProjectMessageForm(request.POST, request.FILES)
@@ -480,18 +612,145 @@ def project_chat(request, pk):
             if msg.reply_to and msg.reply_to.project_id != project.id:
                 msg.reply_to = None
 
-            msg.save()
+            # Attachment sent ahead through the chunked upload API
+            upload = None
+            if request.POST.get("upload"):
+                upload = ChatUpload.objects.filter(
+                    token=request.POST["upload"], project=project, user=request.user, blob__isnull=False
+                ).first()
+                if upload is None:
+                    return HttpResponseBadRequest("Unknown or unfinished upload.")
+                msg.blob, msg.blob_name = upload.blob, upload.filename
+
+            serialized_write(msg.save)
+            if upload is not None:
+                upload.delete()
+            if is_ajax(request):
+                return JsonResponse({"id": msg.id}, status=201)
             return redirect("project_chat", pk=project.id)
+        if is_ajax(request):
+            return JsonResponse({"errors": form.errors}, status=400)
     else:
         form = ProjectMessageForm()
 
+    if project.is_archived:
+        messages_list, next_cursor = archived_message_page(project)
+    else:
+        messages_list, next_cursor = message_page(project)
+    if messages_list and not has_read(request.user, project, messages_list[-1].id):
+        serialized_write(mark_read, request.user, project, messages_list[-1].id)
+    prepare_chat_messages(request, messages_list)
     return render(request, "project_chat.html", {
         "project": project,
         "messages": messages_list,
+        "next_cursor": next_cursor,
+        "latest_cursor": encode_cursor(messages_list[-1]) if messages_list else "",
+        # A stream would tie up a WSGI worker for as long as the page is open
+        "chat_streaming": isinstance(request, ASGIRequest),
+        "chat_poll_interval": CHAT_POLL_INTERVAL,
         "form": form
     })
 
 
+@require_POST
+@login_required
+def chat_upload_start(request, pk):
+    """Open a resumable attachment upload; expects filename and size"""
+    project = get_object_or_404(Project, pk=pk)
+    if not is_project_team_member(request.user, project):
+        return HttpResponseForbidden("You are not allowed to access this chat.")
+    if project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
+    try:
+        upload = start_upload(project, request.user, request.POST.get("filename"), int(request.POST.get("size", 0)))
+    except (UploadError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "upload": upload.token,
+        "url": reverse("chat_upload_chunk", kwargs={"pk": project.id, "token": upload.token}),
+        "offset": 0,
+        "chunk_size": CHAT_UPLOAD_CHUNK_SIZE,
+    }, status=201)
+
+
+@login_required
+def chat_upload_chunk(request, pk, token):
+    """GET reports how much has arrived; PUT appends one chunk given by Content-Range"""
+    upload = get_object_or_404(ChatUpload, token=token, project_id=pk, user=request.user)
+    if request.method == "PUT":
+        match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+        if not match or int(match["total"]) != upload.size:
+            return JsonResponse({"error": "Expected Content-Range: bytes start-end/size."}, status=400)
+        start, end = int(match["start"]), int(match["end"])
+        try:
+            write_chunk(upload, start, end - start + 1, request)
+        except OffsetMismatch as e:
+            return JsonResponse({"error": str(e), "offset": e.expected}, status=409)
+        except UploadError as e:
+            return JsonResponse({"error": str(e), "offset": upload.received}, status=400)
+    elif request.method != "GET":
+        return HttpResponseNotAllowed(["GET", "PUT"])
+    return JsonResponse({"offset": upload.received, "size": upload.size, "complete": upload.is_complete})
+
+
+@login_required
+def project_chat_history(request, pk):
+    """Return older (?before=) or newer (?after=) chat messages as rendered HTML"""
+    project = get_object_or_404(Project, pk=pk)
+
+    if not is_project_team_member(request.user, project):
+        return HttpResponseForbidden("You are not allowed to access this chat.")
+
+    try:
+        if project.is_archived:
+            if "after" in request.GET:
+                # Archived chats never get new messages
+                return JsonResponse({"html": "", "latest_cursor": request.GET["after"], "has_more": False})
+            messages_list, next_cursor = archived_message_page(project, before=request.GET.get("before"))
+            return JsonResponse({"html": render_chat_messages(request, project, messages_list), "next_cursor": next_cursor})
+        if "after" in request.GET:
+            messages_list, latest_cursor, has_more = messages_after(project, after=request.GET["after"])
+            if messages_list and not has_read(request.user, project, messages_list[-1].id):
+                # Live clients fetch what they are shown as it arrives
+                serialized_write(mark_read, request.user, project, messages_list[-1].id)
+            return JsonResponse({
+                "html": render_chat_messages(request, project, messages_list),
+                "latest_cursor": latest_cursor,
+                "has_more": has_more,
+            })
+        messages_list, next_cursor = message_page(project, before=request.GET.get("before"))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    return JsonResponse({"html": render_chat_messages(request, project, messages_list), "next_cursor": next_cursor})
+
+
+@login_required
+async def project_chat_stream(request, pk):
+    """Push chat events to the browser as Server-Sent Events (ASGI only)"""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the page polls instead; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    project = await aget_object_or_404(Project, pk=pk)
+    user = await request.auser()
+
+    if not await sync_to_async(is_project_team_member)(user, project):
+        return HttpResponseForbidden("You are not allowed to access this chat.")
+
+    async def events():
+        with hub.subscribe(project_channel(project.id)) as subscription:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscription.get(timeout=CHAT_STREAM_KEEPALIVE)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @require_POST
@@ -502,6 +761,8 @@ def project_message_delete(request, pk, message_id):
     # Permission check (same as chat)
     if not is_project_team_member(request.user, project):
         return HttpResponseForbidden("You are not allowed to access this chat.")
+    if project.is_archived:
+        return HttpResponseForbidden(ARCHIVED_MESSAGE)
 
     msg = get_object_or_404(ProjectMessage, id=message_id, project=project)
 
@@ -510,4 +771,79 @@ def project_message_delete(request, pk, message_id):
         return HttpResponseForbidden("You cannot delete this message.")
 
     msg.delete()
-    return redirect("project_chat", pk=project.id)
\ No newline at end of file
+    if is_ajax(request):
+        return JsonResponse({"deleted": message_id})
+    return redirect("project_chat", pk=project.id)
+
+
+@login_required
+def search(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
+    results, has_next = search_documents(request.user, query, page)
+    projects = Project.objects.in_bulk({result["project_id"] for result in results})
+    for result in results:
+        result["project"] = projects.get(result["project_id"])
+
+    return render(request, "search.html", {
+        "query": query,
+        "results": results,
+        "page": page,
+        "has_next": has_next,
+    })
+
+
+def api_response(request, collection, fields, *args):
+    try:
+        data = page_of(request, collection(request, *args), fields)
+    except ApiError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    response = JsonResponse(data)
+    # Per-user data: caches may keep it but must revalidate with the ETag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@require_safe
+@login_required
+@condition(etag_func=etag_for(project_collection, PROJECT_FIELDS, "updated_at"))
+def api_projects(request):
+    """Projects the user belongs to"""
+    return api_response(request, project_collection, PROJECT_FIELDS)
+
+
+@require_safe
+@login_required
+@condition(etag_func=etag_for(task_collection, TASK_FIELDS, "updated_at"))
+def api_tasks(request):
+    """Tasks in the user's projects (?project=<id>, ?status=<status>)"""
+    return api_response(request, task_collection, TASK_FIELDS)
+
+
+@require_safe
+@login_required
+@condition(etag_func=etag_for(message_collection, MESSAGE_FIELDS))
+def api_project_messages(request, pk):
+    """Chat messages of one of the user's projects, oldest first"""
+    return api_response(request, message_collection, MESSAGE_FIELDS, pk)
+
+
+@login_required
+def fragment_stats_view(request):
+    """Fragment cache hits and misses per fragment name since this worker started"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only staff can view cache statistics.")
+    return JsonResponse({"fragments": fragment_stats.summary()})
+
+
+@login_required
+def query_stats_view(request):
+    """Views ranked by query cost over the rolling window (?order=db_ms to rank by DB time)"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only staff can view query statistics.")
+    order_by = request.GET.get("order", "queries")
+    return JsonResponse({"window_seconds": query_stats.window, "views": query_stats.worst(order_by=order_by)})
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_management.settings")
+# Persistent database connections are for WSGI only (see settings.DATABASES)
+os.environ["DJANGO_CONN_MAX_AGE"] = "0"
 
 application = get_asgi_application()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,10 +24,11 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'PM.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'PM.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +58,19 @@ WSGI_APPLICATION = 'project_management.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # A deployment points SQLITE_PATH at its own database (see SQLITE_ROLLBACK_JOURNAL)
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections between requests; pragmas run once per connection.
+        # Only under WSGI: asgi.py turns this off, since ASGI runs sync code on
+        # short-lived threads whose connections would never be reused or closed
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds a writer waits for the lock before "database is locked"
+            'timeout': 20,
+            # Take the write lock when the transaction starts
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -85,3 +99,135 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = "shorif.12005011@student.brur.ac.bd"   # your Gmail
 EMAIL_HOST_PASSWORD = "sdip vyrx vjat xcvr"              # Gmail App Password
+
+# Per-user dashboard payload cache lifetime (seconds)
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Number of chat messages rendered per page of history
+CHAT_PAGE_SIZE = 50
+
+# Realtime chat: "PM.realtime.LocalBackend" for a single process, or
+# "PM.realtime.BrokerBackend" with `manage.py chat_broker` for several workers
+CHAT_PUBSUB_BACKEND = "PM.realtime.LocalBackend"
+CHAT_BROKER_HOST = "127.0.0.1"
+CHAT_BROKER_PORT = 8765
+CHAT_STREAM_KEEPALIVE = 15
+# Seconds between checks for new messages when the chat cannot stream (WSGI)
+CHAT_POLL_INTERVAL = 5
+
+# Outbound email queue drained by `manage.py send_outbox`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_SECONDS = 60
+
+# Task invitations allowed per inviter: (count, sliding window in seconds)
+INVITE_RATE_LIMIT = (10, 24 * 60 * 60)
+
+# Rows validated and inserted per batch by the bulk task importer
+IMPORT_CHUNK_SIZE = 500
+
+# Per-request SQL instrumentation: a query shape repeated this many times in
+# one request is flagged as a likely N+1; staff stats cover the last window
+SQL_INSTRUMENTATION_LOG = False
+SQL_N_PLUS_ONE_THRESHOLD = 5
+SQL_STATS_WINDOW = 15 * 60
+
+# SQLite pragmas applied to every new connection (see PM/sqlite.py), and how
+# often a write that still finds the database busy is retried
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 20000,
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -32000,
+    "temp_store": "MEMORY",
+}
+# Databases kept in rollback-journal mode whatever SQLITE_PRAGMAS says: the
+# development database committed with the repository, so using it neither
+# rewrites the tracked file nor leaves -wal/-shm files beside it
+SQLITE_ROLLBACK_JOURNAL = [BASE_DIR / "db.sqlite3"]
+SQLITE_WRITE_RETRIES = 5
+SQLITE_RETRY_BACKOFF = 0.05
+
+# Full-text search: results per page, and how many of the newest matches
+# are ranked for a query (bounds the cost of very common words)
+SEARCH_PAGE_SIZE = 20
+SEARCH_CANDIDATES = 1000
+
+# Square avatar derivatives (px) rendered by `manage.py process_avatars`
+AVATAR_SIZES = (64, 128, 256)
+AVATAR_BATCH_SIZE = 20
+
+# Chunked chat attachment uploads: largest chunk and file accepted (bytes),
+# and how long (seconds) unfinished uploads and unused blobs are kept
+CHAT_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+CHAT_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+CHAT_UPLOAD_EXPIRY = 24 * 60 * 60
+CHAT_UPLOAD_TEMP_DIR = BASE_DIR / "media" / "partial_uploads"
+
+# Seconds a rendered project card, task row or chat message stays cached;
+# edits invalidate them immediately through version bumps
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# JSON API: rows per page by default and at most (?limit=)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Longest date range (days) the dashboard calendar feed serves at once
+CALENDAR_MAX_WINDOW_DAYS = 92
+
+# Most tasks one batch status change may move
+TASK_BATCH_LIMIT = 500
+
+# Deadline reminders sent by `manage.py send_reminders`: window name -> seconds
+# before the deadline (0 = overdue), how far back (seconds) overdue tasks are
+# still reminded, and how many reminders one scan queues
+TASK_REMINDER_WINDOWS = {"24h": 24 * 60 * 60, "1h": 60 * 60, "overdue": 0}
+TASK_REMINDER_LOOKBACK = 24 * 60 * 60
+TASK_REMINDER_BATCH_SIZE = 1000
+
+# Assignment and status notifications are collected per user and mailed as one
+# digest once the oldest is this many seconds old (`manage.py send_digests`);
+# set NOTIFICATION_DIGESTS = False to mail each one on its own
+NOTIFICATION_DIGESTS = True
+NOTIFICATION_DIGEST_WINDOW = 15 * 60
+NOTIFICATION_DIGEST_BATCH_SIZE = 100
+
+# One-time codes: lifetime (seconds) and wrong guesses allowed
+OTP_TTL = 10 * 60
+OTP_MAX_ATTEMPTS = 5
+
+# Sessions and the logged-in user (with profile) are read from the cache;
+# seconds a cached user is kept (see PM/auth.py)
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+AUTH_USER_CACHE_TIMEOUT = 15 * 60
+
+# Finished projects move to compressed cold storage this many days after
+# their end_date, at most ARCHIVE_BATCH_SIZE rows per segment (see PM/archive.py)
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_ROOT = "archives"
+
+# Unread chat counts stop counting here and show as "99+"
+UNREAD_COUNT_CAP = 99
+
+# Redis, shared by every worker process, so cache invalidation reaches them
+# all: set REDIS_URL (needs the redis package). Without it the cache is
+# LocMemCache, private to one process and only fit for a single one such as
+# runserver; PM/utils.py's shared_cache() then sends cached users and rate
+# limits to the database, and the PM.W001 check warns when DEBUG is off.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+# Runs the tests against a fresh cache directory (see project_management/test_runner.py)
+TEST_RUNNER = "project_management.test_runner.TestRunner"
@@ -0,0 +1,41 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def throwaway_cache():
+    """Point the default cache at an empty temporary directory until the block ends"""
+    location = tempfile.mkdtemp(prefix="pm-cache-")
+    try:
+        with override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }
+        }):
+            yield
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    """Gives each test run an empty cache of its own.
+
+    A Redis cache outlives the process and is shared with the running site,
+    and the ids of users and projects repeat from one run to the next, so
+    entries would leak both ways. The throwaway file cache is shared like
+    Redis, so the tests take the same code paths as a deployment.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache = throwaway_cache()
+        self.cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)